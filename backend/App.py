@@ -3,8 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 from services.firebase_service import update_overdue_tasks
+from utils.log import get_logger
 
 load_dotenv()
+log = get_logger(__name__)
 
 app = FastAPI()
 
@@ -43,7 +45,7 @@ def start_scheduler():
         minute=0
     )
     scheduler.start()
-    print("📅 Overdue task scheduler started")
+    log.info("Overdue task scheduler started")
 
 @app.on_event("shutdown")
 def shutdown_scheduler():
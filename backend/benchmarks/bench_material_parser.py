@@ -0,0 +1,78 @@
+"""
+Material parser benchmark: un-memoized split_spec_grade vs parse_materials.
+
+Builds a synthetic BOM corpus (default 100k strings drawn from a few dozen
+recurring materials with spacing variants), checks the docstring examples
+and that the memoized batch gives the same output as a fresh parse for
+every string, then times both.
+
+Run from backend/:
+    python -m benchmarks.bench_material_parser [--size 100000]
+"""
+import argparse
+import random
+import time
+
+from services import material_parser
+from services.material_parser import parse_materials, split_spec_grade
+
+DOCSTRING_EXAMPLES = {
+    "SA-516 70": ("SA-516", "70"),
+    "SA-240-Gr.316/316L": ("SA-240", "316/316L"),
+    "ASTM A-240 304L": ("ASTM A-240", "304L"),
+    "SA-240 M 316L / SA 240 316L": ("SA-240 M / SA-240", "316L"),
+    "A516 Gr.70": ("A-516", "70"),
+    "SA-240-316": ("SA-240", "316"),
+    "SA-213-TP316": ("SA-213", "TP316"),
+    "SA403-WP316": ("SA-403", "WP316"),
+}
+
+SPECS = ["SA-516", "SA516", "SA 516", "SA-240", "A240", "SA-106", "SA-105", "SA-213",
+         "SA-179", "ASTM A-240", "ASME SA-312", "SA403", "SA-182", "A/SA 516"]
+GRADES = ["70", "60", "304L", "316L", "316", "B", "F316L", "TP316", "WP316", "M 316L"]
+JOINERS = [" ", "-", " Gr.", " GR ", "-Gr.", " Grade "]
+
+
+def build_corpus(size, seed=0):
+    rng = random.Random(seed)
+    materials = [s + j + g for s in SPECS for g in GRADES for j in JOINERS]
+    materials += ["SA-240 M 316L / SA 240 316L", "SA-516 316/316L", "CS", "NO", ""]
+    # A register reuses a small working set of materials
+    working_set = rng.sample(materials, 60)
+    padding = ["", " ", "  "]
+    return [rng.choice(padding) + rng.choice(working_set) + rng.choice(padding) for _ in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=100_000)
+    args = parser.parse_args()
+
+    for material, expected in DOCSTRING_EXAMPLES.items():
+        assert split_spec_grade(material) == expected, (material, split_spec_grade(material))
+
+    corpus = build_corpus(args.size)
+    uncached = material_parser._split_spec_grade.__wrapped__
+
+    def fresh_parse(material):
+        # Full regex cascade on every call, as before memoization
+        return uncached(material.strip()) if material else ("", "")
+
+    start = time.perf_counter()
+    expected = [fresh_parse(m) for m in corpus]
+    fresh_ms = (time.perf_counter() - start) * 1000
+
+    material_parser._split_spec_grade.cache_clear()
+    material_parser._format_spec_with_dash.cache_clear()
+    start = time.perf_counter()
+    actual = parse_materials(corpus)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    assert actual == expected, "memoized results differ from a fresh parse"
+    info = material_parser.material_cache_info()
+    print(f"{len(corpus)} strings, {info.currsize} distinct")
+    print(f"fresh parse {fresh_ms:8.1f} ms   parse_materials {batch_ms:7.1f} ms   x{fresh_ms / batch_ms:.0f}")
+
+
+if __name__ == '__main__':
+    main()
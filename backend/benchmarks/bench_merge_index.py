@@ -0,0 +1,119 @@
+"""
+Merge lookup benchmark: get_merge_range linear scans vs MergeIndex.
+
+Builds a synthetic register with ~10k merged ranges (equipment blocks whose
+NO. / EQUIPMENT NO. / DESCRIPTION / SERVICE / DRAWING columns are merged
+over the block's part rows) and times the header + fill-down work a
+SheetGrid does with each strategy.
+
+Run from backend/:
+    python -m benchmarks.bench_merge_index [--equipment 2000]
+"""
+import argparse
+import random
+import time
+
+from services.sheet_grid import MergeIndex, SheetGrid, col_idx_to_letter, get_merge_range
+
+YELLOW = {'backgroundColor': {'red': 1.0, 'green': 1.0, 'blue': 0.0}}
+HEADERS = ['NO.', 'EQUIPMENT NO.', 'EQUIPMENT DESCRIPTION', 'SERVICE', 'DRAWING NO.',
+           'PARTS', 'MATERIAL SPEC.', 'MATERIAL GRADE', 'DESIGN PRESSURE', 'DESIGN TEMP']
+MERGED_COLUMNS = 5
+
+
+def build_sheet(equipment_count, parts=4, seed=0):
+    rng = random.Random(seed)
+    rows = [{'values': [{'formattedValue': h, 'userEnteredFormat': YELLOW} for h in HEADERS]}]
+    merges = []
+    row_idx = 1
+    for e in range(equipment_count):
+        span = rng.randint(2, parts)
+        for p in range(span):
+            first = p == 0
+            rows.append({'values': [
+                {'formattedValue': str(e + 1) if first else ''},
+                {'formattedValue': f'V-{e:05d}' if first else ''},
+                {'formattedValue': f'Vessel {e}' if first else ''},
+                {'formattedValue': 'Process' if first else ''},
+                {'formattedValue': f'DWG-{e}' if first else ''},
+                {'formattedValue': rng.choice(['Shell', 'Top Head', 'Bottom Head', 'Nozzle'])},
+                {'formattedValue': 'SA-516'},
+                {'formattedValue': '70'},
+                {'formattedValue': '1.5'},
+                {'formattedValue': '120'},
+            ]})
+        for col in range(MERGED_COLUMNS):
+            merges.append({'startRowIndex': row_idx, 'endRowIndex': row_idx + span,
+                           'startColumnIndex': col, 'endColumnIndex': col + 1})
+        row_idx += span
+    rng.shuffle(merges)  # the API returns merges in no particular order
+    return {'properties': {'title': 'Register', 'sheetId': 0},
+            'merges': merges, 'data': [{'rowData': rows}]}
+
+
+def linear_fill(sheet, col_letter):
+    """Pre-index fill-down: every merge, letter comparison per merge."""
+    rows = sheet['data'][0]['rowData']
+    fill = {}
+    for merge in sheet['merges']:
+        start_col = merge['startColumnIndex']
+        if col_idx_to_letter(start_col) == col_letter:
+            value = rows[merge['startRowIndex']]['values'][start_col].get('formattedValue', '')
+            for r in range(merge['startRowIndex'], merge['endRowIndex']):
+                fill[r] = value
+    return fill
+
+
+def indexed_fill(sheet, index, col_idx):
+    """Fill-down through MergeIndex: only merges starting in the column."""
+    rows = sheet['data'][0]['rowData']
+    fill = {}
+    for merge in index.starting_in_column(col_idx):
+        value = rows[merge['startRowIndex']]['values'][col_idx].get('formattedValue', '')
+        for r in range(merge['startRowIndex'], merge['endRowIndex']):
+            fill[r] = value
+    return fill
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--equipment', type=int, default=2000, help='equipment blocks (5 merges each)')
+    parser.add_argument('--probes', type=int, default=5000, help='random (row, col) lookups')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    sheet = build_sheet(args.equipment)
+    merges = sheet['merges']
+    row_count = len(sheet['data'][0]['rowData'])
+    rng = random.Random(1)
+    probes = [(rng.randrange(row_count), rng.randrange(len(HEADERS))) for _ in range(args.probes)]
+    print(f"{len(merges)} merges, {row_count} rows, {len(probes)} probes")
+
+    build_ms, index = timed(lambda: MergeIndex(merges), args.repeat)
+    linear_ms, expected = timed(lambda: [get_merge_range(r, c, merges) for r, c in probes], 1)
+    indexed_ms, actual = timed(lambda: [index.find(r, c) for r, c in probes], args.repeat)
+    assert actual == expected, "MergeIndex disagrees with get_merge_range"
+    print(f"point lookups  linear {linear_ms:9.1f} ms   indexed {indexed_ms:7.1f} ms"
+          f"   (+{build_ms:.1f} ms build)   x{linear_ms / max(indexed_ms + build_ms, 1e-9):.0f}")
+
+    fill_linear_ms, expected = timed(lambda: (linear_fill(sheet, 'A'), linear_fill(sheet, 'B')), args.repeat)
+    fill_indexed_ms, actual = timed(lambda: (indexed_fill(sheet, index, 0), indexed_fill(sheet, index, 1)), args.repeat)
+    assert actual == expected, "indexed fill-down disagrees"
+    print(f"fill-down (NO., EQUIPMENT NO.)  linear {fill_linear_ms:7.1f} ms   indexed {fill_indexed_ms:7.1f} ms")
+
+    grid_ms, grid = timed(lambda: SheetGrid(sheet), args.repeat)
+    assert grid.rows_by_equipment('V-00042'), "fill-down lost equipment rows"
+    print(f"whole SheetGrid parse {grid_ms:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Sheet pipeline benchmark against the in-memory Sheets emulator.
+
+Loads a synthetic register (default 5000 equipment blocks) through
+sheet_service exactly as the routes do - split fetch, grid parse, cached
+reads, batch equipment lookup, update planning (with and without equipment
+row anchors) and the chunked write - and times each stage, so the numbers
+are our parsing / planning cost rather than network noise. --latency adds a simulated round trip per request.
+With --tabs N the register has N tabs and the every-tab read is timed
+against N single-tab loads.
+
+Run from backend/:
+    python -m benchmarks.bench_sheet_pipeline [--equipment 5000] [--lookups 500] [--latency 0] [--tabs 1]
+"""
+import argparse
+import random
+import time
+
+from services import sheet_service
+from testing.sheet_emulator import EQUIPMENT_FORMAT, SheetsEmulator, install, synthetic_register
+
+SPREADSHEET_ID = "bench-register"
+
+
+def timed(label, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--equipment', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per emulated request")
+    parser.add_argument('--tabs', type=int, default=1, help="tabs of --equipment blocks each")
+    args = parser.parse_args()
+
+    emulator = SheetsEmulator(latency=args.latency)
+    emulator.add_spreadsheet(SPREADSHEET_ID, synthetic_register(args.equipment, tabs=args.tabs))
+
+    rng = random.Random(0)
+    equipment_nos = [EQUIPMENT_FORMAT.format(rng.randrange(args.equipment)) for _ in range(args.lookups)]
+
+    with install(emulator):
+        grid = timed("cold load + parse", sheet_service.get_sheet_grid, SPREADSHEET_ID)
+        print(f"  {len(grid.row_data)} rows, {len(grid.merges)} merges, {len(grid.headers)} columns")
+        timed("cached read", sheet_service.get_sheet_grid, SPREADSHEET_ID)
+
+        rows_by_equipment = timed(
+            f"batch lookup ({args.lookups})",
+            sheet_service.get_rows_for_equipment_batch, SPREADSHEET_ID, equipment_nos
+        )
+
+        merged = []
+        for rows in rows_by_equipment.values():
+            for row in rows:
+                merged.append(dict(row, FLUID="Benchmark", **{"DESIGN PRESSURE (Mpa)": "1.234"}))
+
+        plan = timed("plan update", sheet_service.prepare_sheet_update_data, SPREADSHEET_ID, merged)
+        print(f"  {plan['cells_to_update']} cells to write, {plan['cells_unchanged']} unchanged")
+
+        anchors = timed("anchor equipment rows", sheet_service.anchor_equipment_rows, SPREADSHEET_ID)
+        print(f"  {anchors['anchored']} anchors created")
+        # The first anchored plan reloads the grid (anchoring bumps the version)
+        timed("plan update (anchored, cold)", sheet_service.prepare_sheet_update_data, SPREADSHEET_ID, merged)
+        timed("plan update (anchored)", sheet_service.prepare_sheet_update_data, SPREADSHEET_ID, merged)
+
+        result = timed("chunked write", sheet_service.execute_sheet_batch_update, SPREADSHEET_ID, plan["batch_data"])
+        print(f"  {result['updated_cells']} cells in {len(result['chunks'])} chunk(s)")
+
+        timed("reload after write", sheet_service.get_sheet_grid, SPREADSHEET_ID)
+
+        if args.tabs > 1:
+            timed(f"{args.tabs} tabs, one load each", lambda: [
+                sheet_service.load_sheet_grid(SPREADSHEET_ID, i) for i in range(args.tabs)
+            ])
+            timed(f"{args.tabs} tabs, one load", sheet_service.load_sheet_grids, SPREADSHEET_ID)
+
+    print("requests:", emulator.call_counts())
+
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,17 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from services.sheet_service import format_rows_with_pdf, get_rows_by_equipment
-from services.firebase_service import verify_token, update_pdf_metadata, get_pdf_metadata
+from services.sheet_grid import rows_to_dicts
+from services.sheet_service import format_rows_with_pdf, get_rows_by_equipment, get_rows_for_equipment_batch
+from services.firebase_service import verify_token, update_pdf_metadata, get_pdf_metadata, list_task_pdfs
 from services.drive_service import get_drive_service
-from services.extraction_service import extract_data_from_pdf
-import traceback
+from services.extraction_service import extract_data_from_pdf, summarize_extraction_metrics
 from datetime import datetime, timedelta
 from fastapi.concurrency import run_in_threadpool
+from utils.log import get_logger
 
 router = APIRouter()
+log = get_logger(__name__)
 
 LOCK_TIMEOUT = timedelta(minutes=10)
 DOC_LOCKS = {}  # Key: sheet_id, Value: lock info dict
@@ -56,8 +58,7 @@ def download_pdf_from_drive(file_id: str) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"Error downloading PDF from Drive:")
-        traceback.print_exc()
+        log.exception("Error downloading PDF %s from Drive", file_id)
         return {
             "success": False,
             "message": str(e)
@@ -107,6 +108,25 @@ def release_extraction_lock(task_id: str, file_id: str, user_id: str) -> None:
         EXTRACTION_LOCKS.pop(lock_key)
 
 
+def raise_extraction_error(extraction_result: Dict[str, Any]) -> None:
+    """
+    Raise the HTTP error for a failed extraction. An unavailable model
+    (retries exhausted or circuit open) is a 503 with Retry-After so clients
+    back off instead of hammering the retry button.
+    """
+    if extraction_result.get("error_code") == "UPSTREAM_UNAVAILABLE":
+        retry_after = int(extraction_result.get("retry_after") or 30)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Extraction service busy: {extraction_result.get('message')}",
+            headers={"Retry-After": str(retry_after)}
+        )
+    raise HTTPException(
+        status_code=500,
+        detail=f"Extraction failed: {extraction_result.get('message')}"
+    )
+
+
 # -------------------- EXTRACT SINGLE PDF --------------------
 @router.post("/extract_pdf/{task_id}/{file_id}")
 async def extract_single_pdf_route(
@@ -138,7 +158,7 @@ async def extract_single_pdf_route(
             raise HTTPException(status_code=400, detail="equipment_no not found in PDF data")
 
         # Use sheet_id from request
-        sheet_rows = get_rows_by_equipment(sheet_id, equipment_no)
+        sheet_rows = await run_in_threadpool(get_rows_by_equipment, sheet_id, equipment_no)
         if not sheet_rows:
             raise HTTPException(
                 status_code=404,
@@ -172,21 +192,22 @@ async def extract_single_pdf_route(
             has_tube_or_channel
         )
         
-        if not extraction_result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Extraction failed: {extraction_result.get('message')}"
-            )
+        if not extraction_result or not extraction_result.get("success"):
+            update_pdf_metadata(task_id, file_id, {
+                "extractionMetrics": (extraction_result or {}).get("metrics")
+            })
+            raise_extraction_error(extraction_result or {})
 
         pdf_data = extraction_result["data"]
 
         # Merge with Google Sheet
-        merged_data = await run_in_threadpool(format_rows_with_pdf, sheet_rows, pdf_data)
+        merged_data = rows_to_dicts(await run_in_threadpool(format_rows_with_pdf, sheet_rows, pdf_data))
 
         # Store in Firestore
         update_pdf_metadata(task_id, file_id, {
             "status": "extracted",
-            "extractedData": merged_data
+            "extractedData": merged_data,
+            "extractionMetrics": extraction_result.get("metrics")
         })
 
         return {
@@ -199,8 +220,7 @@ async def extract_single_pdf_route(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in extract_single_pdf_and_merge: {str(e)}")
-        traceback.print_exc()
+        log.exception("Error in extract_single_pdf_and_merge")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
     
     finally:
@@ -231,6 +251,17 @@ async def extract_multiple_pdfs_route(
         results_summary = []
         successful_count = 0
 
+        # Resolve every file's equipment up front so the sheet is read once for
+        # the batch; this copy is only used to collect the equipment numbers
+        prefetched_metadata = await run_in_threadpool(
+            lambda: [get_pdf_metadata(task_id, file_id) for file_id in file_ids]
+        )
+        equipment_nos = [
+            get_equipment_no_from_filename(metadata.get("fileName", ""))
+            for metadata in prefetched_metadata if metadata
+        ]
+        sheet_rows_by_equipment = await run_in_threadpool(get_rows_for_equipment_batch, sheet_id, equipment_nos)
+
         for file_id in file_ids:
             # 🔒 TRY TO ACQUIRE LOCK FOR THIS FILE
             try:
@@ -247,7 +278,8 @@ async def extract_multiple_pdfs_route(
                 continue
             
             try:
-                pdf_metadata = get_pdf_metadata(task_id, file_id)
+                # Re-read under the lock: a concurrent request may have changed it
+                pdf_metadata = await run_in_threadpool(get_pdf_metadata, task_id, file_id)
                 if not pdf_metadata:
                     results_summary.append({
                         "file_id": file_id,
@@ -260,7 +292,7 @@ async def extract_multiple_pdfs_route(
                     continue
 
                 # Download PDF
-                download_result = download_pdf_from_drive(file_id)
+                download_result = await run_in_threadpool(download_pdf_from_drive, file_id)
                 if not download_result.get("success"):
                     results_summary.append({
                         "file_id": file_id,
@@ -276,8 +308,13 @@ async def extract_multiple_pdfs_route(
                 file_name = pdf_metadata.get("fileName", "")
                 equipment_no = get_equipment_no_from_filename(file_name)
 
-                # Use sheet_id from request
-                sheet_rows = get_rows_by_equipment(sheet_id, equipment_no)
+                # Rows come from the single batch read of sheet_id above; copied
+                # because format_rows_with_pdf fills them in place. A file renamed
+                # since the prefetch is looked up on its own.
+                if equipment_no in sheet_rows_by_equipment:
+                    sheet_rows = [row.copy() for row in sheet_rows_by_equipment[equipment_no]]
+                else:
+                    sheet_rows = await run_in_threadpool(get_rows_by_equipment, sheet_id, equipment_no)
                 if not sheet_rows:
                     results_summary.append({
                         "file_id": file_id,
@@ -300,20 +337,24 @@ async def extract_multiple_pdfs_route(
                             has_tube_or_channel = True
 
                 # Extract data with customized prompt
-                extraction_result = extract_data_from_pdf(
-                    download_result["bytes"], 
+                extraction_result = await run_in_threadpool(
+                    extract_data_from_pdf,
+                    download_result["bytes"],
                     use_preprocessing=True,
                     parts_list=parts_needed,
                     has_shell_tube=has_tube_or_channel
                 )
                 
                 if not extraction_result or not extraction_result.get("success"):
+                    update_pdf_metadata(task_id, file_id, {
+                        "extractionMetrics": (extraction_result or {}).get("metrics")
+                    })
                     results_summary.append({
                         "file_id": file_id,
                         "file_name": pdf_metadata.get("fileName", ""),
                         "extraction_result": {
                             "success": False,
-                            "message": extraction_result.get("message", "Extraction failed")
+                            "message": (extraction_result or {}).get("message", "Extraction failed")
                         }
                     })
                     continue
@@ -321,12 +362,13 @@ async def extract_multiple_pdfs_route(
                 pdf_data = extraction_result.get("data", {})
 
                 # Merge PDF data with sheet rows
-                merged_data = format_rows_with_pdf(sheet_rows, pdf_data)
+                merged_data = rows_to_dicts(format_rows_with_pdf(sheet_rows, pdf_data))
 
                 # Store merged data in Firestore
                 update_pdf_metadata(task_id, file_id, {
                     "status": "extracted",
-                    "extractedData": merged_data
+                    "extractedData": merged_data,
+                    "extractionMetrics": extraction_result.get("metrics")
                 })
 
                 results_summary.append({
@@ -356,8 +398,7 @@ async def extract_multiple_pdfs_route(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in extract_multiple_pdfs_route: {str(e)}")
-        traceback.print_exc()
+        log.exception("Error in extract_multiple_pdfs_route")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
@@ -395,8 +436,44 @@ async def get_extraction_result(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in get_extraction_result:")
-        traceback.print_exc()
+        log.exception("Error in get_extraction_result")
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+# -------------------- EXTRACTION METRICS --------------------
+@router.get("/extraction_metrics/{task_id}")
+async def get_extraction_metrics(
+    task_id: str,
+    user_info: dict = Depends(get_current_user)
+):
+    """
+    Aggregate the per-extraction cost and latency metrics of a task's PDFs.
+    Lists the slowest files and largest payloads to spot pathological drawings.
+    """
+    try:
+        result = await run_in_threadpool(list_task_pdfs, task_id)
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["message"])
+
+        pdfs = result["pdfs"]
+        return {
+            "taskId": task_id,
+            "summary": summarize_extraction_metrics(pdfs),
+            "files": [
+                {
+                    "fileId": pdf.get("fileId") or pdf.get("id"),
+                    "fileName": pdf.get("fileName"),
+                    "status": pdf.get("status"),
+                    "metrics": pdf.get("extractionMetrics")
+                }
+                for pdf in pdfs
+            ]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("Error in get_extraction_metrics")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
@@ -431,7 +508,7 @@ async def extract_pdf_only(
             raise HTTPException(status_code=400, detail="equipment_no not found in PDF data")
 
         # Use sheet_id from request
-        sheet_rows = get_rows_by_equipment(sheet_id, equipment_no)
+        sheet_rows = await run_in_threadpool(get_rows_by_equipment, sheet_id, equipment_no)
         if not sheet_rows:
             raise HTTPException(
                 status_code=404,
@@ -449,7 +526,7 @@ async def extract_pdf_only(
                     has_tube_or_channel = True
 
         # Download PDF from Drive
-        download_result = download_pdf_from_drive(file_id)
+        download_result = await run_in_threadpool(download_pdf_from_drive, file_id)
         if not download_result["success"]:
             raise HTTPException(
                 status_code=500,
@@ -457,25 +534,27 @@ async def extract_pdf_only(
             )
 
         # Extract data with customized prompt
-        extraction_result = extract_data_from_pdf(
-            download_result["bytes"], 
+        extraction_result = await run_in_threadpool(
+            extract_data_from_pdf,
+            download_result["bytes"],
             use_preprocessing=True,
             parts_list=parts_needed,
             has_shell_tube=has_tube_or_channel
         )
         
-        if not extraction_result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Extraction failed: {extraction_result.get('message')}"
-            )
+        if not extraction_result or not extraction_result.get("success"):
+            update_pdf_metadata(task_id, file_id, {
+                "extractionMetrics": (extraction_result or {}).get("metrics")
+            })
+            raise_extraction_error(extraction_result or {})
 
         pdf_data = extraction_result["data"]
 
         # Store in Firestore
         update_pdf_metadata(task_id, file_id, {
             "status": "extracted",
-            "extractedData": pdf_data
+            "extractedData": pdf_data,
+            "extractionMetrics": extraction_result.get("metrics")
         })
 
         return {
@@ -488,8 +567,7 @@ async def extract_pdf_only(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in extract_pdf_only: {str(e)}")
-        traceback.print_exc()
+        log.exception("Error in extract_pdf_only")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
     
     finally:
@@ -567,12 +645,15 @@ async def insert_to_sheet_route(
                 try:
                     update_pdf_metadata(task_id, file_id, {"status": "completed"})
                 except Exception as e:
-                    print(f"✗ Failed to update status for {file_id}: {e}")
+                    log.warning("Failed to update status for %s: %s", file_id, e)
             
             return {
                 "message": f"Updated {prep_result['rows_to_update']} rows",
                 "rows_updated": prep_result["rows_to_update"],
-                "cells_updated": exec_result.get("updated_cells", 0)
+                "cells_updated": exec_result.get("updated_cells", 0),
+                "cells_unchanged": prep_result.get("cells_unchanged", 0),
+                "write_chunks": len(exec_result.get("chunks", [])),
+                "write_ms": exec_result.get("total_ms", 0.0)
             }
         else:
             raise HTTPException(status_code=500, detail=exec_result["message"])
@@ -580,7 +661,7 @@ async def insert_to_sheet_route(
     except HTTPException:
         raise
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Error in insert_to_sheet_route")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
     finally:
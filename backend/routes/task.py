@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, File, UploadFile, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from services.firebase_service import (
@@ -10,9 +11,12 @@ from services.drive_service import (
     copy_google_sheet, copy_google_slide, create_task_in_folder, 
     upload_pdf_to_task_folder, delete_pdf_from_drive
 )
-from services.sheet_service import extract_yellow_headers, format_rows_with_pdf, get_rows_by_equipment
+from services.sheet_grid import rows_to_dicts
+from services.sheet_service import anchor_equipment_rows, extract_yellow_headers, format_rows_with_pdf, get_rows_by_equipment, inherit_sheet_schema
+from utils.log import get_logger
 
 router = APIRouter()
+log = get_logger(__name__)
 
 
 # Pydantic Models
@@ -49,9 +53,17 @@ async def get_current_user(user_info: dict = Depends(verify_token)):
 
 
 # -------------------- CREATE TASK --------------------
+def anchor_task_sheet(sheet_id: str) -> None:
+    """Background step of create_task: anchor the new sheet's equipment rows."""
+    anchors = anchor_equipment_rows(sheet_id)
+    if not anchors["success"]:
+        log.warning("Sheet %s created without equipment anchors: %s", sheet_id, anchors.get("message"))
+
+
 @router.post("/create_task")
 async def create_task_route(
     request_data: CreateTaskRequest,
+    background_tasks: BackgroundTasks,
     user_info: dict = Depends(get_current_user)
 ):
     """Create a new task with associated Google Sheet and Slide"""
@@ -86,6 +98,13 @@ async def create_task_route(
     if not sheet["success"]:
         raise HTTPException(status_code=500, detail="Folder created, but failed to create sheet")
 
+    # The copy starts with the template's headers: reuse its stored schema
+    await run_in_threadpool(inherit_sheet_schema, sheet_template_id, sheet["sheet_id"])
+
+    # Tag each equipment block's row so later writes locate it without a
+    # scan; not needed for the response, so it runs after it is sent
+    background_tasks.add_task(anchor_task_sheet, sheet["sheet_id"])
+
     # 3️⃣ Copy Slide
     slide = copy_google_slide(task_name, folder_id, slide_template_id)
     if not slide["success"]:
@@ -184,7 +203,7 @@ async def upload_pdf_route(
     firestore_result = save_pdf_metadata(task_id, pdf_metadata)
     
     if not firestore_result["success"]:
-        print(f"Warning: Failed to save PDF metadata to Firestore: {firestore_result.get('message')}")
+        log.warning("Failed to save PDF metadata to Firestore: %s", firestore_result.get('message'))
         # Don't fail the upload, just log the warning
 
     return {
@@ -269,7 +288,7 @@ async def delete_pdf_route(
 
     if not firestore_result["success"]:
         # File deleted from Drive but not from Firestore - log warning
-        print(f"Warning: File deleted from Drive but failed to delete Firestore metadata: {firestore_result.get('message')}")
+        log.warning("File deleted from Drive but failed to delete Firestore metadata: %s", firestore_result.get('message'))
         raise HTTPException(
             status_code=207,
             detail="PDF deleted from Google Drive but failed to delete metadata from database"
@@ -282,7 +301,7 @@ async def delete_pdf_route(
 @router.get("/get_headers")
 async def get_headers_route():
     """Get yellow headers from the Google Sheet"""
-    headers = extract_yellow_headers("1cftK61YjCxjY9S4gP6BylwTXXk9NtyqGs0Tt1gd-ZmE")
+    headers = await run_in_threadpool(extract_yellow_headers, "1cftK61YjCxjY9S4gP6BylwTXXk9NtyqGs0Tt1gd-ZmE")
 
     if headers is None:
         raise HTTPException(status_code=500, detail="Failed to extract headers")
@@ -306,7 +325,7 @@ async def get_original_data_route(
         )
 
     # Call the service method to get rows
-    rows = get_rows_by_equipment("1cftK61YjCxjY9S4gP6BylwTXXk9NtyqGs0Tt1gd-ZmE", equipment_no.strip())
+    rows = await run_in_threadpool(get_rows_by_equipment, "1cftK61YjCxjY9S4gP6BylwTXXk9NtyqGs0Tt1gd-ZmE", equipment_no.strip())
 
     if not rows:
         raise HTTPException(
@@ -318,7 +337,7 @@ async def get_original_data_route(
         "success": True,
         "equipment_no": equipment_no,
         "row_count": len(rows),
-        "rows": rows
+        "rows": rows_to_dicts(rows)
     }
 
 
@@ -343,7 +362,8 @@ async def merge_pdf_with_sheet_route(request_data: MergePDFWithSheetRequest):
         raise HTTPException(status_code=400, detail="pdfData is required")
 
     # 1️⃣ Get original rows from Google Sheet
-    rows = get_rows_by_equipment(
+    rows = await run_in_threadpool(
+        get_rows_by_equipment,
         "1cftK61YjCxjY9S4gP6BylwTXXk9NtyqGs0Tt1gd-ZmE",
         equipment_no
     )
@@ -361,7 +381,7 @@ async def merge_pdf_with_sheet_route(request_data: MergePDFWithSheetRequest):
         "success": True,
         "equipment_no": equipment_no,
         "row_count": len(formatted_rows),
-        "rows": formatted_rows
+        "rows": rows_to_dicts(formatted_rows)
     }
 
 @router.patch("/update_task/{task_id}")
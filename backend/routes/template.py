@@ -1,19 +1,19 @@
-import traceback
 from fastapi import APIRouter, HTTPException, Query,Depends
 from typing import Optional
 from services.slide_service import (
-    build_slide_table_updates, build_slide_table_updates_grouped_by_no, 
-    build_slide_textbox_updates, build_slide_textbox_updates_from_first_row, 
-    overwrite_grouped_tables, overwrite_table_cells, overwrite_textboxes, 
-    read_textboxes_from_slide, read_textboxes_grouped_by_slide
+    build_slide_table_updates, build_slide_textbox_updates,
+    build_slide_textbox_updates_from_first_row, overwrite_table_cells, overwrite_textboxes,
+    read_textboxes_from_slide, read_textboxes_grouped_by_slide, write_grouped_tables_streaming
 )
-from services.sheet_service import get_all_rows_with_no, get_rows_by_no
+from services.sheet_service import get_rows_by_no, iter_rows_with_no
 from services.firebase_service import verify_token
 from services.drive_service import create_empty_template, list_templates
 from datetime import datetime, timedelta
 from fastapi.concurrency import run_in_threadpool
+from utils.log import get_logger
 
 router = APIRouter()
+log = get_logger(__name__)
 # ------------------------------
 # 🔐 LOCK SYSTEM
 # ------------------------------
@@ -48,8 +48,8 @@ async def get_templates():
 
     except HTTPException:
         raise
-    except Exception as e:
-        print("Error in get_templates route:", e)
+    except Exception:
+        log.exception("Error in get_templates route")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -67,7 +67,8 @@ async def get_rows_by_no_route(
     """
     try:
         # 1️⃣ Get rows from Google Sheets
-        rows = get_rows_by_no(
+        rows = await run_in_threadpool(
+            get_rows_by_no,
             spreadsheet_id=spreadsheet_id,
             target_no=target_no,
             sheet_index=sheet_index
@@ -111,7 +112,7 @@ async def get_rows_by_no_route(
         }
 
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Error in get_rows_by_no_route")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -154,27 +155,16 @@ async def get_all_rows(
         }
 
         # ------------------------------
-        # 🔁 GET SHEET ROWS
+        # 🔁 STREAM SHEET ROWS INTO THE GROUPED SLIDE TABLES
         # ------------------------------
+        # Each NO.'s table is written as soon as its rows are read; only the
+        # first row per NO. is kept for the textboxes
         rows = await run_in_threadpool(
-            get_all_rows_with_no,
-            spreadsheet_id,
-            sheet_index
+            write_grouped_tables_streaming,
+            iter_rows_with_no(spreadsheet_id, sheet_index),
+            presentation_id
         )
 
-        api_response = {
-            "success": True,
-            "count": len(rows),
-            "data": rows
-        }
-
-        # ------------------------------
-        # 🔁 UPDATE GROUPED TABLES IN SLIDES
-        # ------------------------------
-        grouped_updates = await run_in_threadpool(build_slide_table_updates_grouped_by_no, api_response)
-        if grouped_updates:
-            await run_in_threadpool(overwrite_grouped_tables, grouped_updates, presentation_id)
-
         # ------------------------------
         # 🔁 UPDATE TEXTBOXES IN SLIDES
         # ------------------------------
@@ -189,7 +179,7 @@ async def get_all_rows(
         }
 
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Error in get_all_rows")
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
@@ -1,15 +1,11 @@
 import io
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
 from googleapiclient.http import MediaIoBaseUpload
-import os
-import traceback
+from services.google_client import get_google_service
+from utils.log import get_logger
 
 # ------------------- CONFIG -------------------
-CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("GOOGLE_REFRESH_TOKEN")
+log = get_logger(__name__)
+
 SCOPES = ["https://www.googleapis.com/auth/drive"]
 
 TEMPLATES_FOLDER_ID = "1VcWHP-CUd7yUnBi1Np-3XCTGMX1tUal0"
@@ -19,30 +15,22 @@ EXCEL_TEMPLATE_FOLDER_ID = "1E5oAOY29sE5t5fOf8hXK3kBrI_qsO09z"
 PPTX_TEMPLATE_FOLDER_ID = "1wY4dhgIHVqoptMtmHjbMo5Nq6cykpP4X"
 
 # ------------------- HELPERS -------------------
-def get_drive_service():
-    # Validate environment variables
-    if not all([CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN]):
-        raise ValueError("CLIENT_ID, CLIENT_SECRET, and REFRESH_TOKEN must be set!")
-
-    # Create credentials object
-    creds = Credentials(
-        token=None,
-        refresh_token=REFRESH_TOKEN,
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        token_uri="https://oauth2.googleapis.com/token",
-        scopes=SCOPES
-    )
+# Service used instead of the Google client when set (e.g. the in-memory
+# testing.sheet_emulator.SheetsEmulator)
+_drive_service_override = None
 
-    try:
-        # Force refresh token to ensure valid access token
-        creds.refresh(Request())
-    except Exception as e:
-        print("Failed to refresh access token:")
-        traceback.print_exc()
-        raise e
 
-    return build("drive", "v3", credentials=creds)
+def set_drive_service(service):
+    """Route Drive calls through `service`; None restores the Google client."""
+    global _drive_service_override
+    _drive_service_override = service
+
+
+def get_drive_service():
+    if _drive_service_override is not None:
+        return _drive_service_override
+    # Shared credentials (refreshed only near expiry) and a per-thread service
+    return get_google_service("drive", "v3", SCOPES)
 
 def create_task_in_folder(folder_name, created_by_email, members=None):
     try:
@@ -93,7 +81,7 @@ def create_task_in_folder(folder_name, created_by_email, members=None):
                     sendNotificationEmail=False  # Set to True if you want to notify users
                 ).execute()
             except Exception as perm_error:
-                print(f"Warning: Could not share with {email}: {str(perm_error)}")
+                log.warning("Could not share with %s: %s", email, perm_error)
 
         return {
             'success': True,
@@ -103,7 +91,7 @@ def create_task_in_folder(folder_name, created_by_email, members=None):
         }
 
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Error creating task folder")
         return {
             'success': False,
             'message': str(e)
@@ -165,8 +153,7 @@ def copy_google_sheet(task_name,parent_folder_id,excel_template_id):
         }
 
     except Exception as e:
-        print("Error copying Google Sheet:")
-        traceback.print_exc()
+        log.exception("Error copying Google Sheet")
         return {"success": False, "message": str(e)}
 
 def copy_google_slide(task_name,parent_folder_id, slide_template_id):
@@ -206,8 +193,7 @@ def copy_google_slide(task_name,parent_folder_id, slide_template_id):
         }
 
     except Exception as e:
-        print("Error copying Google Slide:")
-        traceback.print_exc()
+        log.exception("Error copying Google Slide")
         return {"success": False, "message": str(e)}
 
 def list_templates():
@@ -267,8 +253,7 @@ def list_templates():
         }
 
     except Exception as e:
-        print("Error retrieving templates:")
-        traceback.print_exc()
+        log.exception("Error retrieving templates")
         return {"success": False, "message": str(e)}
 
 def create_empty_template(name: str, template_type: str):
@@ -325,8 +310,7 @@ def create_empty_template(name: str, template_type: str):
         }
 
     except Exception as e:
-        print("Error creating empty template:")
-        traceback.print_exc()
+        log.exception("Error creating empty template")
         return {"success": False, "message": str(e)}
 
 
@@ -370,9 +354,8 @@ def check_pdf_exists_in_folder(task_folder_id: str, filename: str):
         
         return {"exists": False}
 
-    except Exception as e:
-        print(f"Error checking if PDF exists:")
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error checking if PDF exists")
         return {"exists": False}
 
 
@@ -441,8 +424,7 @@ def upload_pdf_to_task_folder(task_folder_id: str, pdf_file, filename: str):
         }
 
     except Exception as e:
-        print(f"Error uploading PDF to task folder:")
-        traceback.print_exc()
+        log.exception("Error uploading PDF to task folder")
         return {
             "success": False,
             "message": str(e)
@@ -496,8 +478,7 @@ def list_pdfs_in_task_folder(task_folder_id: str):
         }
 
     except Exception as e:
-        print(f"Error listing PDFs in task folder:")
-        traceback.print_exc()
+        log.exception("Error listing PDFs in task folder")
         return {
             "success": False,
             "message": str(e),
@@ -527,9 +508,30 @@ def delete_pdf_from_drive(file_id: str):
         }
     
     except Exception as e:
-        print(f"Error deleting file from Google Drive:")
-        traceback.print_exc()
+        log.exception("Error deleting file from Google Drive")
         return {
             "success": False,
             "message": str(e)
-        }
\ No newline at end of file
+        }
+
+def get_file_revision(file_id: str):
+    """
+    Cheap change marker for a Drive file (Sheets included).
+
+    Args:
+        file_id: The Google Drive file ID
+
+    Returns:
+        dict: {"version": str, "modifiedTime": str}, or None if it could not be read.
+        Drive bumps `version` on every change to the file's content.
+    """
+    try:
+        drive_service = get_drive_service()
+        return drive_service.files().get(
+            fileId=file_id,
+            fields="version, modifiedTime"
+        ).execute()
+
+    except Exception:
+        log.exception("Error reading revision of file %s", file_id)
+        return None
@@ -1,17 +1,52 @@
 import os
 import io
 import time 
-import traceback
+import random
+import zlib
+import threading
+import httpx
 from google import genai
-from google.genai import types
+from google.genai import types, errors
 import fitz  # PyMuPDF
+import numpy as np
 import json
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 # Initialize Gemini client
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if not GEMINI_API_KEY:
-    print("WARNING: GEMINI_API_KEY not set in environment variables")
+    log.warning("GEMINI_API_KEY not set in environment variables")
+
+# Retry / circuit breaker settings for model calls
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1.0"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "30.0"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "60.0"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Low-DPI pre-pass used to inspect a page before the expensive render
+PREPASS_DPI = int(os.getenv("PDF_PREPASS_DPI", "72"))
+
+# Render DPI chosen per page from the estimated glyph height
+PDF_MIN_DPI = int(os.getenv("PDF_MIN_DPI", "150"))
+PDF_MAX_DPI = int(os.getenv("PDF_MAX_DPI", "400"))
+PDF_TARGET_GLYPH_PX = float(os.getenv("PDF_TARGET_GLYPH_PX", "20"))
+# Pages without a glyph estimate (scans, no text layer) keep the former fixed DPI
+PDF_DEFAULT_DPI = int(os.getenv("PDF_DEFAULT_DPI", "300"))
+CAP_HEIGHT_RATIO = 0.72  # capital letter height / font size, typical of drawing fonts
+
+# Optional 1-bit tile encoding (adaptive threshold + despeckle + border crop)
+PDF_BINARIZE = os.getenv("PDF_BINARIZE", "false").lower() == "true"
+
+def _elapsed_ms(start):
+    """Milliseconds elapsed since a time.perf_counter() reading."""
+    return round((time.perf_counter() - start) * 1000, 1)
+
 
 def get_gemini_client():
     """Get Gemini API client"""
@@ -20,24 +55,535 @@ def get_gemini_client():
     return genai.Client(api_key=GEMINI_API_KEY)
 
 
-def split_pdf_for_ocr(pdf_bytes, dpi=300, overlap_percent=0.02):
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Gemini is temporarily unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker shared by all model calls.
+    
+    closed    -> calls go through; `threshold` transient failures in a row open it
+    open      -> calls fail fast with CircuitOpenError until `cooldown` passes
+    half_open -> a single trial call is let through; success closes the
+                 breaker, failure opens it again
+
+    Client errors (non-retryable 4xx) say nothing about upstream health and
+    leave the state as it is.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._times_opened = 0
+
+    def before_call(self):
+        with self._lock:
+            if self._state == "closed":
+                return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if self._state == "open" and remaining <= 0:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_client_error(self):
+        with self._lock:
+            # Frees the half-open trial slot; the next call is the new trial
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == "half_open" or self._failures >= self.threshold:
+                if self._state != "open":
+                    self._times_opened += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutiveFailures": self._failures,
+                "timesOpened": self._times_opened,
+            }
+
+
+GEMINI_BREAKER = CircuitBreaker(GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_COOLDOWN)
+
+
+def get_circuit_breaker_state():
+    """Current state of the Gemini circuit breaker, for metrics endpoints."""
+    return GEMINI_BREAKER.snapshot()
+
+
+def _is_retryable(error):
+    """Transient upstream errors worth retrying (rate limits, 5xx, network)."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def _retry_after_hint(error):
+    """
+    Seconds the server asked us to wait, from a Retry-After header or a
+    google.rpc.RetryInfo detail ("retryDelay": "12s"). None if absent.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in details.get("error", {}).get("details", []):
+            delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    pass
+    return None
+
+
+def generate_content_with_retry(client, metrics=None, **request):
+    """
+    Call client.models.generate_content with bounded retries.
+    
+    Transient failures are retried up to GEMINI_MAX_RETRIES times with
+    decorrelated jitter (delay = uniform(base, previous * 3), capped), never
+    sooner than a server retry-after hint. If the hint is longer than the cap
+    we give up instead of holding a worker. Every call goes through the shared
+    circuit breaker so a degraded upstream fails fast.
+    
+    Args:
+        client: genai.Client
+        metrics: Optional dict; "retries" and "circuitState" are filled in
+        **request: Arguments for generate_content (model, contents, config)
+    
+    Returns:
+        The Gemini response
+    
+    Raises:
+        CircuitOpenError: if the breaker is open
+        Exception: the last upstream error once retries are exhausted
+    """
+    if metrics is None:
+        metrics = {}
+    metrics.setdefault("retries", 0)
+
+    delay = GEMINI_RETRY_BASE_DELAY
+    attempt = 0
+    try:
+        while True:
+            GEMINI_BREAKER.before_call()
+            try:
+                response = client.models.generate_content(**request)
+            except Exception as e:
+                if not _is_retryable(e):
+                    GEMINI_BREAKER.record_client_error()
+                    raise
+                GEMINI_BREAKER.record_failure()
+
+                hint = _retry_after_hint(e)
+                if attempt >= GEMINI_MAX_RETRIES or (hint and hint > GEMINI_RETRY_MAX_DELAY):
+                    raise
+
+                delay = min(GEMINI_RETRY_MAX_DELAY, random.uniform(GEMINI_RETRY_BASE_DELAY, delay * 3))
+                if hint:
+                    delay = max(delay, hint)
+                attempt += 1
+                metrics["retries"] = attempt
+                log.warning("Gemini call failed (%s); retry %s/%s in %.1fs", e, attempt, GEMINI_MAX_RETRIES, delay)
+                time.sleep(delay)
+                continue
+
+            GEMINI_BREAKER.record_success()
+            return response
+    finally:
+        metrics["circuitState"] = GEMINI_BREAKER.snapshot()["state"]
+
+
+# ===============================================================================
+# PAGE PRE-PASS (ORIENTATION)
+# ===============================================================================
+
+def pixmap_to_gray(pix):
+    """View a single-channel pixmap's samples as a 2-D uint8 array."""
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return gray[:, :pix.width]
+
+
+def render_prepass(page, dpi=PREPASS_DPI):
+    """Render a page at low DPI and return it as a 2-D uint8 grayscale array."""
+    return pixmap_to_gray(page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY))
+
+
+def _rotation_from_text(page, blocks, min_chars=20, min_share=0.6):
+    """
+    Rotation correction from the writing direction of the text layer.
+    
+    Line directions from get_text("dict") are in unrotated page space, so they
+    are mapped through the page's rotation matrix first. Each line votes with
+    its character count for the direction it reads in on screen.
+    
+    Returns:
+        int or None: clockwise correction (0/90/180/270), None if no text
+    """
+    m = page.rotation_matrix
+    votes = {0: 0, 90: 0, 180: 0, 270: 0}
+
+    for block in blocks:
+        for line in block.get("lines", []):
+            dx, dy = line["dir"]
+            # Direction as displayed (y grows downwards)
+            sx, sy = m.a * dx + m.c * dy, m.b * dx + m.d * dy
+            chars = sum(len(span["text"].strip()) for span in line["spans"])
+            if abs(sx) >= 0.9:
+                votes[0 if sx > 0 else 180] += chars
+            elif abs(sy) >= 0.9:
+                # Text running downwards needs a 270° turn, upwards a 90° turn
+                votes[270 if sy > 0 else 90] += chars
+
+    total = sum(votes.values())
+    if total < min_chars:
+        return None
+
+    correction, weight = max(votes.items(), key=lambda item: item[1])
+    return correction if weight / total >= min_share else 0
+
+
+def _window_sum(mask, before, after, axis, dtype=np.uint16):
+    """Sum of an array over [i - before, i + after] along an axis (zero padded)."""
+    width = before + after + 1
+    padding = [(0, 0)] * mask.ndim
+    padding[axis] = (before + 1, after)
+    csum = np.cumsum(np.pad(mask, padding), axis=axis, dtype=dtype)
+    upper = [slice(None)] * mask.ndim
+    lower = [slice(None)] * mask.ndim
+    upper[axis] = slice(width, None)
+    lower[axis] = slice(None, -width)
+    return csum[tuple(upper)] - csum[tuple(lower)]
+
+
+def _neighbour_count(mask):
+    """Number of set pixels among the 8 neighbours of each pixel."""
+    p = np.pad(mask, 1).astype(np.uint8)
+    rows = p[:, :-2] + p[:, 1:-1] + p[:, 2:]
+    return rows[:-2] + rows[1:-1] + rows[2:] - mask
+
+
+def _mean_run_length(mask, axis):
+    """Average length of the ink runs of a boolean mask along an axis."""
+    a = np.moveaxis(mask, axis, -1)
+    runs = np.count_nonzero(a[..., 0]) + np.count_nonzero(a[..., 1:] & ~a[..., :-1])
+    return np.count_nonzero(a) / max(runs, 1)
+
+
+def ink_mask(gray):
+    """Boolean ink mask of a grayscale render, relative to the paper tone."""
+    return gray < min(160, np.median(gray) * 0.7)
+
+
+def text_mask(ink, line_px=31):
+    """Drop straight line art (runs of at least line_px) so mostly lettering remains."""
+    half = line_px // 2
+    lines = (
+        (_window_sum(ink, half, half, axis=1) >= line_px) |
+        (_window_sum(ink, half, half, axis=0) >= line_px)
+    )
+    return ink & ~lines
+
+
+def _rotation_from_raster(gray, gap_px=3, min_ratio=1.2, corner_ratio=1.5):
+    """
+    Rotation correction for image-only pages from ink run lengths.
+    
+    After removing line art, lettering is smeared along each axis (gaps up to
+    gap_px closed). Along the writing direction the letters of a word fuse into
+    long runs; across it runs stay about one glyph tall. Whichever axis gives
+    the longer runs is the writing axis.
+    
+    Run lengths can't tell 90° from 270° (or 0° from 180°), so the sign comes
+    from where the densest corner sits: GA drawings keep the title block and
+    BOM in the bottom-right corner.
+    
+    Returns:
+        int: clockwise correction (0/90/180/270)
+    """
+    ink = ink_mask(gray)
+    letters = text_mask(ink)
+    if letters.mean() < 0.001:
+        return 0
+
+    def smear(mask, axis):
+        near_before = _window_sum(mask, gap_px, 0, axis) > 0
+        near_after = _window_sum(mask, 0, gap_px, axis) > 0
+        return mask | (near_before & near_after)
+
+    horizontal = _mean_run_length(smear(letters, axis=1), axis=1)
+    vertical = _mean_run_length(smear(letters, axis=0), axis=0)
+
+    h, w = ink.shape
+    ch, cw = max(h // 3, 1), max(w // 3, 1)
+    corners = {
+        "bottom_right": ink[-ch:, -cw:].mean(),
+        "bottom_left": ink[-ch:, :cw].mean(),
+        "top_right": ink[:ch, -cw:].mean(),
+        "top_left": ink[:ch, :cw].mean(),
+    }
+
+    if vertical > horizontal * min_ratio:
+        # Turned clockwise the title block lands bottom-left, anticlockwise top-right
+        return 270 if corners["bottom_left"] >= corners["top_right"] else 90
+
+    densest = max(corners, key=corners.get)
+    others = [v for k, v in corners.items() if k != densest]
+    if densest == "top_left" and corners[densest] > corner_ratio * max(others):
+        return 180
+    return 0
+
+
+def _glyph_height_from_text(blocks, percentile=25):
+    """
+    Small-text capital height in points from the text layer: the
+    character-weighted `percentile` of span font sizes, so BOM-sized
+    lettering rather than titles drives the estimate.
+    """
+    sizes, weights = [], []
+    for block in blocks:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                chars = len(span["text"].strip())
+                if chars and span["size"] > 0:
+                    sizes.append(span["size"])
+                    weights.append(chars)
+    if sum(weights) < 20:
+        return None
+
+    order = np.argsort(sizes)
+    cumulative = np.cumsum(np.asarray(weights)[order])
+    index = np.searchsorted(cumulative, cumulative[-1] * percentile / 100)
+    return float(np.asarray(sizes)[order][index]) * CAP_HEIGHT_RATIO
+
+
+def _glyph_height_from_raster(gray, dpi, sideways=False, percentile=90):
+    """
+    Dominant capital height in points of a scanned page.
+    
+    Runs of ink across the writing direction are mostly stroke widths and
+    bowl segments; the long end of their distribution is the full height of
+    stems (I, H, E, 1...), so a high percentile tracks the capital height.
+    """
+    letters = text_mask(ink_mask(gray))
+    if sideways:
+        letters = letters.T
+    # Vertical run lengths: column-wise distance between run starts and ends
+    edges = np.diff(np.pad(letters.T, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    lengths = lengths[lengths >= 2]
+    if lengths.size < 200:
+        return None
+    return float(np.percentile(lengths, percentile)) * 72 / dpi
+
+
+def choose_render_dpi(glyph_pt):
+    """
+    Lowest DPI (rounded up to a multiple of 25) that renders `glyph_pt`
+    capitals at PDF_TARGET_GLYPH_PX pixels, within PDF_MIN_DPI..PDF_MAX_DPI.
+    Without an estimate PDF_DEFAULT_DPI is used as is.
+    """
+    if not glyph_pt:
+        return PDF_DEFAULT_DPI
+    dpi = PDF_TARGET_GLYPH_PX * 72 / glyph_pt
+    dpi = int(np.ceil(dpi / 25) * 25)
+    return max(PDF_MIN_DPI, min(PDF_MAX_DPI, dpi))
+
+
+def inspect_page(page):
+    """
+    Cheap pre-pass run before the high-DPI render: orientation and
+    text size.
+    
+    Uses the text layer when the PDF has one; scanned pages fall back to a
+    single PREPASS_DPI render (about 6% of the pixels of a 300 DPI render)
+    shared by both estimates.
+    
+    Returns:
+        dict: {"rotation": clockwise correction (0/90/180/270),
+               "glyphPt": estimated capital height in points or None}
+    """
+    blocks = page.get_text("dict").get("blocks", [])
+    rotation = _rotation_from_text(page, blocks)
+    glyph_pt = _glyph_height_from_text(blocks)
+    if rotation is not None and glyph_pt:
+        return {"rotation": rotation, "glyphPt": glyph_pt}
+
+    gray = render_prepass(page)
+    if rotation is None:
+        rotation = _rotation_from_raster(gray)
+    if not glyph_pt:
+        glyph_pt = _glyph_height_from_raster(gray, PREPASS_DPI, sideways=rotation in (90, 270))
+    return {"rotation": rotation, "glyphPt": glyph_pt}
+
+
+# ===============================================================================
+# TILE BINARIZATION
+# ===============================================================================
+
+def binarize_tile(gray, window_frac=1 / 16, sensitivity=0.15, min_neighbors=2, margin_px=8, block_px=8):
+    """
+    Turn a grayscale tile into a cropped ink mask.
+    
+    1. Adaptive threshold (Bradley): a pixel is ink when it is `sensitivity`
+       darker than the mean of its surrounding window, so uneven scan
+       lighting and gray paper don't turn into solid blocks. The window mean
+       only varies over tens of pixels, so it is taken on a grid of
+       `block_px` block means and expanded back to full size; the
+       comparison itself stays per pixel.
+    2. Despeckle: ink pixels with fewer than `min_neighbors` ink neighbours
+       (scanner dust, isolated noise) are dropped.
+    3. Crop to the ink bounding box plus `margin_px`.
+    
+    Args:
+        gray: 2-D uint8 array
+    
+    Returns:
+        ndarray or None: boolean ink mask, None if the tile is blank
+    """
+    h, w = gray.shape
+    radius = max(7, int(max(h, w) * window_frac) // 2)
+
+    # Block means, then window sums over the block grid via cumulative sums
+    bh, bw = -(-h // block_px), -(-w // block_px)
+    padded = np.pad(gray, ((0, bh * block_px - h), (0, bw * block_px - w)), mode="edge")
+    means = padded.reshape(bh, block_px, bw, block_px).mean(axis=(1, 3), dtype=np.float32)
+    r = max(1, round(radius / block_px))
+    sums = _window_sum(means, r, r, axis=1, dtype=np.float32)
+    sums = _window_sum(sums, r, r, axis=0, dtype=np.float32)
+    cols = np.minimum(np.arange(bw) + r, bw - 1) - np.maximum(np.arange(bw) - r, 0) + 1
+    rows = np.minimum(np.arange(bh) + r, bh - 1) - np.maximum(np.arange(bh) - r, 0) + 1
+    limit = sums * ((1.0 - sensitivity) / np.outer(rows, cols)).astype(np.float32)
+    limit = np.repeat(np.repeat(limit, block_px, axis=0), block_px, axis=1)[:h, :w]
+
+    ink = gray < limit
+
+    ink &= _neighbour_count(ink) >= min_neighbors
+
+    ink_rows = np.flatnonzero(ink.any(axis=1))
+    ink_cols = np.flatnonzero(ink.any(axis=0))
+    if ink_rows.size == 0:
+        return None
+
+    top = max(ink_rows[0] - margin_px, 0)
+    bottom = min(ink_rows[-1] + margin_px + 1, h)
+    left = max(ink_cols[0] - margin_px, 0)
+    right = min(ink_cols[-1] + margin_px + 1, w)
+    return ink[top:bottom, left:right]
+
+
+def insert_bilevel_tile(doc, ink):
+    """
+    Add a tile as a 1 bit-per-pixel Flate image on a new page of `doc`.
+    
+    PyMuPDF re-encodes inserted pixmaps at 8 bits per pixel, so the image
+    XObject is written directly from the packed bits instead. The bits are
+    deflated with zlib's default level: MuPDF's own compression of the
+    stream costs over ten times as much for a few percent smaller output.
+    
+    Returns:
+        int: size of the encoded image stream in bytes
+    """
+    h, w = ink.shape
+    xref = doc.get_new_xref()
+    doc.update_object(
+        xref,
+        f"<< /Type /XObject /Subtype /Image /Width {w} /Height {h} "
+        f"/ColorSpace /DeviceGray /BitsPerComponent 1 >>"
+    )
+    # DeviceGray 1-bit: 0 is black, so paper is the set bit
+    doc.update_stream(xref, zlib.compress(np.packbits(~ink, axis=1).tobytes()), compress=False)
+    # Set after the stream: an uncompressed update drops the filter key
+    doc.xref_set_key(xref, "Filter", "/FlateDecode")
+
+    page = doc.new_page(width=w, height=h)
+    page.insert_image(page.rect, xref=xref)
+    return len(doc.xref_stream_raw(xref))
+
+
+def split_pdf_for_ocr(pdf_bytes, dpi=300, overlap_percent=0.02, stats=None, binarize=None):
     """
     Split PDF into 4 quadrants with percentage-based overlap for better OCR.
     
     Args:
         pdf_bytes: PDF file as bytes
-        dpi: DPI for rendering (higher = better quality, slower)
+        dpi: DPI for rendering (higher = better quality, slower). None picks
+            it per page from the estimated text height (see choose_render_dpi)
         overlap_percent: Overlap percentage between quadrants (0.02 = 2%)
+        stats: Optional dict filled with stage timings (orientationMs,
+            renderMs, binarizeMs), per-page DPI, tile / rotated page counts and, when
+            binarizing, blank tiles left out (skippedTiles) and tile bytes as
+            deflated 8-bit gray (what the tile would have cost unbinarized)
+            and as encoded 1-bit images
+        binarize: Encode tiles as cropped 1-bit images (default PDF_BINARIZE)
     
     Returns:
         bytes: Processed PDF as bytes
     """
+    if stats is None:
+        stats = {}
+    if binarize is None:
+        binarize = PDF_BINARIZE
+    render_start = time.perf_counter()
+    stats["tileCount"] = 0
+    stats["skippedTiles"] = 0
+    stats["orientationMs"] = 0.0
+    stats["rotatedPages"] = 0
+    stats["pageDpi"] = []
+    stats["binarizeMs"] = 0.0
+    stats["tileBytesGray"] = None
+    stats["tileBytesEncoded"] = None
+
     try:
         # Open PDF from bytes
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         new_pdf = fitz.open()
 
         for page in doc:
+            # Straighten rotated scans and size the render before the expensive pass
+            orientation_start = time.perf_counter()
+            inspection = inspect_page(page)
+            if inspection["rotation"]:
+                page.set_rotation((page.rotation + inspection["rotation"]) % 360)
+                stats["rotatedPages"] += 1
+            page_dpi = dpi or choose_render_dpi(inspection["glyphPt"])
+            stats["pageDpi"].append(page_dpi)
+            stats["orientationMs"] = round(stats["orientationMs"] + _elapsed_ms(orientation_start), 1)
+
             w, h = page.rect.width, page.rect.height
 
             # 2x2 quadrants
@@ -66,23 +612,43 @@ def split_pdf_for_ocr(pdf_bytes, dpi=300, overlap_percent=0.02):
                     # Render region (rotation is handled automatically by get_pixmap)
                     pix = page.get_pixmap(
                         clip=rect,
-                        dpi=dpi,
+                        dpi=page_dpi,
                         colorspace=fitz.csGRAY
                     )
 
+                    if binarize:
+                        # Baseline: the gray tile as it would be stored (Flate)
+                        gray_bytes = len(zlib.compress(pix.samples))
+                        stats["tileBytesGray"] = (stats["tileBytesGray"] or 0) + gray_bytes
+                        binarize_start = time.perf_counter()
+                        ink = binarize_tile(pixmap_to_gray(pix))
+                        if ink is not None:
+                            encoded = insert_bilevel_tile(new_pdf, ink)
+                            stats["tileBytesEncoded"] = (stats["tileBytesEncoded"] or 0) + encoded
+                            stats["tileCount"] += 1
+                        else:
+                            stats["skippedTiles"] += 1
+                        stats["binarizeMs"] = round(stats["binarizeMs"] + _elapsed_ms(binarize_start), 1)
+                        continue
+
                     new_page = new_pdf.new_page(width=pix.width, height=pix.height)
                     new_page.insert_image(new_page.rect, pixmap=pix)
+                    stats["tileCount"] += 1
 
         # Save to bytes
         output_bytes = new_pdf.tobytes(deflate=True, garbage=4)
         new_pdf.close()
         doc.close()
 
+        stats["renderMs"] = round(
+            _elapsed_ms(render_start) - stats["orientationMs"] - stats["binarizeMs"], 1
+        )
         return output_bytes
 
-    except Exception as e:
-        print(f"Error splitting PDF:")
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error splitting PDF")
+        stats["renderMs"] = _elapsed_ms(render_start)
+        stats["tileCount"] = 0
         # Return original if splitting fails
         return pdf_bytes
 
@@ -98,15 +664,41 @@ def extract_data_from_pdf(pdf_bytes, use_preprocessing, parts_list, has_shell_tu
         has_shell_tube: Whether to extract Shell Side and Tube Side separately
     
     Returns:
-        dict: Extracted data or error info
+        dict: Extracted data or error info. Both carry a "metrics" dict
+        (render ms, payload bytes, tile count, model latency, token counts,
+        retries and cache status) for storing alongside the result.
     """
+    extraction_start = time.perf_counter()
+    metrics = {
+        "inputBytes": len(pdf_bytes) if pdf_bytes else 0,
+        "payloadBytes": len(pdf_bytes) if pdf_bytes else 0,
+        "orientationMs": 0.0,
+        "renderMs": 0.0,
+        "binarizeMs": 0.0,
+        "tileCount": 0,
+        "skippedTiles": 0,
+        "tileBytesGray": None,
+        "tileBytesEncoded": None,
+        "rotatedPages": 0,
+        "pageDpi": [],
+        "modelLatencyMs": None,
+        "inputTokens": None,
+        "outputTokens": None,
+        "totalTokens": None,
+        "retries": 0,
+        "circuitState": None,
+        "cacheStatus": "miss",
+        "totalMs": None,
+    }
+
     try:
         client = get_gemini_client()
 
         # Optionally preprocess PDF
         if use_preprocessing:
-            print("Preprocessing PDF for better OCR...")
-            pdf_bytes = split_pdf_for_ocr(pdf_bytes, dpi=300, overlap_percent=0.02)
+            log.debug("Preprocessing PDF for better OCR")
+            pdf_bytes = split_pdf_for_ocr(pdf_bytes, dpi=None, overlap_percent=0.02, stats=metrics)
+            metrics["payloadBytes"] = len(pdf_bytes)
 
         # ========================================
         # BUILD DYNAMIC BOM SECTION
@@ -255,7 +847,7 @@ REQUIRED JSON FORMAT - MUST FOLLOW THIS EXACT STRUCTURE:
 RESPOND ONLY WITH THE JSON. NO ADDITIONAL TEXT.
 """
 
-        print("The prompt is",prompt)
+        log.debug("Extraction prompt:\n%s", prompt)
         # ========================================
         # SEND REQUEST TO GEMINI
         # ========================================
@@ -272,16 +864,20 @@ RESPOND ONLY WITH THE JSON. NO ADDITIONAL TEXT.
         )
 
         # Send request to Gemini
-        print("Sending request to Gemini AI...")
-        print(f"Parts to extract: {parts_list}")
-        print(f"Has shell/tube: {has_shell_tube}")
+        log.info("Sending request to Gemini (parts: %s, shell/tube: %s)", parts_list, has_shell_tube)
         
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=contents,
-            config=generation_config,
-        )
-        time.sleep(1)  # To avoid rate limits
+        model_start = time.perf_counter()
+        try:
+            response = generate_content_with_retry(
+                client,
+                metrics,
+                model="gemini-2.5-flash",
+                contents=contents,
+                config=generation_config,
+            )
+        finally:
+            metrics["modelLatencyMs"] = _elapsed_ms(model_start)
+        record_usage_metrics(metrics, response)
 
         # ========================================
         # PARSE RESPONSE
@@ -300,30 +896,143 @@ RESPOND ONLY WITH THE JSON. NO ADDITIONAL TEXT.
 
         # Parse JSON
         extracted_data = json.loads(response_text)
-        print(response_text)
-        print("Extraction successful!")
+        log.debug("Gemini response:\n%s", response_text)
+        log.info("Extraction successful")
+        metrics["totalMs"] = _elapsed_ms(extraction_start)
         return {
             "success": True,
-            "data": extracted_data
+            "data": extracted_data,
+            "metrics": metrics
         }
 
     except json.JSONDecodeError as e:
-        print(f"JSON parsing error:")
-        traceback.print_exc()
+        log.exception("JSON parsing error")
+        metrics["totalMs"] = _elapsed_ms(extraction_start)
         return {
             "success": False,
             "message": f"Failed to parse extraction result: {str(e)}",
-            "raw_response": response_text if 'response_text' in locals() else None
+            "raw_response": response_text if 'response_text' in locals() else None,
+            "metrics": metrics
         }
 
-    except Exception as e:
-        print(f"Error extracting data from PDF:")
-        traceback.print_exc()
+    except CircuitOpenError as e:
+        log.warning("Skipping extraction: %s", e)
+        metrics["totalMs"] = _elapsed_ms(extraction_start)
         return {
             "success": False,
-            "message": str(e)
+            "message": str(e),
+            "error_code": "UPSTREAM_UNAVAILABLE",
+            "retry_after": e.retry_after,
+            "metrics": metrics
+        }
+
+    except Exception as e:
+        log.exception("Error extracting data from PDF")
+        metrics["totalMs"] = _elapsed_ms(extraction_start)
+        result = {
+            "success": False,
+            "message": str(e),
+            "metrics": metrics
+        }
+        if _is_retryable(e):
+            result["error_code"] = "UPSTREAM_UNAVAILABLE"
+            result["retry_after"] = _retry_after_hint(e) or GEMINI_RETRY_MAX_DELAY
+        return result
+
+
+def record_usage_metrics(metrics, response):
+    """
+    Copy token usage from a Gemini response into the metrics dict.
+    
+    Gemini caches repeated prompt prefixes implicitly; a non-zero
+    cached_content_token_count means part of this request was served
+    from that cache.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+
+    metrics["inputTokens"] = getattr(usage, "prompt_token_count", None)
+    metrics["outputTokens"] = getattr(usage, "candidates_token_count", None)
+    metrics["totalTokens"] = getattr(usage, "total_token_count", None)
+    cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+    metrics["cacheStatus"] = "hit" if cached_tokens > 0 else "miss"
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize_extraction_metrics(pdfs, top_n=5):
+    """
+    Aggregate the extractionMetrics stored on a task's PDF documents.
+    
+    Args:
+        pdfs: List of PDF metadata dicts (as returned by list_task_pdfs)
+        top_n: How many of the slowest / largest files to list
+    
+    Returns:
+        dict: Totals, averages, p50/p95 latencies and the outlier files
+    """
+    measured = [p for p in pdfs if p.get("extractionMetrics")]
+
+    def column(key):
+        return [
+            p["extractionMetrics"][key] for p in measured
+            if isinstance(p["extractionMetrics"].get(key), (int, float))
+        ]
+
+    def describe(key):
+        values = column(key)
+        return {
+            "avg": round(sum(values) / len(values), 1) if values else None,
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "max": max(values) if values else None,
         }
 
+    def outliers(key):
+        ranked = sorted(
+            (p for p in measured if isinstance(p["extractionMetrics"].get(key), (int, float))),
+            key=lambda p: p["extractionMetrics"][key],
+            reverse=True
+        )
+        return [
+            {
+                "fileId": p.get("fileId") or p.get("id"),
+                "fileName": p.get("fileName"),
+                key: p["extractionMetrics"][key]
+            }
+            for p in ranked[:top_n]
+        ]
+
+    cache_hits = sum(1 for p in measured if p["extractionMetrics"].get("cacheStatus") == "hit")
+
+    return {
+        "files": len(pdfs),
+        "measuredFiles": len(measured),
+        "totalMs": describe("totalMs"),
+        "orientationMs": describe("orientationMs"),
+        "renderMs": describe("renderMs"),
+        "binarizeMs": describe("binarizeMs"),
+        "modelLatencyMs": describe("modelLatencyMs"),
+        "payloadBytes": describe("payloadBytes"),
+        "tileCount": sum(column("tileCount")),
+        "skippedTiles": sum(column("skippedTiles")),
+        "inputTokens": sum(column("inputTokens")),
+        "outputTokens": sum(column("outputTokens")),
+        "retries": sum(column("retries")),
+        "cacheHits": cache_hits,
+        "modelCircuit": get_circuit_breaker_state(),
+        "slowest": outliers("totalMs"),
+        "largestPayloads": outliers("payloadBytes"),
+    }
+
 
 def extract_multiple_pdfs(pdf_files_data):
     """
@@ -342,7 +1051,7 @@ def extract_multiple_pdfs(pdf_files_data):
         file_name = pdf_data.get('file_name')
         pdf_bytes = pdf_data.get('pdf_bytes')
         
-        print(f"Extracting data from: {file_name}")
+        log.info("Extracting data from: %s", file_name)
         
         result = extract_data_from_pdf(pdf_bytes, use_preprocessing=True)
         
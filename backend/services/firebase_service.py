@@ -2,6 +2,9 @@ import firebase_admin
 from firebase_admin import credentials, firestore,auth
 from fastapi import Depends, HTTPException, status, Request
 from datetime import datetime, timezone
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 # Initialize Firebase Admin SDK once
 if not firebase_admin._apps:
@@ -135,7 +138,7 @@ def save_task_to_firestore(created_by, folder_id, task_name, sheet_data, slide_d
         return {"success": True}
 
     except Exception as e:
-        print("Error saving task to Firestore:", e)
+        log.exception("Error saving task to Firestore")
         return {"success": False, "message": str(e)}
 
 def list_user_tasks(user_email):
@@ -184,7 +187,7 @@ def list_user_tasks(user_email):
         return {"success": True, "tasks": sorted_tasks}
 
     except Exception as e:
-        print("Error listing user tasks:", e)
+        log.exception("Error listing user tasks")
         return {"success": False, "message": str(e)}
 
 
@@ -219,7 +222,7 @@ def update_task_in_firestore(task_id: str, updates: dict):
         return {"success": True, "message": "Task updated successfully"}
         
     except Exception as e:
-        print(f"Error updating task in Firestore: {str(e)}")
+        log.exception("Error updating task in Firestore")
         return {"success": False, "message": str(e)}
     
 def list_all_users():
@@ -238,7 +241,7 @@ def list_all_users():
         return {"success": True, "users": users}
 
     except Exception as e:
-        print("Error retrieving users:", e)
+        log.exception("Error retrieving users")
         return {"success": False, "message": str(e)}
 
 # ==================== PDF METADATA FUNCTIONS ====================
@@ -287,7 +290,7 @@ def save_pdf_metadata(task_id, pdf_data):
         return {"success": True}
 
     except Exception as e:
-        print(f"Error saving PDF metadata to Firestore:", e)
+        log.exception("Error saving PDF metadata to Firestore")
         return {"success": False, "message": str(e)}
 
 
@@ -314,7 +317,7 @@ def list_task_pdfs(task_id):
         return {"success": True, "pdfs": pdfs}
 
     except Exception as e:
-        print(f"Error listing task PDFs:", e)
+        log.exception("Error listing task PDFs")
         return {"success": False, "message": str(e)}
 
 
@@ -340,7 +343,7 @@ def update_pdf_metadata(task_id, file_id, updates):
         return {"success": True}
 
     except Exception as e:
-        print(f"Error updating PDF metadata:", e)
+        log.exception("Error updating PDF metadata")
         return {"success": False, "message": str(e)}
 
 
@@ -361,7 +364,7 @@ def delete_pdf_metadata(task_id, file_id):
         return {"success": True}
 
     except Exception as e:
-        print(f"Error deleting PDF metadata:", e)
+        log.exception("Error deleting PDF metadata")
         return {"success": False, "message": str(e)}
 
 
@@ -384,10 +387,53 @@ def get_pdf_metadata(task_id, file_id):
             return pdf_doc.to_dict()
         return None
 
-    except Exception as e:
-        print(f"Error getting PDF metadata:", e)
+    except Exception:
+        log.exception("Error getting PDF metadata")
         return None
 
+def get_sheet_schema(spreadsheet_id):
+    """
+    Get the persisted header schema of a spreadsheet.
+    
+    Args:
+        spreadsheet_id (str): Google Sheet ID
+    
+    Returns:
+        dict: {"templateId", "tabs": {sheetId: {"headerRows", "fingerprint", "headers"}}} or None if not stored
+    """
+    try:
+        schema_doc = db.collection("sheetSchemas").document(spreadsheet_id).get()
+        
+        if schema_doc.exists:
+            return schema_doc.to_dict()
+        return None
+
+    except Exception:
+        log.exception("Error getting sheet schema")
+        return None
+
+
+def save_sheet_schema(spreadsheet_id, schema):
+    """
+    Create or replace the persisted header schema of a spreadsheet.
+    
+    Args:
+        spreadsheet_id (str): Google Sheet ID
+        schema (dict): {"templateId", "tabs"}
+    
+    Returns:
+        dict: {"success": True} or {"success": False, "message": str}
+    """
+    try:
+        schema_ref = db.collection("sheetSchemas").document(spreadsheet_id)
+        schema_ref.set({**schema, "updatedAt": firestore.SERVER_TIMESTAMP})
+        return {"success": True}
+
+    except Exception as e:
+        log.exception("Error saving sheet schema")
+        return {"success": False, "message": str(e)}
+
+
 def update_extracted_data_in_firestore(task_id: str, file_id: str, extracted_data: list):
     """
     Update the extracted data for a specific PDF in Firestore.
@@ -419,7 +465,7 @@ def update_extracted_data_in_firestore(task_id: str, file_id: str, extracted_dat
         return {"success": True, "message": "Extracted data updated successfully"}
         
     except Exception as e:
-        print(f"Error updating extracted data in Firestore: {str(e)}")
+        log.exception("Error updating extracted data in Firestore")
         return {"success": False, "message": str(e)}
     
 def update_overdue_tasks():
@@ -428,7 +474,7 @@ def update_overdue_tasks():
     and status is not Completed.
     """
     try:
-        print("⏰ Running overdue task updater...")
+        log.info("Running overdue task updater")
         today = datetime.now(timezone.utc).date()
 
         tasks_ref = db.collection("tasks")
@@ -453,11 +499,11 @@ def update_overdue_tasks():
                 })
                 updated_count += 1
 
-        print(f"[CRON] Overdue tasks updated: {updated_count}")
+        log.info("Overdue tasks updated: %s", updated_count)
         return {"success": True, "updated": updated_count}
 
     except Exception as e:
-        print("[CRON] Error updating overdue tasks:", e)
+        log.exception("Error updating overdue tasks")
         return {"success": False, "message": str(e)}
     
 # Add to services/firebase_service.py
@@ -0,0 +1,135 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from dotenv import load_dotenv
+from utils.log import get_logger
+
+
+# ===============================================================================
+# CONFIGURATION
+# ===============================================================================
+
+log = get_logger(__name__)
+
+load_dotenv()
+CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+REFRESH_TOKEN = os.getenv("GOOGLE_REFRESH_TOKEN")
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+# Refresh the shared access token this long before it expires
+TOKEN_REFRESH_MARGIN = float(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300"))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "60"))
+
+
+# ===============================================================================
+# SHARED CREDENTIALS & SERVICES
+# ===============================================================================
+#
+# Credentials are process-wide (one access token per scope set, refreshed
+# under a lock shortly before expiry). Built service objects are cached per
+# thread because their httplib2 transport is not thread-safe; FastAPI runs
+# sync work on a thread pool, so each worker thread builds each API once.
+
+_credentials = {}
+_credentials_lock = threading.Lock()
+_local = threading.local()
+
+
+def _token_is_fresh(creds):
+    if not creds.token or not creds.expiry:
+        return False
+    # google-auth keeps expiry as naive UTC
+    return creds.expiry - timedelta(seconds=TOKEN_REFRESH_MARGIN) > datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def get_credentials(scopes):
+    """
+    Return shared OAuth credentials for `scopes` with a valid access token.
+
+    The token endpoint is only hit on first use and when the cached token
+    is within TOKEN_REFRESH_MARGIN seconds of expiry.
+
+    Args:
+        scopes: List of OAuth scope URLs
+
+    Returns:
+        Credentials
+
+    Raises:
+        ValueError: If the OAuth environment variables are missing
+    """
+    key = tuple(sorted(scopes))
+    creds = _credentials.get(key)
+    if creds is not None and _token_is_fresh(creds):
+        return creds
+
+    with _credentials_lock:
+        creds = _credentials.get(key)
+        if creds is None:
+            if not all([CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN]):
+                raise ValueError("GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET and GOOGLE_REFRESH_TOKEN must be set!")
+            creds = Credentials(
+                token=None,
+                refresh_token=REFRESH_TOKEN,
+                client_id=CLIENT_ID,
+                client_secret=CLIENT_SECRET,
+                token_uri=TOKEN_URI,
+                scopes=list(scopes)
+            )
+            _credentials[key] = creds
+
+        # Another thread may have refreshed while we waited for the lock
+        if not _token_is_fresh(creds):
+            try:
+                creds.refresh(Request())
+            except Exception:
+                log.exception("Failed to refresh access token")
+                raise
+        return creds
+
+
+def get_google_service(api, version, scopes):
+    """
+    Return an authorized Google API service object for the calling thread.
+
+    The service (and its HTTP connection) is built once per thread and
+    reused; the access token comes from the shared, lazily refreshed
+    credentials, so repeated calls cost a dict lookup.
+
+    Args:
+        api: API name, e.g. "sheets"
+        version: API version, e.g. "v4"
+        scopes: List of OAuth scope URLs
+
+    Returns:
+        googleapiclient Resource
+    """
+    creds = get_credentials(scopes)
+
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, tuple(sorted(scopes)))
+    cached = services.get(key)
+    if cached is not None and cached[0] is creds:
+        return cached[1]
+
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+    service = build(api, version, http=http, cache_discovery=False)
+    services[key] = (creds, service)
+    return service
+
+
+def reset_google_clients():
+    """Drop the shared credentials and this thread's services (e.g. after rotating the refresh token)."""
+    with _credentials_lock:
+        _credentials.clear()
+    _local.services = {}
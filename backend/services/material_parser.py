@@ -0,0 +1,289 @@
+"""
+Material spec / grade parsing for BOM entries ("SA-516 70" -> ("SA-516", "70"))
+and the part-name -> BOM material lookup used when formatting register rows.
+
+Patterns are compiled once at import and results are memoized on the
+stripped input: a register repeats the same few dozen materials across
+thousands of rows, so almost every call is a cache hit.
+"""
+import re
+from functools import lru_cache
+
+MATERIAL_CACHE_SIZE = 4096
+
+# format_spec_with_dash: letters / slashes / spaces, then the first digit
+_SPEC_JUNCTION = re.compile(r'^([A-Z\s/]+?)\s*(\d.*)$', re.IGNORECASE)
+# Case 1: explicit GR / GRADE / G prefix
+_GRADE_PREFIX = re.compile(r'[\s-]*(GR\.?|GRADE\.?|G\.?)[\s-]*(.+)$', re.IGNORECASE)
+# Cases 2 and 3: [ASME/ASTM] PREFIX [sep] NUMBER REMAINDER (separator optional for SA403-WP316)
+_SPEC = re.compile(r'^((?:ASME\s+|ASTM\s+)?[A-Z]+)[\s-]?(\d+)\s*(.*)$', re.IGNORECASE)
+# Standalone grade in a multi-spec part (case-sensitive, as upper-case grades only)
+_BARE_GRADE = re.compile(r'^[A-Z]*[0-9]+[A-Z]*$')
+# Modifier + grade: "M 316L"
+_MODIFIER_GRADE = re.compile(r'^([A-Z])\s+([0-9]+[A-Z]*)$', re.IGNORECASE)
+# Grade only: "304L", "316", "70", "TP316", "WP316"
+_GRADE = re.compile(r'^([A-Z]*[0-9]+[A-Z]*)$', re.IGNORECASE)
+# Case 4: trailing grade after a formatted spec (case-sensitive)
+_TAIL_GRADE = re.compile(r'\s+([A-Z]*[0-9]+[A-Z]*)$')
+
+
+@lru_cache(maxsize=MATERIAL_CACHE_SIZE)
+def _format_spec_with_dash(spec):
+    match = _SPEC_JUNCTION.match(spec)
+
+    if match:
+        letter_part = match.group(1).strip()
+        number_part = match.group(2).strip()
+
+        # Check if dash already exists at the junction
+        if letter_part.endswith('-') or number_part.startswith('-'):
+            return spec
+
+        return f"{letter_part}-{number_part}"
+
+    return spec
+
+
+def format_spec_with_dash(spec):
+    """
+    Ensure spec has dash between letters and numbers.
+    Handles specs with slashes and spaces.
+
+    Examples:
+        "SA516" -> "SA-516"
+        "SA-516" -> "SA-516" (already has dash)
+        "A240" -> "A-240"
+        "A/SA 516" -> "A/SA-516"
+        "ASME SA516" -> "ASME SA-516"
+    """
+    if not spec:
+        return spec
+    return _format_spec_with_dash(spec.strip())
+
+
+@lru_cache(maxsize=MATERIAL_CACHE_SIZE)
+def _split_spec_grade(material):
+    # ========================================
+    # CASE 1: Explicit GR/GRADE/G prefix
+    # ========================================
+    # Matches: "SA-240-Gr.316/316L", "A516 Gr.70", "SA-240 Grade 316"
+    m = _GRADE_PREFIX.search(material)
+    if m:
+        grade = m.group(2).strip()
+        # Remove trailing dashes/spaces from spec part
+        spec_part = material[:m.start()].strip().rstrip('-').rstrip()
+        return format_spec_with_dash(spec_part), grade
+
+    # ========================================
+    # CASE 2: Multiple specs with slash (/)
+    # ========================================
+    # Matches: "SA-240 M 316L/SA 240 316L", "SA-516 316/316L"
+    if '/' in material:
+        specs = []
+        grades = []
+
+        for part in (p.strip() for p in material.split('/')):
+            match = _SPEC.match(part)
+            if not match:
+                # No spec pattern, might be standalone grade
+                if part and _BARE_GRADE.match(part):
+                    grades.append(part)
+                continue
+
+            prefix = match.group(1).strip()    # "SA", "ASTM A"
+            number = match.group(2)             # "240", "516"
+            remainder = match.group(3).strip().lstrip('-').strip()  # "M 316L", "304L", "316"
+
+            spec_base = f"{prefix}-{number}"
+
+            mod_match = _MODIFIER_GRADE.match(remainder)
+            if mod_match:
+                specs.append(f"{spec_base} {mod_match.group(1)}")
+                grades.append(mod_match.group(2))
+                continue
+
+            grade_match = _GRADE.match(remainder)
+            if grade_match:
+                specs.append(spec_base)
+                grades.append(grade_match.group(1))
+                continue
+
+            # No grade in this part
+            specs.append(spec_base)
+
+        if specs:
+            # Remove duplicates while preserving order
+            spec_combined = ' / '.join(dict.fromkeys(specs))
+            grade_combined = '/'.join(dict.fromkeys(grades)) if grades else ""
+            return spec_combined, grade_combined
+
+    # ========================================
+    # CASE 3: Single spec pattern
+    # ========================================
+    # Matches: "SA-516 70", "ASTM A-240 304L", "SA-240 M 316L", "SA-240-316", "SA403-WP316"
+    m = _SPEC.match(material)
+    if m:
+        prefix = m.group(1).strip()     # "SA", "ASTM A", "A"
+        number = m.group(2)              # "240", "516", "403"
+        remainder = m.group(3).strip().lstrip('-').strip()   # "304L", "M 316L", "70", "TP316"
+
+        spec_base = f"{prefix}-{number}"
+
+        mod_match = _MODIFIER_GRADE.match(remainder)
+        if mod_match:
+            return f"{spec_base} {mod_match.group(1)}", mod_match.group(2)
+
+        grade_match = _GRADE.match(remainder)
+        if grade_match:
+            return spec_base, grade_match.group(1)
+
+        # No grade
+        return spec_base, ""
+
+    # ========================================
+    # CASE 4: Fallback - format and extract
+    # ========================================
+    formatted_spec = format_spec_with_dash(material)
+
+    # Last attempt: extract trailing grade from formatted spec
+    tail_grade = _TAIL_GRADE.search(formatted_spec)
+    if tail_grade:
+        return formatted_spec[:tail_grade.start()].strip(), tail_grade.group(1)
+
+    # No grade found
+    return formatted_spec, ""
+
+
+def split_spec_grade(material):
+    """
+    Parse material string to extract Spec and Grade.
+    Handles all formats including GR prefix, multi-spec, modifiers, etc.
+
+    Examples:
+        "SA-516 70" -> ("SA-516", "70")
+        "SA-240-Gr.316/316L" -> ("SA-240", "316/316L")
+        "ASTM A-240 304L" -> ("ASTM A-240", "304L")
+        "SA-240 M 316L / SA 240 316L" -> ("SA-240 M / SA-240", "316L")
+        "A516 Gr.70" -> ("A-516", "70")
+        "SA-240-316" -> ("SA-240", "316")
+        "SA-213-TP316" -> ("SA-213", "TP316")
+        "SA403-WP316" -> ("SA-403", "WP316")
+    """
+    if not material:
+        return "", ""
+    return _split_spec_grade(material.strip())
+
+
+def parse_materials(materials):
+    """
+    Batch split_spec_grade; repeated strings within the batch are parsed once.
+
+    Args:
+        materials: Iterable of material strings (None / "" allowed)
+
+    Returns:
+        list of (spec, grade) tuples in input order
+    """
+    results = {}
+    parsed = []
+    for material in materials:
+        result = results.get(material)
+        if result is None:
+            result = results[material] = split_spec_grade(material)
+        parsed.append(result)
+    return parsed
+
+
+def material_cache_info():
+    """lru_cache statistics of the spec/grade memo (hits, misses, currsize)."""
+    return _split_spec_grade.cache_info()
+
+
+# -----------------------------
+# BOM LOOKUP
+# -----------------------------
+# Synonym classes tried (in order) when a part name is not itself a BOM key:
+# class -> (words the part name must contain, normalized BOM keys to try).
+# Only the first matching class of each group applies, as "Top Channel"
+# must not fall through to the generic channel entry of the same group.
+BOM_SYNONYM_GROUPS = (
+    (
+        ("topchannel", ("TOP", "CHANNEL"), ("topchannel", "channel")),
+        ("bottomchannel", ("BOTTOM", "CHANNEL"), ("bottomchannel", "channel")),
+        ("channel", ("CHANNEL",), ("channel",)),
+    ),
+    (("tube", ("TUBE",), ("tube",)),),
+    (("shell", ("SHELL",), ("shell",)),),
+    (
+        ("tophead", ("TOP", "HEAD"), ("tophead", "head")),
+        ("bottomhead", ("BOTTOM", "HEAD"), ("bottomhead", "head")),
+        ("head", ("HEAD",), ("head",)),
+    ),
+)
+
+_KEY_NOISE = re.compile(r'[\s_\-]+')
+
+
+def bom_key(name):
+    """Normalized BOM / part key: casefolded, without whitespace, '_' or '-'."""
+    return _KEY_NOISE.sub('', str(name)).casefold()
+
+
+class BomIndex:
+    """
+    Material lookup over one BillOfMaterial, built once per PDF.
+
+    BOM keys are normalized with bom_key ("Top Channel", "TopChannel" and
+    "TOP CHANNEL" are one entry) and each synonym class is resolved up front,
+    so a part resolves with a key lookup plus at most one class lookup.
+    Results are memoized per part name, as register rows repeat the same
+    handful of parts.
+    """
+
+    def __init__(self, bom):
+        self.materials = {}
+        for key, material in (bom or {}).items():
+            if not isinstance(material, str):
+                continue
+            material = material.strip()
+            if material and material.lower() != "no":
+                self.materials.setdefault(bom_key(key), material)
+
+        self.classes = {}
+        for group in BOM_SYNONYM_GROUPS:
+            for name, _, candidates in group:
+                for candidate in candidates:
+                    if candidate in self.materials:
+                        self.classes[name] = self.materials[candidate]
+                        break
+
+        self._resolved = {}
+
+    def material(self, part):
+        """
+        Material for a sheet PARTS value.
+
+        Args:
+            part: Part name from the register ("Top Channel", "Shell"...)
+
+        Returns:
+            str: Material string, "" if the BOM has none for this part
+        """
+        material = self._resolved.get(part)
+        if material is None:
+            material = self._resolved[part] = self._lookup(part)
+        return material
+
+    def _lookup(self, part):
+        material = self.materials.get(bom_key(part))
+        if material:
+            return material
+
+        part_upper = part.upper()
+        for group in BOM_SYNONYM_GROUPS:
+            for name, words, _ in group:
+                if all(word in part_upper for word in words):
+                    if name in self.classes:
+                        return self.classes[name]
+                    break
+        return ""
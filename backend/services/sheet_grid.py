@@ -0,0 +1,461 @@
+"""
+Parsed view of one spreadsheet tab.
+
+Pure Python over the `spreadsheets.get(includeGridData=True)` response, so it
+can be built once per fetch and shared by every sheet reader.
+"""
+
+from bisect import bisect_right
+from collections.abc import MutableMapping
+
+YELLOW_RGB = {'red': 1.0, 'green': 1.0, 'blue': 0.0}
+TOLERANCE = 0.1
+
+EQUIPMENT_NO_KEY = "EQUIPMENT NO."
+NO_KEYS = ("NO", "NO.")
+
+
+def col_idx_to_letter(idx: int) -> str:
+    letters = ''
+    while idx >= 0:
+        letters = chr(idx % 26 + 65) + letters
+        idx = idx // 26 - 1
+    return letters
+
+
+def is_yellow_cell(cell):
+    if not cell or 'userEnteredFormat' not in cell:
+        return False
+    fmt = cell.get('userEnteredFormat', {})
+    color = fmt.get('backgroundColor', {})
+    return all(abs(color.get(c, 0) - YELLOW_RGB[c]) < TOLERANCE for c in ['red', 'green', 'blue'])
+
+
+def get_merge_range(row_idx, col_idx, merges):
+    for merge in merges:
+        if (merge['startRowIndex'] <= row_idx < merge['endRowIndex'] and
+            merge['startColumnIndex'] <= col_idx < merge['endColumnIndex']):
+            return _merge_info(merge)
+    return None
+
+
+def _merge_info(merge):
+    return {
+        'startRow': merge['startRowIndex'],
+        'endRow': merge['endRowIndex'],
+        'startCol': merge['startColumnIndex'],
+        'endCol': merge['endColumnIndex'],
+        'rowSpan': merge['endRowIndex'] - merge['startRowIndex'],
+        'colSpan': merge['endColumnIndex'] - merge['startColumnIndex']
+    }
+
+
+class MergeIndex:
+    """
+    Merged ranges of a tab indexed by column, for O(log n) "which merge covers
+    (row, col)" queries instead of get_merge_range's scan of every merge.
+
+    Sheets merges never overlap, so within one column the ranges are disjoint
+    row intervals: keep them sorted by start row and bisect.
+    """
+
+    def __init__(self, merges):
+        by_column = {}
+        self._starting = {}
+        for merge in merges:
+            for col in range(merge['startColumnIndex'], merge['endColumnIndex']):
+                by_column.setdefault(col, []).append(merge)
+            self._starting.setdefault(merge['startColumnIndex'], []).append(merge)
+
+        self._starts = {}
+        self._merges = {}
+        for col, col_merges in by_column.items():
+            col_merges.sort(key=lambda m: m['startRowIndex'])
+            self._starts[col] = [m['startRowIndex'] for m in col_merges]
+            self._merges[col] = col_merges
+
+    def find(self, row_idx, col_idx):
+        """Same result as get_merge_range(row_idx, col_idx, merges)."""
+        starts = self._starts.get(col_idx)
+        if not starts:
+            return None
+        i = bisect_right(starts, row_idx) - 1
+        if i < 0:
+            return None
+        merge = self._merges[col_idx][i]
+        if row_idx < merge['endRowIndex']:
+            return _merge_info(merge)
+        return None
+
+    def starting_in_column(self, col_idx):
+        """Merges whose top-left cell is in column `col_idx`, in input order."""
+        return self._starting.get(col_idx, [])
+
+
+def _cell_text(cell):
+    return cell.get('formattedValue', '').strip() if cell else ''
+
+
+class RowSchema:
+    """
+    Header layout shared by every row of a tab: header order, header ->
+    position, and the sheet column each header is read from (the last one
+    when two columns carry the same header).
+    """
+
+    __slots__ = ('headers', 'index', 'columns')
+
+    def __init__(self, headers):
+        """
+        Args:
+            headers: Column letter -> header text
+        """
+        source = {}
+        for col_idx in sorted(SheetGrid.column_index(c) for c in headers):
+            header = headers[col_idx_to_letter(col_idx)]
+            if header:
+                source[header] = col_idx
+        self.headers = tuple(source)
+        self.index = {h: i for i, h in enumerate(self.headers)}
+        self.columns = tuple(source.values())
+
+    def values_from(self, texts):
+        """Row values for a list of stripped cell texts indexed by column."""
+        width = len(texts)
+        return tuple(texts[c] if c < width else '' for c in self.columns)
+
+
+class SheetRow(MutableMapping):
+    """
+    One header-mapped row: the tab's shared RowSchema plus a values list.
+
+    Behaves like the {header: value} dict the readers used to return (get,
+    [], in, items, dict(row), == with dicts); keys outside the schema set by
+    callers (e.g. format_rows_with_pdf) go to a small per-row overflow dict.
+    Convert with to_dict() / rows_to_dicts() where rows leave the service
+    layer (JSON responses, Firestore).
+    """
+
+    __slots__ = ('schema', 'values', 'extra')
+
+    def __init__(self, schema, values, extra=None):
+        self.schema = schema
+        self.values = values
+        self.extra = extra
+
+    def __getitem__(self, key):
+        position = self.schema.index.get(key)
+        if position is not None:
+            return self.values[position]
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        position = self.schema.index.get(key)
+        if position is not None:
+            self.values[position] = value
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if self.extra is not None and key in self.extra:
+            del self.extra[key]
+        elif key in self.schema.index:
+            raise TypeError(f"Cannot remove sheet column {key!r} from a row")
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        yield from self.schema.headers
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(self.schema.headers) + (len(self.extra) if self.extra else 0)
+
+    def __contains__(self, key):
+        return key in self.schema.index or (self.extra is not None and key in self.extra)
+
+    def __repr__(self):
+        return f"SheetRow({self.to_dict()!r})"
+
+    def copy(self):
+        return SheetRow(self.schema, list(self.values), dict(self.extra) if self.extra else None)
+
+    def to_dict(self):
+        row = dict(zip(self.schema.headers, self.values))
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+
+def rows_to_dicts(rows):
+    """Plain dicts for JSON / Firestore; dict rows pass through unchanged."""
+    return [row.to_dict() if isinstance(row, SheetRow) else row for row in rows]
+
+
+class SheetGrid:
+    """
+    One tab parsed once: yellow-header map, header-mapped rows, merged-cell
+    fill-down for the EQUIPMENT NO. / NO. columns and lookup indexes on both.
+
+    Rows are stored as value tuples against one shared RowSchema; lookups
+    return fresh SheetRow objects, so callers may modify them freely.
+    """
+
+    def __init__(self, sheet_data, headers=None):
+        """
+        Args:
+            sheet_data: One entry of the `sheets` list from spreadsheets.get
+                (properties, merges, data[0].rowData)
+            headers: Known column letter -> header map (e.g. a persisted
+                schema); skips yellow-cell detection
+        """
+        properties = sheet_data.get('properties', {})
+        self.title = properties.get('title')
+        self.sheet_id = properties.get('sheetId')
+
+        data = sheet_data.get('data') or [{}]
+        self.row_data = data[0].get('rowData', [])
+        self.merges = sheet_data.get('merges', [])
+        self.merge_index = MergeIndex(self.merges)
+
+        self.headers = dict(headers) if headers is not None else self._build_headers()
+
+        self.equipment_col = next(
+            (c for c, h in self.headers.items() if EQUIPMENT_NO_KEY in h.upper()), None
+        )
+        self.no_col = next(
+            (c for c, h in self.headers.items() if h.upper() in NO_KEYS), None
+        )
+
+        self.row_schema = RowSchema(self.headers)
+        self._rows = self._map_rows()
+        self._equipment_fill = self._merged_values(self.equipment_col)
+        self._no_fill = self._merged_values(self.no_col)
+        self._equipment_index = self._build_index(self.equipment_col, self._equipment_fill)
+        self._no_index = self._build_index(self.no_col, self._no_fill)
+        self._first_rows = {}
+
+    @classmethod
+    def from_response(cls, result, sheet_index=0):
+        """Build from a full spreadsheets.get response."""
+        return cls(result['sheets'][sheet_index])
+
+    @classmethod
+    def from_parts(cls, properties, merges, header_rows, value_rows, headers=None):
+        """
+        Build from a split fetch: formatted grid rows for the header band plus
+        plain formatted values (values.get/batchGet, ROWS) for the rows below it.
+
+        Value rows are padded to the widest header column so every mapped row
+        carries every header; fully empty rows are skipped as in grid data.
+
+        Args:
+            properties: Sheet properties (title, sheetId, ...)
+            merges: The tab's merged ranges
+            header_rows: rowData of the first len(header_rows) rows, with formatting
+            value_rows: List of value lists for the rows after the band
+            headers: Known header map; header_rows may then be empty and
+                value_rows start at the first sheet row
+        """
+        if headers is not None:
+            width = max((cls.column_index(c) + 1 for c in headers), default=0)
+        else:
+            # Header extent: yellow cells, widened by the merges they start
+            merge_ends = {(m['startRowIndex'], m['startColumnIndex']): m['endColumnIndex'] for m in merges}
+            width = 0
+            for row_idx, row in enumerate(header_rows):
+                for col_idx, cell in enumerate(row.get('values', [])):
+                    if is_yellow_cell(cell):
+                        width = max(width, merge_ends.get((row_idx, col_idx), col_idx + 1))
+
+        row_data = list(header_rows)
+        for values in value_rows:
+            if not values:
+                row_data.append({})
+                continue
+            cells = [{'formattedValue': v if isinstance(v, str) else str(v)} for v in values]
+            cells.extend({} for _ in range(width - len(cells)))
+            row_data.append({'values': cells})
+
+        return cls({'properties': properties, 'merges': merges, 'data': [{'rowData': row_data}]}, headers=headers)
+
+    # ---------------------------------------------------------------------
+    # Parsing
+    # ---------------------------------------------------------------------
+
+    def _build_headers(self):
+        """Column letter -> hierarchical header text from the yellow cells."""
+        yellow_cells = []
+        for row_idx, row in enumerate(self.row_data):
+            if 'values' not in row:
+                continue
+            for col_idx, cell in enumerate(row['values']):
+                if is_yellow_cell(cell):
+                    value = cell.get('formattedValue', '').strip()
+                    if not value:
+                        continue
+                    merge_info = self.merge_index.find(row_idx, col_idx)
+                    is_merge_primary = merge_info and merge_info['startRow'] == row_idx and merge_info['startCol'] == col_idx
+                    yellow_cells.append({
+                        'row': row_idx,
+                        'col': col_idx,
+                        'value': value,
+                        'merge_info': merge_info if is_merge_primary else None
+                    })
+
+        # Top-to-bottom, left-to-right
+        yellow_cells.sort(key=lambda x: (x['row'], x['col']))
+
+        column_headers = {}
+        for cell in yellow_cells:
+            col_letter = col_idx_to_letter(cell['col'])
+            merge_info = cell['merge_info']
+            column_headers.setdefault(col_letter, []).append(cell['value'])
+            if merge_info:
+                for spanned_col in range(cell['col'] + 1, cell['col'] + merge_info['colSpan']):
+                    column_headers[col_idx_to_letter(spanned_col)] = column_headers[col_letter].copy()
+
+        headers = {}
+        for col_letter in sorted(column_headers.keys()):
+            unique_headers = list(dict.fromkeys(column_headers[col_letter]))
+            headers[col_letter] = ' '.join(unique_headers).replace('\n', ' ').replace('\r', ' ').strip()
+        return headers
+
+    def _map_rows(self):
+        """(row_idx, values tuple in row_schema order) for every row that has cell values."""
+        schema = self.row_schema
+        width = max(schema.columns, default=-1) + 1
+        rows = []
+        for row_idx, row in enumerate(self.row_data):
+            if 'values' not in row:
+                continue
+            texts = [_cell_text(cell) for cell in row['values'][:width]]
+            rows.append((row_idx, schema.values_from(texts)))
+        return rows
+
+    def _merged_values(self, col_letter):
+        """row_idx -> value of the merged block covering `col_letter` in that row."""
+        fill = {}
+        if not col_letter:
+            return fill
+        start_col = self.column_index(col_letter)
+        for merge in self.merge_index.starting_in_column(start_col):
+            start_row = merge['startRowIndex']
+            value = _cell_text(self.cell(start_row, start_col))
+            for r in range(start_row, merge['endRowIndex']):
+                fill[r] = value
+        return fill
+
+    def _build_index(self, col_letter, fill):
+        """Upper-cased (filled-down) key value -> row positions in self._rows."""
+        index = {}
+        if not col_letter:
+            return index
+        column = self.row_schema.index[self.headers[col_letter]]
+        for position, (row_idx, values) in enumerate(self._rows):
+            value = values[column] or fill.get(row_idx, '')
+            index.setdefault(value.upper(), []).append(position)
+        return index
+
+    def _filled_row(self, position, col_letter, fill):
+        row_idx, values = self._rows[position]
+        values = list(values)
+        column = self.row_schema.index[self.headers[col_letter]]
+        if not values[column]:
+            values[column] = fill.get(row_idx, '')
+        return SheetRow(self.row_schema, values)
+
+    # ---------------------------------------------------------------------
+    # Lookups
+    # ---------------------------------------------------------------------
+
+    @staticmethod
+    def column_index(col_letter):
+        """Inverse of col_idx_to_letter ('A' -> 0, 'AA' -> 26)."""
+        idx = 0
+        for ch in col_letter:
+            idx = idx * 26 + (ord(ch) - 64)
+        return idx - 1
+
+    def column_segments(self):
+        """
+        Header columns grouped into runs of adjacent columns, in sheet order:
+        [[(col_idx, header), ...], ...]. Each run can be written as one range.
+        """
+        segments = []
+        for col_idx in sorted(self.column_index(c) for c in self.headers):
+            entry = (col_idx, self.headers[col_idx_to_letter(col_idx)])
+            if segments and segments[-1][-1][0] == col_idx - 1:
+                segments[-1].append(entry)
+            else:
+                segments.append([entry])
+        return segments
+
+    def first_rows(self, col_letter, min_row=0):
+        """
+        Hash index of a column's own (not filled-down) values:
+        upper-cased value -> first row index >= min_row holding it.
+        Built on first use and kept on the grid.
+        """
+        key = (col_letter, min_row)
+        cached = self._first_rows.get(key)
+        if cached is not None:
+            return cached
+
+        col_idx = self.column_index(col_letter)
+        index = {}
+        for row_idx in range(min_row, len(self.row_data)):
+            value = _cell_text(self.cell(row_idx, col_idx))
+            if value:
+                index.setdefault(value.upper(), row_idx)
+        self._first_rows[key] = index
+        return index
+
+    def cell(self, row_idx, col_idx):
+        """Raw cell dict at (row_idx, col_idx), or None."""
+        if row_idx >= len(self.row_data):
+            return None
+        values = self.row_data[row_idx].get('values', [])
+        return values[col_idx] if col_idx < len(values) else None
+
+    def rows_by_equipment(self, equipment_no):
+        """Rows whose EQUIPMENT NO. (merged cells filled down) matches, case-insensitive."""
+        if not self.equipment_col:
+            return []
+        return [
+            self._filled_row(p, self.equipment_col, self._equipment_fill)
+            for p in self._equipment_index.get(equipment_no.upper(), [])
+        ]
+
+    def equipment_index(self):
+        """
+        Upper-cased (filled-down) EQUIPMENT NO. -> number of rows; blanks and
+        the header cell itself are left out.
+        """
+        if not self.equipment_col:
+            return {}
+        header = self.headers[self.equipment_col].upper()
+        return {key: len(positions) for key, positions in self._equipment_index.items() if key and key != header}
+
+    def rows_by_no(self, no):
+        """Rows whose NO. (merged cells filled down) matches, case-insensitive."""
+        if not self.no_col:
+            return []
+        return [
+            self._filled_row(p, self.no_col, self._no_fill)
+            for p in self._no_index.get(no.upper(), [])
+        ]
+
+    def rows_with_numeric_no(self):
+        """Rows whose filled-down NO. is a plain number, in sheet order."""
+        if not self.no_col:
+            return []
+        positions = sorted(
+            p for key, ps in self._no_index.items() if key.strip().isdigit() for p in ps
+        )
+        return [self._filled_row(p, self.no_col, self._no_fill) for p in positions]
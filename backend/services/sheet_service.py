@@ -1,246 +1,629 @@
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-import os, json, traceback
+import os, json
+import hashlib
 import re
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv 
+from services.google_client import get_google_service
+from services.sheet_grid import (
+    EQUIPMENT_NO_KEY, NO_KEYS, RowSchema, SheetGrid, SheetRow, col_idx_to_letter, is_yellow_cell
+)
+from services.drive_service import get_file_revision
+from services.material_parser import BomIndex, split_spec_grade
+from services.unit_normalizer import normalize_pressures, normalize_temperatures
+from utils.log import get_logger
 
 load_dotenv()
-# Your OAuth credentials from environment variables
-GOOGLE_REFRESH_TOKEN = os.getenv("GOOGLE_REFRESH_TOKEN")
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 SPREADSHEET_ID = "1cftK61YjCxjY9S4gP6BylwTXXk9NtyqGs0Tt1gd-ZmE"
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+log = get_logger(__name__)
+
+# Parsed-grid cache: entries younger than SHEET_REVISION_CHECK_SECONDS are
+# served as-is, older ones are revalidated against the Drive file version and
+# anything older than SHEET_CACHE_TTL_SECONDS is always re-fetched.
+SHEET_CACHE_TTL_SECONDS = float(os.getenv("SHEET_CACHE_TTL_SECONDS", "600"))
+SHEET_REVISION_CHECK_SECONDS = float(os.getenv("SHEET_REVISION_CHECK_SECONDS", "10"))
+
+# values.batchUpdate execution: chunk limits, parallel requests and retries
+SHEET_WRITE_MAX_RANGES = int(os.getenv("SHEET_WRITE_MAX_RANGES", "200"))
+SHEET_WRITE_MAX_BYTES = int(os.getenv("SHEET_WRITE_MAX_BYTES", "1000000"))
+SHEET_WRITE_CONCURRENCY = int(os.getenv("SHEET_WRITE_CONCURRENCY", "3"))
+SHEET_WRITE_MAX_ATTEMPTS = int(os.getenv("SHEET_WRITE_MAX_ATTEMPTS", "3"))
+SHEET_WRITE_RETRY_DELAY = float(os.getenv("SHEET_WRITE_RETRY_DELAY", "1.0"))
+RETRYABLE_HTTP_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Service used instead of the Google client when set (e.g. the in-memory
+# testing.sheet_emulator.SheetsEmulator for offline benchmarks)
+_sheets_service_override = None
+
+
+def set_sheets_service(service):
+    """Route every Sheets call through `service`; None restores the Google client."""
+    global _sheets_service_override
+    _sheets_service_override = service
 
-YELLOW_RGB = {'red': 1.0, 'green': 1.0, 'blue': 0.0}
-TOLERANCE = 0.1
 
 def get_sheets_service():
-    """Authenticate using OAuth credentials and return Google Sheets service"""
+    """Return the shared, already-authorized Google Sheets service for this thread"""
+    if _sheets_service_override is not None:
+        return _sheets_service_override
     try:
-        creds = Credentials(
-            token=None,
-            refresh_token=GOOGLE_REFRESH_TOKEN,
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET,
-            token_uri="https://oauth2.googleapis.com/token",
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
-        )
-        creds.refresh(Request())
-        service = build('sheets', 'v4', credentials=creds)
-        return service
+        return get_google_service('sheets', 'v4', SHEETS_SCOPES)
     except Exception:
-        traceback.print_exc()
+        log.exception("Could not build the Sheets service")
         return None
 
 
-def col_idx_to_letter(idx: int) -> str:
-    letters = ''
-    while idx >= 0:
-        letters = chr(idx % 26 + 65) + letters
-        idx = idx // 26 - 1
-    return letters
+# Yellow header cells live in the first rows of the register; only this band
+# is fetched with formatting, everything below comes as plain values.
+SHEET_HEADER_ROWS = int(os.getenv("SHEET_HEADER_ROWS", "10"))
 
 
-def is_yellow_cell(cell):
-    if not cell or 'userEnteredFormat' not in cell:
-        return False
-    fmt = cell.get('userEnteredFormat', {})
-    color = fmt.get('backgroundColor', {})
-    return all(abs(color.get(c, 0) - YELLOW_RGB[c]) < TOLERANCE for c in ['red', 'green', 'blue'])
+def a1_range(sheet_title, cells):
+    """Quote a sheet title for A1 notation: a1_range("Unit 1", "A1:C2") -> "'Unit 1'!A1:C2"."""
+    return "'{}'!{}".format(sheet_title.replace("'", "''"), cells)
 
 
-def get_merge_range(row_idx, col_idx, merges):
-    for merge in merges:
-        if (merge['startRowIndex'] <= row_idx < merge['endRowIndex'] and
-            merge['startColumnIndex'] <= col_idx < merge['endColumnIndex']):
-            return {
-                'startRow': merge['startRowIndex'],
-                'endRow': merge['endRowIndex'],
-                'startCol': merge['startColumnIndex'],
-                'endCol': merge['endColumnIndex'],
-                'rowSpan': merge['endRowIndex'] - merge['startRowIndex'],
-                'colSpan': merge['endColumnIndex'] - merge['startColumnIndex']
+# ---------------------------------------------------------------------
+# Header schema registry
+# ---------------------------------------------------------------------
+#
+# The column -> header map only changes when someone edits the header rows,
+# so a tab whose map is registered skips the formatted header-band request:
+# its header rows come back with the values read, and a fingerprint of their
+# non-empty cells (header_fingerprint) confirms the registered map still
+# applies. Only a tab whose header rows changed has its band fetched again.
+# The registry (Firestore `sheetSchemas`, one document per spreadsheet
+# holding all tabs by sheetId) is read once per process and spreadsheet and
+# written only when a derived map is new or different. Copies made from a
+# template inherit the template's document without any fetch. Firestore is
+# imported lazily so the sheet readers keep working (without the registry)
+# where Firebase is not configured.
+
+_schema_store_override = None
+_schema_memo = {}  # spreadsheet_id -> sheetId (str) -> {"headerRows", "fingerprint", "headers"}
+_schema_lock = threading.Lock()
+
+
+def set_schema_store(store):
+    """Use `store` (get_sheet_schema / save_sheet_schema) as the registry; None restores Firestore."""
+    global _schema_store_override
+    _schema_store_override = store
+    with _schema_lock:
+        _schema_memo.clear()
+
+
+def _schema_store():
+    if _schema_store_override is not None:
+        return _schema_store_override
+    try:
+        from services import firebase_service
+        return firebase_service
+    except Exception:
+        log.exception("Header schema store unavailable")
+        return None
+
+
+def header_fingerprint(value_rows):
+    """
+    Hash of the non-empty cells (position and formatted value) of a tab's
+    header rows. The same for the formatted band and for plain values.
+    """
+    cells = [
+        (row_idx, col_idx, value.strip() if isinstance(value, str) else str(value))
+        for row_idx, row in enumerate(value_rows)
+        for col_idx, value in enumerate(row)
+        if (value.strip() if isinstance(value, str) else str(value))
+    ]
+    return hashlib.sha1(json.dumps(cells, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _schema_entry(merges, header_rows, headers):
+    """Registry entry for a tab parsed from its formatted header band."""
+    # Header rows: down to the last row a yellow cell (or its merge) covers
+    merge_ends = {(m['startRowIndex'], m['startColumnIndex']): m['endRowIndex'] for m in merges}
+    count = 0
+    for row_idx, row in enumerate(header_rows):
+        for col_idx, cell in enumerate(row.get('values', [])):
+            if is_yellow_cell(cell):
+                count = max(count, merge_ends.get((row_idx, col_idx), row_idx + 1))
+    values = [[cell.get('formattedValue', '') for cell in row.get('values', [])] for row in header_rows[:count]]
+    return {"headerRows": count, "fingerprint": header_fingerprint(values), "headers": dict(headers)}
+
+
+def get_header_schemas(spreadsheet_id):
+    """
+    Registered header maps of a spreadsheet's tabs (read from the store once
+    per process).
+
+    Returns:
+        dict: sheetId (str) -> {"headerRows", "fingerprint", "headers":
+        column letter -> header} ({} when nothing is registered)
+    """
+    with _schema_lock:
+        schemas = _schema_memo.get(spreadsheet_id)
+    if schemas is not None:
+        return schemas
+
+    store = _schema_store()
+    schema = store.get_sheet_schema(spreadsheet_id) if store else None
+    schemas = {
+        sheet_id: {
+            "headerRows": tab["headerRows"],
+            "fingerprint": tab["fingerprint"],
+            "headers": {entry["col"]: entry["header"] for entry in tab["headers"]},
+        }
+        for sheet_id, tab in ((schema or {}).get("tabs") or {}).items()
+        if tab.get("fingerprint") and tab.get("headerRows")
+    }
+    with _schema_lock:
+        return _schema_memo.setdefault(spreadsheet_id, schemas)
+
+
+def save_header_schemas(spreadsheet_id, tabs):
+    """
+    Register newly derived header maps, all tabs in one document write.
+
+    Args:
+        tabs: sheetId (str) -> _schema_entry dict, or None to drop the tab
+    """
+    if not tabs:
+        return
+    store = _schema_store()
+
+    # Read-modify-write of the whole document: serialize our own loads so
+    # two tabs saved at the same time don't drop each other
+    with _schema_lock:
+        memo = dict(_schema_memo.get(spreadsheet_id) or {})
+        for sheet_id, entry in tabs.items():
+            if entry:
+                memo[sheet_id] = entry
+            else:
+                memo.pop(sheet_id, None)
+        _schema_memo[spreadsheet_id] = memo
+        if not store:
+            return
+
+        schema = store.get_sheet_schema(spreadsheet_id) or {}
+        stored = dict(schema.get("tabs") or {})
+        for sheet_id, entry in tabs.items():
+            if not entry:
+                stored.pop(sheet_id, None)
+                continue
+            stored[sheet_id] = {
+                "headerRows": entry["headerRows"],
+                "fingerprint": entry["fingerprint"],
+                # List of pairs: Firestore does not keep map key order
+                "headers": [{"col": c, "header": h} for c, h in entry["headers"].items()],
             }
-    return None
+        store.save_sheet_schema(spreadsheet_id, {"templateId": schema.get("templateId"), "tabs": stored})
+
+
+def inherit_sheet_schema(template_id, spreadsheet_id):
+    """
+    Register a fresh copy of a template under the template's header maps,
+    without reading the copy: Drive copies keep the tabs' sheetIds and
+    header rows, and the first load checks the fingerprints anyway.
+
+    Returns:
+        bool: True if a schema was inherited
+    """
+    store = _schema_store()
+    schema = store.get_sheet_schema(template_id) if store else None
+    if not schema or not schema.get("tabs"):
+        return False
+    result = store.save_sheet_schema(spreadsheet_id, {"templateId": template_id, "tabs": schema["tabs"]})
+    with _schema_lock:
+        # Parsed again from the store on the copy's first load
+        _schema_memo.pop(spreadsheet_id, None)
+    return result.get("success", False)
+
+
+def _fetch_layouts(spreadsheets, spreadsheet_id, sheet_indexes, use_registry=True):
+    """
+    Requests 1 and 2 of load_sheet_grids for several tabs at once:
+    properties and merges of every tab, then one header-band request covering
+    every wanted tab the registry does not know (none when it knows them all).
+
+    Args:
+        sheet_indexes: Tab indexes to lay out; None for every tab
+        use_registry: Skip the band of registered tabs; False always fetches it
+
+    Returns:
+        dict: sheet_index -> (properties, merges, header_rows, headers, schema).
+        For a registered tab header_rows is [] and schema is its registry
+        entry (to be checked against the header rows read with the values);
+        otherwise schema is None and headers is {} without yellow header cells
+    """
+    meta = spreadsheets.get(
+        spreadsheetId=spreadsheet_id,
+        fields="sheets(properties(sheetId,title,index,gridProperties),merges)"
+    ).execute()
+    sheets = meta['sheets']
+    if sheet_indexes is None:
+        sheet_indexes = range(len(sheets))
+    sheet_indexes = list(dict.fromkeys(sheet_indexes))
+
+    registered = get_header_schemas(spreadsheet_id)
+    layouts = {}
+    band_indexes = []
+    for sheet_index in sheet_indexes:
+        sheet = sheets[sheet_index]
+        schema = registered.get(str(sheet['properties']['sheetId'])) if use_registry else None
+        if schema:
+            layouts[sheet_index] = (sheet['properties'], sheet.get('merges', []), [], schema["headers"], schema)
+        else:
+            band_indexes.append(sheet_index)
+    if not band_indexes:
+        return layouts
+
+    band = spreadsheets.get(
+        spreadsheetId=spreadsheet_id,
+        ranges=[a1_range(sheets[i]['properties']['title'], f"1:{SHEET_HEADER_ROWS}") for i in band_indexes],
+        includeGridData=True,
+        fields="sheets(properties(sheetId),data(rowData(values(formattedValue,userEnteredFormat.backgroundColor))))"
+    ).execute()
+    # The response lists the tabs in spreadsheet order, not request order
+    band_by_sheet_id = {entry['properties']['sheetId']: entry for entry in band.get('sheets', [])}
+
+    to_save = {}
+    for sheet_index in band_indexes:
+        sheet = sheets[sheet_index]
+        properties = sheet['properties']
+        merges = sheet.get('merges', [])
+        band_data = band_by_sheet_id.get(properties['sheetId'], {}).get('data') or [{}]
+        header_rows = band_data[0].get('rowData', [])
+        # Keep row indexes aligned with the sheet even if the band came back short
+        header_rows = header_rows + [{}] * (SHEET_HEADER_ROWS - len(header_rows))
+        headers = SheetGrid.from_parts(properties, merges, header_rows, []).headers
+        layouts[sheet_index] = (properties, merges, header_rows, headers, None)
+
+        sheet_id = str(properties['sheetId'])
+        entry = _schema_entry(merges, header_rows, headers) if headers else None
+        if entry != registered.get(sheet_id):
+            to_save[sheet_id] = entry
+
+    save_header_schemas(spreadsheet_id, to_save)
+    return {i: layouts[i] for i in sheet_indexes}
+
+
+def _fetch_layout(spreadsheets, spreadsheet_id, sheet_index, use_registry=True):
+    """Single-tab _fetch_layouts: (properties, merges, header_rows, headers, schema)."""
+    return _fetch_layouts(spreadsheets, spreadsheet_id, [sheet_index], use_registry)[sheet_index]
+
+
+def load_sheet_grids(spreadsheet_id, sheet_indexes=None):
+    """
+    Fetch several tabs with one set of requests and parse each into a
+    SheetGrid (uncached; readers go through get_sheet_grids).
+
+    Narrow requests instead of the whole grid with formatting, each covering
+    all requested tabs:
+      1. sheet properties and merges (no cell data)
+      2. formattedValue + background color for the header bands only,
+         skipped for tabs whose header map is registered
+      3. values.batchGet of formatted values, header columns only, one
+         range per tab (registered tabs: from the first row, plus their
+         header rows at full width for the fingerprint check)
+    A registered tab whose header rows no longer match is loaded again with
+    its band.
 
+    Args:
+        spreadsheet_id: Google Sheet ID
+        sheet_indexes: Tab indexes to load; None for every tab
 
-def extract_yellow_headers(spreadsheet_id, sheet_index=0):
+    Returns:
+        dict: sheet_index -> SheetGrid ({} if the sheet could not be read)
+    """
     service = get_sheets_service()
     if not service:
         return {}
 
     try:
-        sheet = service.spreadsheets()
-        result = sheet.get(
+        spreadsheets = service.spreadsheets()
+        grids, stale = _load_grids(spreadsheets, spreadsheet_id, sheet_indexes, use_registry=True)
+        if stale:
+            log.info("Header rows of sheet %s tabs %s changed, reloading with their header band",
+                     spreadsheet_id, stale)
+            reloaded, _ = _load_grids(spreadsheets, spreadsheet_id, stale, use_registry=False)
+            grids.update(reloaded)
+        return grids
+    except Exception:
+        log.exception("Error loading sheet %s (tabs %s)", spreadsheet_id, sheet_indexes)
+        return {}
+
+
+def _load_grids(spreadsheets, spreadsheet_id, sheet_indexes, use_registry):
+    """
+    load_sheet_grids' requests for one pass.
+
+    Returns:
+        tuple: (sheet_index -> SheetGrid, registered tab indexes whose header
+        rows failed the fingerprint check and were left out)
+    """
+    layouts = _fetch_layouts(spreadsheets, spreadsheet_id, sheet_indexes, use_registry)
+
+    grids = {}
+    ranges = []  # (sheet_index, A1 range, header-rows check range or None)
+    for sheet_index, (properties, merges, header_rows, headers, schema) in layouts.items():
+        if not headers:
+            grids[sheet_index] = SheetGrid.from_parts(properties, merges, header_rows, [])
+            continue
+        last_col = max(headers, key=SheetGrid.column_index)
+        first_row = len(header_rows) + 1
+        check = a1_range(properties['title'], f"1:{schema['headerRows']}") if schema else None
+        ranges.append((sheet_index, a1_range(properties['title'], f"A{first_row}:{last_col}"), check))
+
+    stale = []
+    if ranges:
+        requested = [a1 for _, data, check in ranges for a1 in (data, check) if a1]
+        values = spreadsheets.values().batchGet(
             spreadsheetId=spreadsheet_id,
-            includeGridData=True,
-            fields="sheets(properties,merges,data(rowData(values(userEnteredValue,formattedValue,userEnteredFormat))))"
+            ranges=requested,
+            majorDimension="ROWS",
+            valueRenderOption="FORMATTED_VALUE",
+            fields="valueRanges(values)"
         ).execute()
+        # valueRanges come back in request order
+        value_ranges = iter(values['valueRanges'])
+        for sheet_index, _, check in ranges:
+            value_rows = next(value_ranges).get('values', [])
+            properties, merges, header_rows, headers, schema = layouts[sheet_index]
+            if check and header_fingerprint(next(value_ranges).get('values', [])) != schema["fingerprint"]:
+                stale.append(sheet_index)
+                continue
+            grids[sheet_index] = SheetGrid.from_parts(
+                properties, merges, header_rows, value_rows, headers=headers
+            )
 
-        sheet_data = result['sheets'][sheet_index]
-        data = sheet_data['data'][0]['rowData']
-        merges = sheet_data.get('merges', [])
+    return {i: grids[i] for i in layouts if i in grids}, stale
 
-        yellow_cells = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            for col_idx, cell in enumerate(row['values']):
-                if is_yellow_cell(cell):
-                    value = cell.get('formattedValue', '').strip()
-                    if not value:
-                        continue
-                    merge_info = get_merge_range(row_idx, col_idx, merges)
-                    is_merge_primary = merge_info and merge_info['startRow'] == row_idx and merge_info['startCol'] == col_idx
-                    yellow_cells.append({
-                        'row': row_idx,
-                        'col': col_idx,
-                        'value': value,
-                        'merge_info': merge_info if is_merge_primary else None,
-                        'is_merge_primary': is_merge_primary
-                    })
-
-        # Sort cells top-to-bottom, left-to-right
-        yellow_cells.sort(key=lambda x: (x['row'], x['col']))
-
-        # Build hierarchical headers
-        column_headers = {}
-        for cell in yellow_cells:
-            col_letter = col_idx_to_letter(cell['col'])
-            merge_info = cell['merge_info']
-            if col_letter not in column_headers:
-                column_headers[col_letter] = []
-            column_headers[col_letter].append(cell['value'])
-
-            if merge_info:
-                for spanned_col in range(cell['col'] + 1, cell['col'] + merge_info['colSpan']):
-                    spanned_letter = col_idx_to_letter(spanned_col)
-                    if spanned_letter not in column_headers:
-                        column_headers[spanned_letter] = []
-                    column_headers[spanned_letter] = column_headers[col_letter].copy()
-
-        # Clean headers and remove duplicates
-        json_headers = {}
-        for col_letter in sorted(column_headers.keys()):
-            unique_headers = []
-            for h in column_headers[col_letter]:
-                if h not in unique_headers:
-                    unique_headers.append(h)
-            header_path = ' '.join(unique_headers).replace('\n', ' ').replace('\r', ' ').strip()
-            json_headers[col_letter] = header_path
-
-        return json_headers
 
-    except Exception:
-        traceback.print_exc()
-        return {}
+def load_sheet_grid(spreadsheet_id, sheet_index=0):
+    """
+    Fetch one tab and parse it into a SheetGrid (uncached; readers go
+    through get_sheet_grid). See load_sheet_grids for the requests made.
 
-def get_rows_by_equipment(spreadsheet_id, target_equipment, sheet_index=0):
-    service = get_sheets_service()
-    if not service:
-        return []
+    Args:
+        spreadsheet_id: Google Sheet ID
+        sheet_index: Tab index (default 0)
+
+    Returns:
+        SheetGrid, or None if the sheet could not be read
+    """
+    return load_sheet_grids(spreadsheet_id, [sheet_index]).get(sheet_index)
+
+
+_grid_cache = {}  # (spreadsheet_id, sheet_index) -> {"grid", "version", "loadedAt", "checkedAt", "tabCount"}
+_grid_cache_lock = threading.Lock()
+# Single flight: (spreadsheet_id, tabs, version) -> Future of the load in progress
+_inflight_loads = {}
+
+
+def _revision_version(spreadsheet_id):
+    revision = get_file_revision(spreadsheet_id)
+    return revision.get("version") if revision else None
+
+
+def get_sheet_grid(spreadsheet_id, sheet_index=0, revalidate=False):
+    """
+    Cached load_sheet_grid.
+
+    Hot reads return the parsed grid from memory. Past the revision-check
+    interval a Drive `version` lookup (a few hundred bytes) decides whether
+    the cached grid is still current; only a changed or expired sheet is
+    downloaded again. Our own writes drop the entry via invalidate_sheet_cache.
+
+    Args:
+        revalidate: Always do the version check (e.g. before planning a write)
+
+    Returns:
+        SheetGrid, or None if the sheet could not be read
+    """
+    return get_sheet_grids(spreadsheet_id, [sheet_index], revalidate).get(sheet_index)
+
+
+def get_sheet_grids(spreadsheet_id, sheet_indexes=None, revalidate=False):
+    """
+    Cached load_sheet_grids: every tab that is missing, expired or changed
+    is fetched in one load, current ones come from memory.
+
+    Args:
+        spreadsheet_id: Google Sheet ID
+        sheet_indexes: Tab indexes; None for every tab of the spreadsheet
+        revalidate: Always do the version check (e.g. before planning a write)
+
+    Returns:
+        dict: sheet_index -> SheetGrid (tabs that could not be read are left out)
+    """
+    now = time.monotonic()
+    with _grid_cache_lock:
+        entries = {k[1]: e for k, e in _grid_cache.items() if k[0] == spreadsheet_id}
+
+    every_tab = sheet_indexes is None
+    if every_tab:
+        # The tab count is only known from an every-tab load
+        counts = [e["tabCount"] for e in entries.values()
+                  if e["tabCount"] is not None and now - e["loadedAt"] < SHEET_CACHE_TTL_SECONDS]
+        sheet_indexes = range(counts[0]) if counts else []
+    sheet_indexes = list(dict.fromkeys(sheet_indexes))
+
+    grids = {}
+    version = None
+    checked = False
+    for sheet_index in sheet_indexes:
+        entry = entries.get(sheet_index)
+        if not entry or now - entry["loadedAt"] >= SHEET_CACHE_TTL_SECONDS:
+            continue
+        if not revalidate and now - entry["checkedAt"] < SHEET_REVISION_CHECK_SECONDS:
+            grids[sheet_index] = entry["grid"]
+            continue
+        if not checked:
+            version = _revision_version(spreadsheet_id)
+            checked = True
+        # No version available (e.g. Drive error): rely on the TTL
+        if version is None or version == entry["version"]:
+            entry["checkedAt"] = now
+            grids[sheet_index] = entry["grid"]
+        else:
+            log.info("Sheet %s tab %s changed (version %s -> %s), reloading",
+                     spreadsheet_id, sheet_index, entry["version"], version)
+
+    missing = [i for i in sheet_indexes if i not in grids]
+    if sheet_indexes and not missing:
+        return grids
+
+    # Reuse the version lookup made above; an every-tab read reloads all
+    # tabs so tabs added since the last load are picked up
+    if not checked:
+        version = _revision_version(spreadsheet_id)
+    loaded = dict(_load_into_cache(spreadsheet_id, None if every_tab else missing, version))
+    if every_tab:
+        return loaded
+    grids.update(loaded)
+    return {i: grids[i] for i in sheet_indexes if i in grids}
+
+
+def _load_into_cache(spreadsheet_id, sheet_indexes, version):
+    """
+    Single-flight load: concurrent callers asking for the same tabs at the
+    same version wait for the first caller's fetch and parse and share its
+    grids instead of downloading the sheet again.
+    """
+    key = (spreadsheet_id, None if sheet_indexes is None else tuple(sorted(sheet_indexes)), version)
+    with _grid_cache_lock:
+        pending = _inflight_loads.get(key)
+        leader = pending is None
+        if leader:
+            pending = _inflight_loads[key] = Future()
+    if not leader:
+        return pending.result()
 
     try:
-        # Get sheet data
-        sheet = service.spreadsheets()
-        result = sheet.get(
-            spreadsheetId=spreadsheet_id,
-            includeGridData=True,
-            fields="sheets(properties,merges,data(rowData(values(userEnteredValue,formattedValue,userEnteredFormat))))"
-        ).execute()
+        grids = _fetch_into_cache(spreadsheet_id, sheet_indexes, version)
+        pending.set_result(grids)
+        return grids
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _grid_cache_lock:
+            del _inflight_loads[key]
+
+
+def _fetch_into_cache(spreadsheet_id, sheet_indexes, version):
+    # The version is read before the grids so an edit landing in between
+    # makes the entries look stale rather than hiding the edit
+    grids = load_sheet_grids(spreadsheet_id, sheet_indexes)
+    now = time.monotonic()
+    tab_count = len(grids) if sheet_indexes is None else None
+    with _grid_cache_lock:
+        for sheet_index, grid in grids.items():
+            _grid_cache[(spreadsheet_id, sheet_index)] = {
+                "grid": grid, "version": version, "loadedAt": now, "checkedAt": now, "tabCount": tab_count,
+            }
+    return grids
 
-        sheet_data = result['sheets'][sheet_index]
-        data = sheet_data['data'][0]['rowData']
-        merges = sheet_data.get('merges', [])
 
-        # Step 1: Extract headers
-        yellow_cells = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            for col_idx, cell in enumerate(row['values']):
-                if is_yellow_cell(cell):
-                    value = cell.get('formattedValue', '').strip()
-                    if not value:
-                        continue
-                    merge_info = get_merge_range(row_idx, col_idx, merges)
-                    is_merge_primary = merge_info and merge_info['startRow'] == row_idx and merge_info['startCol'] == col_idx
-                    yellow_cells.append({
-                        'row': row_idx,
-                        'col': col_idx,
-                        'value': value,
-                        'merge_info': merge_info if is_merge_primary else None,
-                        'is_merge_primary': is_merge_primary
-                    })
-
-        yellow_cells.sort(key=lambda x: (x['row'], x['col']))
-
-        column_headers = {}
-        for cell in yellow_cells:
-            col_letter = col_idx_to_letter(cell['col'])
-            merge_info = cell['merge_info']
-            if col_letter not in column_headers:
-                column_headers[col_letter] = []
-            column_headers[col_letter].append(cell['value'])
-            if merge_info:
-                for spanned_col in range(cell['col'] + 1, cell['col'] + merge_info['colSpan']):
-                    spanned_letter = col_idx_to_letter(spanned_col)
-                    column_headers[spanned_letter] = column_headers[col_letter].copy()
-
-        headers_mapping = {}
-        for col_letter in sorted(column_headers.keys()):
-            unique_headers = []
-            for h in column_headers[col_letter]:
-                if h not in unique_headers:
-                    unique_headers.append(h)
-            headers_mapping[col_letter] = ' '.join(unique_headers).replace('\n', ' ').replace('\r', ' ').strip()
-
-        # Step 2: Prepare merged EQUIPMENT NO. values mapping
-        equip_col_letter = next((c for c, h in headers_mapping.items() if "EQUIPMENT NO." in h.upper()), None)
-        equip_merged_values = {}  # row_idx -> equipment_no
-
-        if equip_col_letter:
-            for merge in merges:
-                start_col = merge['startColumnIndex']
-                end_col = merge['endColumnIndex']
-                start_row = merge['startRowIndex']
-                end_row = merge['endRowIndex']
-                if col_idx_to_letter(start_col) == equip_col_letter:
-                    # Get the value of the primary cell
-                    cell = data[start_row]['values'][start_col]
-                    value = cell.get('formattedValue', '').strip() if cell else ''
-                    # Apply the value to all rows spanned by merge
-                    for r in range(start_row, end_row):
-                        equip_merged_values[r] = value
-
-        # Step 3: Map rows by headers, use merged value if necessary
-        rows_matched = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            row_data = {}
-            for col_idx in range(len(row['values'])):
-                col_letter = col_idx_to_letter(col_idx)
-                header = headers_mapping.get(col_letter)
-                if not header:
-                    continue
-                cell = row['values'][col_idx] if col_idx < len(row['values']) else None
-                row_data[header] = cell.get('formattedValue', '').strip() if cell else ''
+def invalidate_sheet_cache(spreadsheet_id):
+    """Drop every cached tab of a spreadsheet (call after writing to it)."""
+    with _grid_cache_lock:
+        for key in [k for k in _grid_cache if k[0] == spreadsheet_id]:
+            del _grid_cache[key]
+        for key in [k for k in _anchor_cache if k[0] == spreadsheet_id]:
+            del _anchor_cache[key]
 
-            # Use merged EQUIPMENT NO. if current row has empty
-            if equip_col_letter and (not row_data.get(headers_mapping[equip_col_letter])):
-                row_data[headers_mapping[equip_col_letter]] = equip_merged_values.get(row_idx, '')
 
-            # Filter by target equipment
-            if row_data.get(headers_mapping[equip_col_letter], '').upper() == target_equipment.upper():
-                rows_matched.append(row_data)
+def clear_sheet_cache():
+    """Drop every cached grid."""
+    with _grid_cache_lock:
+        _grid_cache.clear()
+        _anchor_cache.clear()
 
-        return rows_matched
 
-    except Exception:
-        traceback.print_exc()
+def extract_yellow_headers(spreadsheet_id, sheet_index=0, grid=None):
+    """Column letter -> header text built from the yellow header cells."""
+    grid = grid or get_sheet_grid(spreadsheet_id, sheet_index)
+    if not grid:
+        return {}
+    return dict(grid.headers)
+
+
+def get_rows_by_equipment(spreadsheet_id, target_equipment, sheet_index=0, grid=None):
+    """
+    Header-mapped rows whose EQUIPMENT NO. (merged cells filled down) matches.
+
+    Concurrent cold calls for the same tab share one load (see _load_into_cache).
+    """
+    grid = grid or get_sheet_grid(spreadsheet_id, sheet_index)
+    if not grid:
         return []
+    return grid.rows_by_equipment(target_equipment)
+
+
+def get_rows_for_equipment_batch(spreadsheet_id, equipment_nos, sheet_index=0, grid=None):
+    """
+    Bulk get_rows_by_equipment: one sheet read for a whole batch.
+
+    Args:
+        spreadsheet_id: Google Sheet ID
+        equipment_nos: Iterable of equipment numbers (duplicates allowed)
+        sheet_index: Sheet index (default 0)
+
+    Returns:
+        dict: equipment_no -> list of matching rows ([] when not found or
+        the sheet could not be read)
+    """
+    equipment_nos = list(dict.fromkeys(equipment_nos))
+    grid = grid or get_sheet_grid(spreadsheet_id, sheet_index)
+    if not grid:
+        return {equipment_no: [] for equipment_no in equipment_nos}
+    return {equipment_no: grid.rows_by_equipment(equipment_no) for equipment_no in equipment_nos}
+
+
+def get_equipment_indexes(spreadsheet_id, sheet_indexes=None):
+    """
+    Per-tab equipment indexes from one (cached) read of the requested tabs.
+
+    Args:
+        spreadsheet_id: Google Sheet ID
+        sheet_indexes: Tab indexes; None for every tab
+
+    Returns:
+        dict: sheet_index -> {upper-cased EQUIPMENT NO.: number of rows}
+    """
+    grids = get_sheet_grids(spreadsheet_id, sheet_indexes)
+    return {sheet_index: grid.equipment_index() for sheet_index, grid in grids.items()}
+
+
+def get_rows_for_equipment_across_tabs(spreadsheet_id, equipment_nos, sheet_indexes=None):
+    """
+    get_rows_for_equipment_batch over several tabs (e.g. one per unit) with a
+    single sheet read.
+
+    Args:
+        spreadsheet_id: Google Sheet ID
+        equipment_nos: Iterable of equipment numbers (duplicates allowed)
+        sheet_indexes: Tab indexes to search; None for every tab
+
+    Returns:
+        dict: equipment_no -> {sheet_index: matching rows}, only tabs with a
+        match ({} when not found anywhere)
+    """
+    equipment_nos = list(dict.fromkeys(equipment_nos))
+    grids = get_sheet_grids(spreadsheet_id, sheet_indexes)
+    results = {}
+    for equipment_no in equipment_nos:
+        found = {}
+        for sheet_index, grid in grids.items():
+            rows = grid.rows_by_equipment(equipment_no)
+            if rows:
+                found[sheet_index] = rows
+        results[equipment_no] = found
+    return results
 
 # =========================================================
 # DATA PROCESSING & FORMATTING
@@ -258,226 +641,14 @@ def safe_assign(row, key, value):
 # -----------------------------
 # MATERIAL SPLIT
 # -----------------------------
-# -----------------------------
-# MATERIAL SPLIT
-# -----------------------------
-def format_spec_with_dash(spec):
-    """
-    Ensure spec has dash between letters and numbers.
-    Handles specs with slashes and spaces.
-    
-    Examples:
-        "SA516" -> "SA-516"
-        "SA-516" -> "SA-516" (already has dash)
-        "A240" -> "A-240"
-        "A/SA 516" -> "A/SA-516"
-        "ASME SA516" -> "ASME SA-516"
-    """
-    if not spec:
-        return spec
-    
-    spec = spec.strip()
-    
-    # Pattern: Find where letters/slashes/spaces end and digits begin
-    # Match: (letters with optional slashes and spaces) + (space?) + (digits)
-    match = re.match(r'^([A-Z\s/]+?)\s*(\d.*)$', spec, re.IGNORECASE)
-    
-    if match:
-        letter_part = match.group(1).strip()
-        number_part = match.group(2).strip()
-        
-        # Check if dash already exists at the junction
-        if letter_part.endswith('-') or number_part.startswith('-'):
-            return spec
-        
-        return f"{letter_part}-{number_part}"
-    
-    return spec
-
-
-import re
-
-def format_spec_with_dash(spec):
-    """
-    Ensure spec has dash between letters and numbers.
-    Handles specs with slashes and spaces.
-    
-    Examples:
-        "SA516" -> "SA-516"
-        "SA-516" -> "SA-516" (already has dash)
-        "A240" -> "A-240"
-        "A/SA 516" -> "A/SA-516"
-        "ASME SA516" -> "ASME SA-516"
-    """
-    if not spec:
-        return spec
-    
-    spec = spec.strip()
-    
-    # Pattern: Find where letters/slashes/spaces end and digits begin
-    # Match: (letters with optional slashes and spaces) + (space?) + (digits)
-    match = re.match(r'^([A-Z\s/]+?)\s*(\d.*)$', spec, re.IGNORECASE)
-    
-    if match:
-        letter_part = match.group(1).strip()
-        number_part = match.group(2).strip()
-        
-        # Check if dash already exists at the junction
-        if letter_part.endswith('-') or number_part.startswith('-'):
-            return spec
-        
-        return f"{letter_part}-{number_part}"
-    
-    return spec
-
+# format_spec_with_dash / split_spec_grade live in services.material_parser
+# (compiled patterns + memo).
 
-def split_spec_grade(material):
-    """
-    Parse material string to extract Spec and Grade.
-    Handles all formats including GR prefix, multi-spec, modifiers, etc.
-    
-    Examples:
-        "SA-516 70" -> ("SA-516", "70")
-        "SA-240-Gr.316/316L" -> ("SA-240", "316/316L")
-        "ASTM A-240 304L" -> ("ASTM A-240", "304L")
-        "SA-240 M 316L / SA 240 316L" -> ("SA-240 M / SA-240", "316L")
-        "A516 Gr.70" -> ("A-516", "70")
-        "SA-240-316" -> ("SA-240", "316")
-        "SA-213-TP316" -> ("SA-213", "TP316")
-        "SA403-WP316" -> ("SA-403", "WP316")
-    """
-    if not material:
-        return "", ""
-
-    material = material.strip()
-
-    # ========================================
-    # CASE 1: Explicit GR/GRADE/G prefix
-    # ========================================
-    # Matches: "SA-240-Gr.316/316L", "A516 Gr.70", "SA-240 Grade 316"
-    m = re.search(r'[\s-]*(GR\.?|GRADE\.?|G\.?)[\s-]*(.+)$', material, re.IGNORECASE)
-    if m:
-        grade = m.group(2).strip()
-        # Remove trailing dashes/spaces from spec part
-        spec_part = material[:m.start()].strip().rstrip('-').rstrip()
-        spec = format_spec_with_dash(spec_part)
-        return spec, grade
-
-    # ========================================
-    # CASE 2: Multiple specs with slash (/)
-    # ========================================
-    # Matches: "SA-240 M 316L/SA 240 316L", "SA-516 316/316L"
-    if '/' in material:
-        parts = [p.strip() for p in material.split('/')]
-        
-        # Pattern: [PREFIX] [SEPARATOR] [NUMBER] [REMAINDER]
-        # Examples: "SA-240 M 316L", "ASTM A-240 304L", "SA 240 316"
-        # **FIX: Made separator optional to handle SA403-WP316 format**
-        spec_pattern = r'^((?:ASME\s+|ASTM\s+)?[A-Z]+)[\s-]?(\d+)\s*(.*)$'
-        
-        specs = []
-        grades = []
-        
-        for part in parts:
-            match = re.match(spec_pattern, part, re.IGNORECASE)
-            if not match:
-                # No spec pattern, might be standalone grade
-                # Updated pattern to handle grades with leading letters
-                if part and re.match(r'^[A-Z]*[0-9]+[A-Z]*$', part):
-                    grades.append(part)
-                continue
-            
-            prefix = match.group(1).strip()    # "SA", "ASTM A"
-            number = match.group(2)             # "240", "516"
-            remainder = match.group(3).strip()  # "M 316L", "304L", "316"
-            
-            # **FIX: Strip leading dashes from remainder**
-            remainder = remainder.lstrip('-').strip()
-            
-            # Build base spec: "SA-240" or "ASTM A-240"
-            spec_base = f"{prefix}-{number}"
-            
-            # Check for modifier + grade pattern: "M 316L"
-            mod_match = re.match(r'^([A-Z])\s+([0-9]+[A-Z]*)$', remainder, re.IGNORECASE)
-            if mod_match:
-                modifier = mod_match.group(1)
-                grade_part = mod_match.group(2)
-                specs.append(f"{spec_base} {modifier}")
-                grades.append(grade_part)
-                continue
-            
-            # Check for grade only: "304L", "316", "70", "TP316", "WP316"
-            # Updated pattern to handle grades with leading letters
-            grade_match = re.match(r'^([A-Z]*[0-9]+[A-Z]*)$', remainder, re.IGNORECASE)
-            if grade_match:
-                specs.append(spec_base)
-                grades.append(grade_match.group(1))
-                continue
-            
-            # No grade in this part
-            specs.append(spec_base)
-        
-        # Build result
-        if specs:
-            # Remove duplicates while preserving order
-            spec_combined = ' / '.join(dict.fromkeys(specs))
-            grade_combined = '/'.join(dict.fromkeys(grades)) if grades else ""
-            return spec_combined, grade_combined
-
-    # ========================================
-    # CASE 3: Single spec pattern
-    # ========================================
-    # Matches: "SA-516 70", "ASTM A-240 304L", "SA-240 M 316L", "SA-240-316", "SA403-WP316"
-    # **FIX: Made separator optional ([\s-]?) to handle formats like SA403-WP316**
-    simple_pattern = r'^((?:ASME\s+|ASTM\s+)?[A-Z]+)[\s-]?(\d+)\s*(.*)$'
-    m = re.match(simple_pattern, material, re.IGNORECASE)
-    
-    if m:
-        prefix = m.group(1).strip()     # "SA", "ASTM A", "A"
-        number = m.group(2)              # "240", "516", "403"
-        remainder = m.group(3).strip()   # "304L", "M 316L", "70", "-316", "-TP316", "-WP316"
-        
-        # **FIX: Strip leading dashes from remainder**
-        remainder = remainder.lstrip('-').strip()
-        
-        # Build base spec
-        spec_base = f"{prefix}-{number}"
-        
-        # Check for modifier + grade: "M 316L"
-        mod_match = re.match(r'^([A-Z])\s+([0-9]+[A-Z]*)$', remainder, re.IGNORECASE)
-        if mod_match:
-            modifier = mod_match.group(1)
-            grade = mod_match.group(2)
-            return f"{spec_base} {modifier}", grade
-        
-        # Check for grade only: "304L", "70", "TP316", "WP316"
-        # **FIX: Updated pattern to handle grades with leading letters**
-        grade_match = re.match(r'^([A-Z]*[0-9]+[A-Z]*)$', remainder, re.IGNORECASE)
-        if grade_match:
-            return spec_base, grade_match.group(1)
-        
-        # No grade
-        return spec_base, ""
-
-    # ========================================
-    # CASE 4: Fallback - format and extract
-    # ========================================
-    formatted_spec = format_spec_with_dash(material)
-    
-    # Last attempt: extract trailing grade from formatted spec
-    # Updated to handle grades with leading letters
-    tail_grade = re.search(r'\s+([A-Z]*[0-9]+[A-Z]*)$', formatted_spec)
-    if tail_grade:
-        spec = formatted_spec[:tail_grade.start()].strip()
-        grade = tail_grade.group(1)
-        return spec, grade
-    
-    # No grade found
-    return formatted_spec, ""
- 
 # -----------------------------
 # PRESSURE & TEMPERATURE
 # -----------------------------
+# Conversion tables and the batch engine live in services.unit_normalizer;
+# the single-value helpers below are kept for existing callers.
 def extract_numeric_with_separators(text):
     if not text:
         return ""
@@ -486,37 +657,55 @@ def extract_numeric_with_separators(text):
 
 def convert_pressure_to_mpa(value, unit):
     try:
-        num = float(value)
-    except:
+        float(value)
+    except (TypeError, ValueError):
         return value
-
-    unit = unit.lower()
-    if "kpa" in unit:
-        return f"{num / 1000:.2f}"
-    if "bar" in unit:
-        return f"{num / 10:.2f}"
-    if "kg" in unit:
-        return f"{num * 0.0980665:.2f}"
-    return str(num)
+    return normalize_pressures([value], [unit])[0]
 
 
 def normalize_pressure(text, unit):
-    raw = extract_numeric_with_separators(text)
-    if not raw:
-        return ""
+    return normalize_pressures([text], [unit])[0]
 
-    parts = re.split(r'([/~\-])', raw)
-    out = []
-    for p in parts:
-        if re.match(r'[0-9.]+', p):
-            out.append(convert_pressure_to_mpa(p, unit))
-        else:
-            out.append(p)
-    return "".join(out)
 
+def normalize_temperature(text, unit=None):
+    return normalize_temperatures([text], [unit])[0]
 
-def normalize_temperature(text):
-    return extract_numeric_with_separators(text)
+
+def normalize_design_sides(sides):
+    """
+    Normalize pressures / temperatures of every design-data side in one batch.
+
+    Args:
+        sides: Dict of side name -> DesignData dict (ShellSide, TubeSide...)
+
+    Returns:
+        dict: side name -> {"DesignPressure", "OperatingPressure",
+              "DesignTemperature", "OperatingTemperature"} in MPa / °C
+    """
+    names = list(sides)
+    pressure_values, pressure_units = [], []
+    temperature_values, temperature_units = [], []
+    for name in names:
+        design = sides[name]
+        for field in ("DesignPressure", "OperatingPressure"):
+            pressure_values.append(design.get(field))
+            pressure_units.append(design.get("PressureUnit", ""))
+        for field in ("DesignTemperature", "OperatingTemperature"):
+            temperature_values.append(design.get(field))
+            temperature_units.append(design.get("TemperatureUnit", ""))
+
+    pressures = normalize_pressures(pressure_values, pressure_units)
+    temperatures = normalize_temperatures(temperature_values, temperature_units)
+
+    return {
+        name: {
+            "DesignPressure": pressures[2 * i],
+            "OperatingPressure": pressures[2 * i + 1],
+            "DesignTemperature": temperatures[2 * i],
+            "OperatingTemperature": temperatures[2 * i + 1],
+        }
+        for i, name in enumerate(names)
+    }
 
 
 # -----------------------------
@@ -542,6 +731,10 @@ def format_rows_with_pdf(sheet_rows, pdf_data):
         shell_side = part2
         tube_side = part2
 
+    # BOM key index and unit conversion once per PDF rather than once per row
+    bom_index = BomIndex(bom)
+    normalized = normalize_design_sides({"shell": shell_side, "tube": tube_side})
+
     formatted_rows = []
     
     for idx, row in enumerate(sheet_rows):
@@ -551,127 +744,339 @@ def format_rows_with_pdf(sheet_rows, pdf_data):
         # Determine which side to use based on part name
         if "TUBE" in part_normalized or "CHANNEL" in part_normalized:
             design = tube_side
+            units = normalized["tube"]
         else:
             design = shell_side
+            units = normalized["shell"]
 
         # ========================================
-        # ENHANCED MATERIAL MAPPING
+        # MATERIAL MAPPING
         # ========================================
-        material = ""
-        material_keys = []
-        
-        # Priority 1: Exact match without spaces
-        material_keys.append(part.replace(" ", ""))  # "Top Channel" → "TopChannel"
-        
-        # Priority 2: Specific part-based mappings
-        if "TOP" in part_normalized and "CHANNEL" in part_normalized:
-            material_keys.extend(["TopChannel", "Top Channel", "Channel"])
-        elif "BOTTOM" in part_normalized and "CHANNEL" in part_normalized:
-            material_keys.extend(["BottomChannel", "Bottom Channel", "Channel"])
-        elif "CHANNEL" in part_normalized:
-            material_keys.extend(["Channel", "channel", "CHANNEL"])
-        
-        if "TUBE" in part_normalized:
-            material_keys.extend(["Tube", "tube", "TUBE"])
-        
-        if "SHELL" in part_normalized:
-            material_keys.extend(["Shell", "shell", "SHELL"])
-        
-        if "TOP" in part_normalized and "HEAD" in part_normalized:
-            material_keys.extend(["TopHead", "Top Head", "top head", "TOP HEAD", "Head"])
-        elif "BOTTOM" in part_normalized and "HEAD" in part_normalized:
-            material_keys.extend(["BottomHead", "Bottom Head", "bottom head", "BOTTOM HEAD", "Head"])
-        elif "HEAD" in part_normalized:
-            material_keys.extend(["Head", "head", "HEAD"])
-        
-        # Priority 3: Generic fallbacks
-        material_keys.extend([part, part.lower(), part.upper()])
-        
-        # Debug: Print what we're looking for
-        print(f"🔍 Part: '{part}' | Looking for keys: {material_keys[:5]}...")  # Show first 5
-        print(f"   Available BOM keys: {list(bom.keys())}")
-        
-        # Try each key until we find a material
-        for key in material_keys:
-            material = bom.get(key, "")
-            if material and material.lower() != "no":
-                print(f"   ✅ Found material using key '{key}': {material}")
-                break
-        else:
-            print(f"   ❌ No material found for '{part}'")
-        
+        # Exact part key first ("Top Channel" -> TopChannel), then the
+        # channel / tube / shell / head synonym classes
+        material = bom_index.material(part)
+
         # ========================================
         # PROCESS MATERIAL IF FOUND
         # ========================================
-        if material and material.lower() != "no":
+        if material:
             spec, grade = split_spec_grade(material)
-            print(f"   📝 Parsed: spec='{spec}', grade='{grade}'")
             
             # Assign to row
             safe_assign(row, "MATERIAL INFORMATION SPEC.", spec)
             safe_assign(row, "MATERIAL INFORMATION GRADE", grade)
-        else:
-            print(f"   ⚠️  No valid material for part '{part}'")
 
         # ========================================
         # DESIGN DATA ASSIGNMENT
         # ========================================
         safe_assign(row, "FLUID", design.get("Fluid"))
-        print(f"DEBUG - part_normalized: '{part_normalized}'")
-        print(f"DEBUG - part_normalized repr: {repr(part_normalized)}")
-        print(f"DEBUG - Length: {len(part_normalized)}")
-        print(f"DEBUG - Comparison result: {part_normalized == 'TUBE BUNDLE'}")
 
         if part_normalized == 'TUBE BUNDLE':
-            print("Tube bundle no insulation")
+            # Tube bundles are never insulated
             safe_assign(row, "INSULATION (yes/No)", "N")
-            print(f"DEBUG - Row after assign: {row.get('INSULATION (yes/No)')}")
         elif design.get("Insulation", "").lower() == "yes":
             
             safe_assign(row, "INSULATION (yes/No)", "Y")
         else:
             safe_assign(row, "INSULATION (yes/No)", "N")
 
-        print(f"DEBUG - Row after assign: {row.get('INSULATION (yes/No)')}")
-
-        safe_assign(
-            row,
-            "DESIGN PRESSURE (Mpa)",
-            normalize_pressure(
-                design.get("DesignPressure"),
-                design.get("PressureUnit", "")
-            )
-        )
-
-        safe_assign(
-            row,
-            "OPERATING PRESSURE (Mpa)",
-            normalize_pressure(
-                design.get("OperatingPressure"),
-                design.get("PressureUnit", "")
-            )
-        )
-
-        safe_assign(
-            row,
-            "DESIGN TEMP.  (°C)",
-            normalize_temperature(design.get("DesignTemperature"))
-        )
+        log.debug("Part %r: material=%r insulation=%s", part, material, row.get("INSULATION (yes/No)"))
 
-        safe_assign(
-            row,
-            "OPERATING TEMP.  (°C)",
-            normalize_temperature(design.get("OperatingTemperature"))
-        )
+        safe_assign(row, "DESIGN PRESSURE (Mpa)", units["DesignPressure"])
+        safe_assign(row, "OPERATING PRESSURE (Mpa)", units["OperatingPressure"])
+        safe_assign(row, "DESIGN TEMP.  (°C)", units["DesignTemperature"])
+        safe_assign(row, "OPERATING TEMP.  (°C)", units["OperatingTemperature"])
         
         formatted_rows.append(row)
 
     return formatted_rows
   
+# Columns only written on the first row of an equipment block
+FIRST_ROW_ONLY_KEYWORDS = ["EQUIPMENT NO.", "NO.", "EQUIPMENT DESCRIPTION"]
+
+# ---------------------------------------------------------------------
+# Equipment row anchors
+# ---------------------------------------------------------------------
+#
+# The first row of every equipment block carries a row-located developer
+# metadata entry (key EQUIPMENT_ANCHOR_KEY, value = the EQUIPMENT NO.),
+# created when the task sheet is created. Sheets moves row metadata with its
+# row when rows are inserted or deleted above it, so the write planner gets
+# every block's row from one developerMetadata.search per grid instead of
+# scanning the EQUIPMENT NO. column.
+
+EQUIPMENT_ANCHOR_KEY = "equipmentNo"
+SHEET_ANCHOR_BATCH = int(os.getenv("SHEET_ANCHOR_BATCH", "500"))
+
+_anchor_cache = {}  # (spreadsheet_id, sheet_id) -> (grid the anchors were read for, anchors)
+
+
+def _search_anchors(spreadsheets, spreadsheet_id, sheet_id):
+    """
+    Equipment anchors of one tab.
+
+    Returns:
+        dict: upper-cased EQUIPMENT NO. -> list of (metadataId, row index)
+    """
+    response = spreadsheets.developerMetadata().search(
+        spreadsheetId=spreadsheet_id,
+        body={"dataFilters": [{"developerMetadataLookup": {
+            "metadataKey": EQUIPMENT_ANCHOR_KEY,
+            "locationType": "ROW",
+        }}]},
+        fields="matchedDeveloperMetadata(developerMetadata(metadataId,metadataValue,location(dimensionRange)))"
+    ).execute()
+
+    anchors = {}
+    for match in response.get("matchedDeveloperMetadata", []):
+        metadata = match["developerMetadata"]
+        row_range = metadata["location"]["dimensionRange"]
+        if row_range.get("sheetId") != sheet_id:
+            continue
+        key = metadata.get("metadataValue", "").strip().upper()
+        anchors.setdefault(key, []).append((metadata["metadataId"], row_range["startIndex"]))
+    return anchors
+
+
+def get_equipment_anchors(spreadsheet_id, grid):
+    """
+    Anchored first row of every equipment block of a tab, read once per grid
+    (a reloaded grid reads them again).
+
+    Args:
+        spreadsheet_id: Google Sheet ID
+        grid: SheetGrid of the tab
+
+    Returns:
+        dict: upper-cased EQUIPMENT NO. -> row index ({} when the sheet has no
+        anchors or they could not be read)
+    """
+    key = (spreadsheet_id, grid.sheet_id)
+    with _grid_cache_lock:
+        cached = _anchor_cache.get(key)
+    if cached and cached[0] is grid:
+        return cached[1]
+
+    service = get_sheets_service()
+    if not service:
+        return {}
+    try:
+        found = _search_anchors(service.spreadsheets(), spreadsheet_id, grid.sheet_id)
+    except Exception:
+        log.exception("Error reading equipment anchors of %s", spreadsheet_id)
+        return {}
+
+    anchors = {equip_no: min(row_idx for _, row_idx in entries) for equip_no, entries in found.items()}
+    with _grid_cache_lock:
+        _anchor_cache[key] = (grid, anchors)
+    return anchors
+
+
+def anchor_equipment_rows(spreadsheet_id, sheet_index=0):
+    """
+    Tag the first row of every equipment block with an equipment anchor.
+
+    Blocks already anchored at their current row are left alone and anchors
+    that no longer point at their block are replaced, so this can be re-run
+    after equipment was added or moved.
+
+    Args:
+        spreadsheet_id: Google Sheet ID
+        sheet_index: Sheet index (default 0)
+
+    Returns:
+        dict: {"success": bool, "anchored": int (anchors created),
+               "removed": int (stale anchors deleted), "message": str (if error)}
+    """
+    try:
+        grid = get_sheet_grid(spreadsheet_id, sheet_index, revalidate=True)
+        if not grid or not grid.equipment_col:
+            return {"success": False, "message": "Could not find EQUIPMENT NO. column"}
+
+        service = get_sheets_service()
+        if not service:
+            return {"success": False, "message": "Failed to connect to Google Sheets"}
+        spreadsheets = service.spreadsheets()
+
+        existing = _search_anchors(spreadsheets, spreadsheet_id, grid.sheet_id)
+        equipment_col = SheetGrid.column_index(grid.equipment_col)
+
+        requests = []
+        anchored = removed = 0
+        # Skip header rows
+        for equip_no, row_idx in grid.first_rows(grid.equipment_col, min_row=2).items():
+            current = existing.pop(equip_no, [])
+            if any(anchor_row == row_idx for _, anchor_row in current):
+                stale = [(metadata_id, anchor_row) for metadata_id, anchor_row in current if anchor_row != row_idx]
+            else:
+                stale = current
+                requests.append({"createDeveloperMetadata": {"developerMetadata": {
+                    "metadataKey": EQUIPMENT_ANCHOR_KEY,
+                    "metadataValue": grid.cell(row_idx, equipment_col)['formattedValue'].strip(),
+                    "location": {"dimensionRange": {
+                        "sheetId": grid.sheet_id, "dimension": "ROWS",
+                        "startIndex": row_idx, "endIndex": row_idx + 1,
+                    }},
+                    "visibility": "DOCUMENT",
+                }}})
+                anchored += 1
+            for metadata_id, _ in stale:
+                requests.append({"deleteDeveloperMetadata": {"dataFilter": {
+                    "developerMetadataLookup": {"metadataId": metadata_id}
+                }}})
+                removed += 1
+
+        # Anchors of equipment no longer in the sheet
+        for entries in existing.values():
+            for metadata_id, _ in entries:
+                requests.append({"deleteDeveloperMetadata": {"dataFilter": {
+                    "developerMetadataLookup": {"metadataId": metadata_id}
+                }}})
+                removed += 1
+
+        try:
+            for start in range(0, len(requests), SHEET_ANCHOR_BATCH):
+                spreadsheets.batchUpdate(
+                    spreadsheetId=spreadsheet_id,
+                    body={"requests": requests[start:start + SHEET_ANCHOR_BATCH]}
+                ).execute()
+        finally:
+            if requests:
+                # Drop the cached grid and its pre-anchoring anchor table
+                invalidate_sheet_cache(spreadsheet_id)
+
+        log.info("Anchored %d equipment blocks of %s (%d stale anchors removed)", anchored, spreadsheet_id, removed)
+        return {"success": True, "anchored": anchored, "removed": removed}
+
+    except Exception as e:
+        log.exception("Error anchoring equipment rows of %s", spreadsheet_id)
+        return {"success": False, "message": str(e)}
+
+
+def plan_sheet_update(grid, merged_data, anchors=None):
+    """
+    Turn merged rows into the A1 value ranges that actually change the sheet.
+
+    Each equipment group is written from the first row (below the two header
+    rows) whose own EQUIPMENT NO. cell matches: its anchored row when the
+    anchor still holds that EQUIPMENT NO., otherwise found through the
+    grid's column index (built only when an anchor is missing). Every target cell is compared with the grid's current
+    formatted value and only differing cells are emitted, with adjacent
+    changed cells of a row coalesced into one range. Unchanged cells are
+    never rewritten, so concurrent manual edits there are left alone.
+
+    Args:
+        grid: SheetGrid of the target tab
+        merged_data: List of row objects with data to insert
+        anchors: Optional get_equipment_anchors table for the tab
+
+    Returns:
+        dict: {"batch_data": list of update ranges,
+               "rows_matched": int, "rows_to_update": int (rows with changes),
+               "cells_to_update": int, "cells_unchanged": int,
+               "missing_equipment": list of equipment numbers not in the sheet}
+    """
+    anchors = anchors or {}
+    equipment_col = SheetGrid.column_index(grid.equipment_col)
+    scanned = None
+
+    def start_row(equip_no):
+        nonlocal scanned
+        key = equip_no.upper()
+        row_idx = anchors.get(key)
+        if row_idx is not None:
+            cell = grid.cell(row_idx, equipment_col)
+            if cell and cell.get('formattedValue', '').strip().upper() == key:
+                return row_idx
+        if scanned is None:
+            scanned = grid.first_rows(grid.equipment_col, min_row=2)  # Skip header rows
+        return scanned.get(key)
+
+    columns = [entry for segment in grid.column_segments() for entry in segment]
+    first_row_only = {
+        header for _, header in columns
+        if any(keyword in header.upper() for keyword in FIRST_ROW_ONLY_KEYWORDS)
+    }
+
+    # Group merged rows by EQUIPMENT NO., keeping first-seen order
+    equipment_groups = {}
+    for row in merged_data:
+        equip_no = row.get("EQUIPMENT NO.", "").strip()
+        if equip_no:
+            equipment_groups.setdefault(equip_no, []).append(row)
+
+    batch_data = []
+    rows_matched = 0
+    rows_to_update = 0
+    cells_to_update = 0
+    cells_unchanged = 0
+    missing_equipment = []
+
+    def flush(run, row_num):
+        start_col = col_idx_to_letter(run[0][0])
+        end_col = col_idx_to_letter(run[-1][0])
+        batch_data.append({
+            "range": a1_range(grid.title, f"{start_col}{row_num}:{end_col}{row_num}"),
+            "values": [[value for _, value in run]]
+        })
+
+    for equip_no, rows_to_insert in equipment_groups.items():
+        start_row_idx = start_row(equip_no)
+        if start_row_idx is None:
+            missing_equipment.append(equip_no)
+            continue
+
+        for i, merged_row in enumerate(rows_to_insert):
+            row_idx = start_row_idx + i
+            target_row_num = row_idx + 1  # Sheet rows are 1-indexed
+            rows_matched += 1
+
+            # Runs of adjacent changed cells: [(col_idx, value), ...]
+            run = []
+            changed = 0
+            for col_idx, header_name in columns:
+                # ✨ Only the first row gets EQUIPMENT NO., NO., EQUIPMENT DESCRIPTION
+                if i > 0 and header_name in first_row_only:
+                    value = ""
+                else:
+                    value = str(merged_row.get(header_name, ""))
+
+                current = grid.cell(row_idx, col_idx)
+                current = current.get('formattedValue', '').strip() if current else ''
+                if value.strip() == current:
+                    cells_unchanged += 1
+                    continue
+
+                changed += 1
+                if run and run[-1][0] != col_idx - 1:
+                    flush(run, target_row_num)
+                    run = []
+                run.append((col_idx, value))
+
+            if run:
+                flush(run, target_row_num)
+            if changed:
+                rows_to_update += 1
+                cells_to_update += changed
+
+    return {
+        "batch_data": batch_data,
+        "rows_matched": rows_matched,
+        "rows_to_update": rows_to_update,
+        "cells_to_update": cells_to_update,
+        "cells_unchanged": cells_unchanged,
+        "missing_equipment": missing_equipment
+    }
+
+
 def prepare_sheet_update_data(spreadsheet_id, merged_data, sheet_index=0):
     """
     Prepare batch update data structure for Google Sheets.
     Only first row of each equipment group gets EQUIPMENT NO.
+
+    Everything comes from one (revalidated) SheetGrid: sheet name, headers
+    and the equipment row index, with block rows taken from the equipment
+    anchors where the sheet has them.
     
     Args:
         spreadsheet_id: Google Sheet ID
@@ -683,151 +1088,124 @@ def prepare_sheet_update_data(spreadsheet_id, merged_data, sheet_index=0):
             "success": bool,
             "batch_data": list of update ranges,
             "sheet_name": str,
-            "rows_to_update": int,
+            "rows_to_update": int (rows with at least one changed cell),
+            "cells_to_update": int,
+            "cells_unchanged": int,
             "message": str (if error)
         }
     """
-    service = get_sheets_service()
-    if not service:
-        return {
-            "success": False,
-            "message": "Failed to connect to Google Sheets"
-        }
-
     try:
-        # 🔍 STEP 1: GET SHEET NAME
-        sheet_metadata = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        sheet_name = sheet_metadata['sheets'][sheet_index]['properties']['title']
-        
-        # 🔍 STEP 2: GET HEADERS USING extract_yellow_headers
-        headers_mapping = extract_yellow_headers(spreadsheet_id, sheet_index)
-        
-        if not headers_mapping:
+        grid = get_sheet_grid(spreadsheet_id, sheet_index, revalidate=True)
+        if not grid:
+            return {
+                "success": False,
+                "message": "Failed to read Google Sheet"
+            }
+
+        if not grid.headers:
             return {
                 "success": False,
                 "message": "Could not extract headers from sheet"
             }
-        
-        # Create reverse mapping: header name → column letter
-        header_to_col = {v: k for k, v in headers_mapping.items()}
-        
-        # Find EQUIPMENT NO. column
-        equip_header = None
-        for header_name in header_to_col.keys():
-            if "EQUIPMENT NO." in header_name.upper():
-                equip_header = header_name
-                break
-        
-        if not equip_header:
+
+        if not grid.equipment_col:
             return {
                 "success": False,
                 "message": "Could not find EQUIPMENT NO. column"
             }
-        
-        equip_col_letter = header_to_col[equip_header]
-        
-        # 📊 STEP 3: GET SHEET DATA TO FIND EQUIPMENT ROWS
-        result = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id,
-            includeGridData=True,
-            fields="sheets(properties,data(rowData(values(formattedValue))))"
-        ).execute()
-        
-        sheet_data = result['sheets'][sheet_index]
-        data = sheet_data['data'][0]['rowData']
-        
-        equip_col_idx = ord(equip_col_letter) - ord('A')
-        
-        # 🔄 STEP 4: GROUP MERGED DATA BY EQUIPMENT NO.
-        equipment_groups = {}
-        for row in merged_data:
-            equip_no = row.get("EQUIPMENT NO.", "").strip()
-            if equip_no:
-                if equip_no not in equipment_groups:
-                    equipment_groups[equip_no] = []
-                equipment_groups[equip_no].append(row)
-        
-        # 📝 STEP 5: BUILD UPDATE DATA IN A1 NOTATION
-        batch_data = []
-        rows_to_update = 0
-        
-        for equip_no, rows_to_insert in equipment_groups.items():
-            # Find the first row where this EQUIPMENT NO. appears
-            start_row_idx = None
-            
-            for row_idx, row in enumerate(data):
-                if 'values' not in row or row_idx < 2:  # Skip header rows
-                    continue
-                
-                values = row['values']
-                if equip_col_idx >= len(values):
-                    continue
-                
-                cell_value = values[equip_col_idx].get('formattedValue', '').strip()
-                
-                if cell_value.upper() == equip_no.upper():
-                    start_row_idx = row_idx + 1  # +1 because sheet rows are 1-indexed
-                    break
-            
-            if start_row_idx is None:
-                print(f"Equipment {equip_no} not found in sheet, skipping")
-                continue
-            
-            # 💾 STEP 6: CREATE UPDATE ROWS IN A1 NOTATION
-            for i, merged_row in enumerate(rows_to_insert):
-                target_row_num = start_row_idx + i
-                
-                # Build row values in column order
-                row_values = []
-                for col_letter in sorted(headers_mapping.keys()):
-                    header_name = headers_mapping[col_letter]
-                    value = merged_row.get(header_name, "")
-                    
-                    # ✨ SPECIAL HANDLING: Only first row gets EQUIPMENT NO., NO., EQUIPMENT DESCRIPTION
-                    if i > 0:  # Not the first row
-                        if any(keyword in header_name.upper() for keyword in [
-                            "EQUIPMENT NO.",
-                            "NO.",
-                            "EQUIPMENT DESCRIPTION"
-                        ]):
-                            value = ""  # Empty for rows after the first
-                    
-                    row_values.append(str(value))
-                
-                # Create A1 range
-                start_col = min(headers_mapping.keys())
-                end_col = max(headers_mapping.keys())
-                range_notation = f"{sheet_name}!{start_col}{target_row_num}:{end_col}{target_row_num}"
-                
-                batch_data.append({
-                    "range": range_notation,
-                    "values": [row_values]
-                })
-                rows_to_update += 1
-        
-        if not batch_data:
+
+        plan = plan_sheet_update(grid, merged_data, get_equipment_anchors(spreadsheet_id, grid))
+        for equip_no in plan["missing_equipment"]:
+            log.warning("Equipment %s not found in sheet, skipping", equip_no)
+
+        if not plan["rows_matched"]:
             return {
                 "success": False,
                 "message": "No matching rows found to update"
             }
         
+        # batch_data may be empty when the sheet already holds every value
         return {
             "success": True,
-            "batch_data": batch_data,
-            "sheet_name": sheet_name,
-            "rows_to_update": rows_to_update
+            "batch_data": plan["batch_data"],
+            "sheet_name": grid.title,
+            "rows_to_update": plan["rows_to_update"],
+            "cells_to_update": plan["cells_to_update"],
+            "cells_unchanged": plan["cells_unchanged"]
         }
     
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Error preparing sheet update for %s", spreadsheet_id)
         return {
             "success": False,
             "message": f"Error preparing data: {str(e)}"
         }
 
+def chunk_batch_data(batch_data, max_ranges=None, max_bytes=None):
+    """
+    Split update ranges into consecutive chunks bounded by range count and
+    (JSON) payload size. A single range larger than max_bytes gets its own chunk.
+
+    Returns:
+        list of (chunk, payload_bytes)
+    """
+    max_ranges = max_ranges or SHEET_WRITE_MAX_RANGES
+    max_bytes = max_bytes or SHEET_WRITE_MAX_BYTES
+
+    chunks = []
+    current, current_bytes = [], 0
+    for entry in batch_data:
+        size = len(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        if current and (len(current) >= max_ranges or current_bytes + size > max_bytes):
+            chunks.append((current, current_bytes))
+            current, current_bytes = [], 0
+        current.append(entry)
+        current_bytes += size
+    if current:
+        chunks.append((current, current_bytes))
+    return chunks
+
+
+def _is_retryable_write_error(error):
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is None:
+        # Transport errors (timeouts, resets) carry no HTTP status
+        return isinstance(error, (OSError, TimeoutError))
+    return int(status) in RETRYABLE_HTTP_STATUS
+
+
+def _chunk_span(chunk):
+    """First and last range of a write chunk, for log lines."""
+    if len(chunk) == 1:
+        return chunk[0]["range"]
+    return f"{chunk[0]['range']} .. {chunk[-1]['range']} ({len(chunk)} ranges)"
+
+
+def _send_chunk(spreadsheet_id, chunk):
+    # Runs on a pool thread: get_sheets_service gives each thread its own client
+    service = get_sheets_service()
+    if not service:
+        raise RuntimeError("Failed to connect to Google Sheets")
+    start = time.perf_counter()
+    response = service.spreadsheets().values().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={
+            "valueInputOption": "USER_ENTERED",  # Allows formulas and formatting
+            "data": chunk
+        }
+    ).execute()
+    return response, round((time.perf_counter() - start) * 1000, 1)
+
+
 def execute_sheet_batch_update(spreadsheet_id, batch_data):
     """
     Execute batch update to Google Sheets using prepared data.
+
+    The ranges are split into chunks (SHEET_WRITE_MAX_RANGES ranges /
+    SHEET_WRITE_MAX_BYTES of JSON each) sent with up to
+    SHEET_WRITE_CONCURRENCY requests in flight. Chunks that fail with a
+    retryable error (429, 5xx, timeouts) are re-sent, and only those, up to
+    SHEET_WRITE_MAX_ATTEMPTS times with jittered backoff.
     
     Args:
         spreadsheet_id: Google Sheet ID
@@ -835,251 +1213,244 @@ def execute_sheet_batch_update(spreadsheet_id, batch_data):
     
     Returns:
         dict: {
-            "success": bool,
+            "success": bool (every chunk written),
             "message": str,
-            "updated_cells": int (if success)
+            "updated_cells": int,
+            "updated_ranges": int,
+            "chunks": [{"index", "ranges", "bytes", "attempts", "ms", "success", "error"?}],
+            "total_ms": float
         }
     """
-    service = get_sheets_service()
-    if not service:
+    if not batch_data:
         return {
-            "success": False,
-            "message": "Failed to connect to Google Sheets"
+            "success": True,
+            "message": "Sheet already up to date",
+            "updated_cells": 0,
+            "updated_ranges": 0,
+            "chunks": [],
+            "total_ms": 0.0
         }
 
+    started = time.perf_counter()
+    chunks = chunk_batch_data(batch_data)
+    reports = [
+        {"index": i, "ranges": len(chunk), "bytes": size, "attempts": 0, "ms": 0.0, "success": False}
+        for i, (chunk, size) in enumerate(chunks)
+    ]
+    updated_cells = 0
+    pending = list(range(len(chunks)))
+
     try:
-        body = {
-            "valueInputOption": "USER_ENTERED",  # Allows formulas and formatting
-            "data": batch_data
-        }
-        
-        response = service.spreadsheets().values().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body=body
-        ).execute()
-        
-        updated_cells = response.get('totalUpdatedCells', 0)
-        
-        return {
-            "success": True,
-            "message": f"Successfully updated {updated_cells} cells",
-            "updated_cells": updated_cells,
-            "updated_ranges": len(batch_data)
-        }
-    
-    except Exception as e:
-        traceback.print_exc()
+        with ThreadPoolExecutor(max_workers=max(1, min(SHEET_WRITE_CONCURRENCY, len(chunks)))) as pool:
+            for attempt in range(1, SHEET_WRITE_MAX_ATTEMPTS + 1):
+                if attempt > 1:
+                    delay = SHEET_WRITE_RETRY_DELAY * 2 ** (attempt - 2)
+                    time.sleep(random.uniform(delay / 2, delay))
+
+                futures = {i: pool.submit(_send_chunk, spreadsheet_id, chunks[i][0]) for i in pending}
+                retry = []
+                for i, future in futures.items():
+                    report = reports[i]
+                    report["attempts"] = attempt
+                    try:
+                        response, elapsed_ms = future.result()
+                    except Exception as e:
+                        report["error"] = str(e)
+                        if _is_retryable_write_error(e):
+                            retry.append(i)
+                        else:
+                            log.exception("Sheet write chunk %s [%s] failed", i, _chunk_span(chunks[i][0]))
+                        continue
+                    report["ms"] = elapsed_ms
+                    report["success"] = True
+                    report.pop("error", None)
+                    updated_cells += response.get('totalUpdatedCells', 0)
+
+                pending = retry
+                if not pending:
+                    break
+
+            for i in pending:
+                log.error(
+                    "Sheet write chunk %s [%s] failed after %s attempts: %s",
+                    i, _chunk_span(chunks[i][0]), reports[i]["attempts"], reports[i]["error"]
+                )
+    finally:
+        # Even a failed call may have applied part of the update
+        invalidate_sheet_cache(spreadsheet_id)
+
+    failed = [r for r in reports if not r["success"]]
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+    updated_ranges = sum(r["ranges"] for r in reports if r["success"])
+
+    if failed:
         return {
             "success": False,
-            "message": f"Error executing batch update: {str(e)}"
+            "message": (
+                f"Error executing batch update: {len(failed)} of {len(chunks)} chunks failed "
+                f"({failed[0].get('error')}); {updated_cells} cells were updated"
+            ),
+            "updated_cells": updated_cells,
+            "updated_ranges": updated_ranges,
+            "chunks": reports,
+            "total_ms": total_ms
         }
+
+    return {
+        "success": True,
+        "message": f"Successfully updated {updated_cells} cells",
+        "updated_cells": updated_cells,
+        "updated_ranges": updated_ranges,
+        "chunks": reports,
+        "total_ms": total_ms
+    }
     
-def get_rows_by_no(spreadsheet_id, target_no, sheet_index=0):
-    service = get_sheets_service()
-    if not service:
+def get_rows_by_no(spreadsheet_id, target_no, sheet_index=0, grid=None):
+    """Header-mapped rows whose NO. (merged cells filled down) matches."""
+    grid = grid or get_sheet_grid(spreadsheet_id, sheet_index)
+    if not grid:
         return []
+    return grid.rows_by_no(target_no)
 
-    try:
-        # Get sheet data
-        sheet = service.spreadsheets()
-        result = sheet.get(
-            spreadsheetId=spreadsheet_id,
-            includeGridData=True,
-            fields="sheets(properties,merges,data(rowData(values(userEnteredValue,formattedValue,userEnteredFormat))))"
-        ).execute()
+def get_all_rows_with_no(spreadsheet_id, sheet_index=0, grid=None):
+    """
+    Header-mapped rows that carry a numeric NO., in sheet order.
 
-        sheet_data = result['sheets'][sheet_index]
-        data = sheet_data['data'][0]['rowData']
-        merges = sheet_data.get('merges', [])
+    Without a grid the tab is streamed page by page (iter_rows_with_no)
+    rather than loaded and cached whole.
+    """
+    if grid:
+        return grid.rows_with_numeric_no()
+    return list(iter_rows_with_no(spreadsheet_id, sheet_index))
 
-        # Step 1: Extract headers
-        yellow_cells = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            for col_idx, cell in enumerate(row['values']):
-                if is_yellow_cell(cell):
-                    value = cell.get('formattedValue', '').strip()
-                    if not value:
-                        continue
-                    merge_info = get_merge_range(row_idx, col_idx, merges)
-                    is_merge_primary = merge_info and merge_info['startRow'] == row_idx and merge_info['startCol'] == col_idx
-                    yellow_cells.append({
-                        'row': row_idx,
-                        'col': col_idx,
-                        'value': value,
-                        'merge_info': merge_info if is_merge_primary else None,
-                        'is_merge_primary': is_merge_primary
-                    })
-
-        yellow_cells.sort(key=lambda x: (x['row'], x['col']))
-
-        column_headers = {}
-        for cell in yellow_cells:
-            col_letter = col_idx_to_letter(cell['col'])
-            merge_info = cell['merge_info']
-            if col_letter not in column_headers:
-                column_headers[col_letter] = []
-            column_headers[col_letter].append(cell['value'])
-            if merge_info:
-                for spanned_col in range(cell['col'] + 1, cell['col'] + merge_info['colSpan']):
-                    spanned_letter = col_idx_to_letter(spanned_col)
-                    column_headers[spanned_letter] = column_headers[col_letter].copy()
-
-        headers_mapping = {}
-        for col_letter in sorted(column_headers.keys()):
-            unique_headers = []
-            for h in column_headers[col_letter]:
-                if h not in unique_headers:
-                    unique_headers.append(h)
-            headers_mapping[col_letter] = ' '.join(unique_headers).replace('\n', ' ').replace('\r', ' ').strip()
-
-        # Step 2: Prepare merged NO. values mapping
-        # Changed: Search for "NO" or "NO." in header
-        no_col_letter = next((c for c, h in headers_mapping.items() if h.upper() == "NO" or h.upper() == "NO."), None)
-        no_merged_values = {}  # row_idx -> no
-
-        if no_col_letter:
-            for merge in merges:
-                start_col = merge['startColumnIndex']
-                end_col = merge['endColumnIndex']
-                start_row = merge['startRowIndex']
-                end_row = merge['endRowIndex']
-                if col_idx_to_letter(start_col) == no_col_letter:
-                    # Get the value of the primary cell
-                    cell = data[start_row]['values'][start_col]
-                    value = cell.get('formattedValue', '').strip() if cell else ''
-                    # Apply the value to all rows spanned by merge
-                    for r in range(start_row, end_row):
-                        no_merged_values[r] = value
-
-        # Step 3: Map rows by headers, use merged value if necessary
-        rows_matched = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            row_data = {}
-            for col_idx in range(len(row['values'])):
-                col_letter = col_idx_to_letter(col_idx)
-                header = headers_mapping.get(col_letter)
-                if not header:
-                    continue
-                cell = row['values'][col_idx] if col_idx < len(row['values']) else None
-                row_data[header] = cell.get('formattedValue', '').strip() if cell else ''
 
-            # Use merged NO. if current row has empty
-            if no_col_letter and (not row_data.get(headers_mapping[no_col_letter])):
-                row_data[headers_mapping[no_col_letter]] = no_merged_values.get(row_idx, '')
+# ---------------------------------------------------------------------
+# Streaming reads
+# ---------------------------------------------------------------------
+#
+# Very large registers are read in row pages instead of one grid: only the
+# layout (properties, merges, headers) and one page of values are held at a
+# time, and the next page is fetched while the caller works on this one.
 
-            # Filter by target NO
-            if row_data.get(headers_mapping[no_col_letter], '').upper() == target_no.upper():
-                rows_matched.append(row_data)
+SHEET_PAGE_ROWS = int(os.getenv("SHEET_PAGE_ROWS", "1000"))
 
-        return rows_matched
 
-    except Exception:
-        traceback.print_exc()
-        return []
-
-def get_all_rows_with_no(spreadsheet_id, sheet_index=0):
-    service = get_sheets_service()
-    if not service:
-        return []
+def _fetch_page(spreadsheet_id, a1):
+    # Runs on the prefetch thread: get_sheets_service gives it its own client
+    response = get_sheets_service().spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[a1],
+        majorDimension="ROWS",
+        valueRenderOption="FORMATTED_VALUE",
+        fields="valueRanges(values)"
+    ).execute()
+    return response['valueRanges'][0].get('values', [])
 
-    try:
-        # Get sheet data
-        sheet = service.spreadsheets()
-        result = sheet.get(
-            spreadsheetId=spreadsheet_id,
-            includeGridData=True,
-            fields="sheets(properties,merges,data(rowData(values(userEnteredValue,formattedValue,userEnteredFormat))))"
-        ).execute()
 
-        sheet_data = result['sheets'][sheet_index]
-        data = sheet_data['data'][0]['rowData']
-        merges = sheet_data.get('merges', [])
+def iter_sheet_rows(spreadsheet_id, sheet_index=0, page_size=None, fill_headers=None):
+    """
+    Stream a tab's header-mapped rows, fetching `page_size` rows per request.
 
-        # Step 1: Extract headers
-        yellow_cells = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            for col_idx, cell in enumerate(row['values']):
-                if is_yellow_cell(cell):
-                    value = cell.get('formattedValue', '').strip()
-                    if not value:
-                        continue
-                    merge_info = get_merge_range(row_idx, col_idx, merges)
-                    is_merge_primary = merge_info and merge_info['startRow'] == row_idx and merge_info['startCol'] == col_idx
-                    yellow_cells.append({
-                        'row': row_idx,
-                        'col': col_idx,
-                        'value': value,
-                        'merge_info': merge_info if is_merge_primary else None,
-                        'is_merge_primary': is_merge_primary
-                    })
-
-        yellow_cells.sort(key=lambda x: (x['row'], x['col']))
-
-        # Build header mapping
-        column_headers = {}
-        for cell in yellow_cells:
-            col_letter = col_idx_to_letter(cell['col'])
-            merge_info = cell['merge_info']
-            if col_letter not in column_headers:
-                column_headers[col_letter] = []
-            column_headers[col_letter].append(cell['value'])
-            if merge_info:
-                for spanned_col in range(cell['col'] + 1, cell['col'] + merge_info['colSpan']):
-                    spanned_letter = col_idx_to_letter(spanned_col)
-                    column_headers[spanned_letter] = column_headers[col_letter].copy()
-
-        headers_mapping = {}
-        for col_letter in sorted(column_headers.keys()):
-            unique_headers = []
-            for h in column_headers[col_letter]:
-                if h not in unique_headers:
-                    unique_headers.append(h)
-            headers_mapping[col_letter] = ' '.join(unique_headers).replace('\n', ' ').replace('\r', ' ').strip()
-
-        # Step 2: Prepare merged NO values
-        no_col_letter = next((c for c, h in headers_mapping.items() if h.upper() in ["NO", "NO."]), None)
-        no_merged_values = {}
-        if no_col_letter:
-            for merge in merges:
-                start_col = merge['startColumnIndex']
-                start_row = merge['startRowIndex']
-                end_row = merge['endRowIndex']
-                if col_idx_to_letter(start_col) == no_col_letter:
-                    cell = data[start_row]['values'][start_col]
-                    value = cell.get('formattedValue', '').strip() if cell else ''
-                    for r in range(start_row, end_row):
-                        no_merged_values[r] = value
-
-        # Step 3: Map rows and only keep those with a NO number
-        rows_matched = []
-        for row_idx, row in enumerate(data):
-            if 'values' not in row:
-                continue
-            row_data = {}
-            for col_idx in range(len(row['values'])):
-                col_letter = col_idx_to_letter(col_idx)
-                header = headers_mapping.get(col_letter)
-                if not header:
-                    continue
-                cell = row['values'][col_idx] if col_idx < len(row['values']) else None
-                row_data[header] = cell.get('formattedValue', '').strip() if cell else ''
+    Rows come out as the SheetGrid readers build them (every header present,
+    fully empty rows skipped). Merged cells of the `fill_headers` columns are
+    filled down from the merge's first row; the open merge is carried from
+    one page to the next, so blocks spanning a page boundary fill correctly.
+    Pages cover the tab down to its gridProperties.rowCount; pages with no
+    values are skipped, so blank blocks inside the register are read past.
 
-            # Fill NO column if empty but only if merged value exists
-            if no_col_letter and not row_data.get(headers_mapping[no_col_letter]):
-                row_data[headers_mapping[no_col_letter]] = no_merged_values.get(row_idx, '')
+    Args:
+        spreadsheet_id: Google Sheet ID
+        sheet_index: Tab index (default 0)
+        page_size: Rows per values request (default SHEET_PAGE_ROWS)
+        fill_headers: Headers (case-insensitive) whose merged cells are
+            filled down (default: the EQUIPMENT NO. and NO. columns)
 
-            no_value = row_data.get(headers_mapping[no_col_letter], '').strip()
-            if no_value and no_value.isdigit():  # only numeric NOs
-                rows_matched.append(row_data)
+    Yields:
+        SheetRow: header -> formatted value, in sheet order
 
-        return rows_matched
+    Raises:
+        RuntimeError: If the Sheets service is unavailable
+        HttpError: If the layout or a page cannot be fetched
+    """
+    page_size = page_size or SHEET_PAGE_ROWS
+    service = get_sheets_service()
+    if not service:
+        raise RuntimeError("Failed to connect to Google Sheets")
 
+    try:
+        # The band's rows are streamed first, so it is always fetched
+        properties, merges, header_rows, headers, _ = _fetch_layout(
+            service.spreadsheets(), spreadsheet_id, sheet_index, use_registry=False
+        )
     except Exception:
-        traceback.print_exc()
-        return []
+        log.exception("Error loading sheet layout %s (tab %s)", spreadsheet_id, sheet_index)
+        raise
+    if not headers:
+        return
+
+    schema = RowSchema(headers)
+    width = max(schema.columns) + 1
+    if fill_headers is None:
+        fill_headers = [h for h in headers.values() if h.upper() in NO_KEYS or EQUIPMENT_NO_KEY in h.upper()]
+    wanted = {h.upper() for h in fill_headers}
+    fill = {SheetGrid.column_index(c): h for c, h in headers.items() if h.upper() in wanted}
+
+    # Fill-down state: column -> {merge start row: end row} and the open merge
+    merge_ends = {col: {} for col in fill}
+    for merge in merges:
+        col = merge['startColumnIndex']
+        if col in merge_ends:
+            merge_ends[col][merge['startRowIndex']] = merge['endRowIndex']
+    open_merges = {}  # column -> (end row, value)
+
+    title = properties['title']
+    last_col = col_idx_to_letter(width - 1)
+    row_count = properties.get('gridProperties', {}).get('rowCount', 0)
+    page_starts = range(len(header_rows), row_count, page_size)
+
+    def page_range(start):
+        return a1_range(title, f"A{start + 1}:{last_col}{start + page_size}")
+
+    def pages():
+        # The header band already holds the first rows' values
+        yield 0, [[cell.get('formattedValue', '') for cell in row.get('values', [])] for row in header_rows]
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            pending = None
+            for i, start in enumerate(page_starts):
+                page = pending.result() if pending else _fetch_page(spreadsheet_id, page_range(start))
+                if i + 1 < len(page_starts):
+                    pending = prefetch.submit(_fetch_page, spreadsheet_id, page_range(page_starts[i + 1]))
+                # A blank block of rows does not end the register
+                if page:
+                    yield start, page
+
+    for start, page in pages():
+        for offset, values in enumerate(page):
+            row_idx = start + offset
+            for col in fill:
+                end = merge_ends[col].get(row_idx)
+                if end is not None:
+                    open_merges[col] = (end, values[col].strip() if col < len(values) else '')
+                elif col in open_merges and row_idx >= open_merges[col][0]:
+                    del open_merges[col]
+            if not values:
+                continue
+
+            row = list(schema.values_from([value.strip() for value in values[:width]]))
+            for col, header in fill.items():
+                position = schema.index[header]
+                if not row[position] and col in open_merges:
+                    row[position] = open_merges[col][1]
+            yield SheetRow(schema, row)
+
+
+def iter_rows_with_no(spreadsheet_id, sheet_index=0, page_size=None):
+    """Streaming get_all_rows_with_no: rows with a numeric (filled-down) NO., in sheet order."""
+    no_header = None
+    for row in iter_sheet_rows(spreadsheet_id, sheet_index, page_size, fill_headers=NO_KEYS):
+        if no_header is None:
+            no_header = next((h for h in row if h.upper() in NO_KEYS), "")
+            if not no_header:
+                return
+        if row[no_header].strip().isdigit():
+            yield row
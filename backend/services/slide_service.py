@@ -1,20 +1,16 @@
-import os
 import io
-import traceback
 from dotenv import load_dotenv 
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+from services.google_client import get_google_service
+from utils.log import get_logger
 
 
 # ===============================================================================
 # CONFIGURATION - EDIT THESE VALUES
 # ===============================================================================
 
+log = get_logger(__name__)
+
 load_dotenv()
-CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("GOOGLE_REFRESH_TOKEN")
 SCOPES = [
     "https://www.googleapis.com/auth/presentations"
 ]
@@ -82,6 +78,25 @@ def build_slide_table_updates(api_response):
 
 from collections import defaultdict
 
+def _table_updates_for_row(row):
+    """Table cell updates for one sheet row (non-empty mapped values only)."""
+    part = row.get("PARTS")
+    if part not in COMPONENT_ROW_MAPPING:
+        return []
+
+    slide_row = COMPONENT_ROW_MAPPING[part]
+    updates = []
+    for sheet_header, slide_col_key in FIELD_MAPPINGS.items():
+        value = row.get(sheet_header, "")
+        if value and str(value).strip():
+            updates.append({
+                "row": slide_row,
+                "col": COLUMN_MAPPING[slide_col_key],
+                "value": value
+            })
+    return updates
+
+
 def build_slide_table_updates_grouped_by_no(api_response):
     grouped_updates = defaultdict(list)
 
@@ -90,24 +105,7 @@ def build_slide_table_updates_grouped_by_no(api_response):
         no_value = row.get("NO.", "").strip()
         if not no_value or not no_value.isdigit():
             continue
-
-        part = row.get("PARTS")
-        if part not in COMPONENT_ROW_MAPPING:
-            continue
-
-        slide_row = COMPONENT_ROW_MAPPING[part]
-
-        for sheet_header, slide_col_key in FIELD_MAPPINGS.items():
-            slide_col = COLUMN_MAPPING[slide_col_key]
-            value = row.get(sheet_header, "")
-
-            # ✅ Only include non-empty values
-            if value and str(value).strip():
-                grouped_updates[no_value].append({
-                    "row": slide_row,
-                    "col": slide_col,
-                    "value": value
-                })
+        grouped_updates[no_value].extend(_table_updates_for_row(row))
 
     return grouped_updates
 
@@ -117,31 +115,13 @@ def build_slide_table_updates_grouped_by_no(api_response):
 # ===============================================================================
 
 def get_slide_service():
-    """Get Google Slides API service."""
-    if not all([CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN]):
-        raise ValueError("OAuth environment variables missing")
-
-    creds = Credentials(
-        token=None,
-        refresh_token=REFRESH_TOKEN,
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        token_uri="https://oauth2.googleapis.com/token",
-        scopes=SCOPES
-    )
-
-    try:
-        creds.refresh(Request())
-    except Exception:
-        traceback.print_exc()
-        raise
-
-    return build("slides", "v1", credentials=creds)
+    """Get Google Slides API service (shared credentials, per-thread client)."""
+    return get_google_service("slides", "v1", SCOPES)
 
 def overwrite_table_cells(table_id, updates, slide_id):
     service = get_slide_service()
     if not updates:
-        print("No data to overwrite.")
+        log.debug("No data to overwrite.")
         return
 
     # First, get the current table object
@@ -153,7 +133,7 @@ def overwrite_table_cells(table_id, updates, slide_id):
                 table_obj = element["table"]
                 break
     if not table_obj:
-        print(f"Table {table_id} not found in slide.")
+        log.warning("Table %s not found in slide.", table_id)
         return
 
     requests = []
@@ -220,7 +200,7 @@ def overwrite_table_cells(table_id, updates, slide_id):
             })
 
     if not requests:
-        print("No valid data to insert.")
+        log.debug("No valid data to insert.")
         return
 
     try:
@@ -228,10 +208,10 @@ def overwrite_table_cells(table_id, updates, slide_id):
             presentationId=slide_id,
             body={"requests": requests}
         ).execute()
-        print(f"Inserted/Updated {len(updates)} cells in table {table_id}")
+        log.info("Inserted/Updated %s cells in table %s", len(updates), table_id)
         return response
     except Exception:
-        traceback.print_exc()
+        log.exception("Error updating table %s", table_id)
         raise
 
 
@@ -329,7 +309,7 @@ def overwrite_textboxes(presentation_id, updates):
     """
     service = get_slide_service()
     if not updates:
-        print("No textboxes to update")
+        log.debug("No textboxes to update")
         return
 
     # Get current presentation
@@ -358,7 +338,7 @@ def overwrite_textboxes(presentation_id, updates):
                 break
 
         if not textbox_obj:
-            print(f"Textbox {obj_id} not found, skipping.")
+            log.warning("Textbox %s not found, skipping.", obj_id)
             continue
 
         # 1️⃣ Delete existing text if any
@@ -379,7 +359,7 @@ def overwrite_textboxes(presentation_id, updates):
                 smart_requests.append(style_req)
 
     if not smart_requests:
-        print("No valid updates for textboxes.")
+        log.debug("No valid updates for textboxes.")
         return
 
     # Execute all requests in order
@@ -388,10 +368,10 @@ def overwrite_textboxes(presentation_id, updates):
             presentationId=presentation_id,
             body={"requests": smart_requests}
         ).execute()
-        print(f"Updated {len(smart_requests)} requests in presentation {presentation_id}")
+        log.info("Updated %s requests in presentation %s", len(smart_requests), presentation_id)
         return response
     except Exception:
-        traceback.print_exc()
+        log.exception("Error updating textboxes in presentation %s", presentation_id)
         raise
 
 
@@ -402,9 +382,50 @@ def overwrite_grouped_tables(grouped_updates, slide_id):
     """
     for no, updates in grouped_updates.items():
         table_id = f"p{no}_i4"  # dynamically generate table ID
-        print(f"Updating table {table_id} with {len(updates)} cells")
+        log.debug("Updating table %s with %s cells", table_id, len(updates))
         overwrite_table_cells(table_id, updates, slide_id)
 
+def write_grouped_tables_streaming(rows, slide_id):
+    """
+    Streaming overwrite_grouped_tables for an iterator of sheet rows (e.g.
+    sheet_service.iter_rows_with_no): each NO.'s table is written as soon as
+    its block of rows ends, while later pages of the sheet are still loading.
+
+    Updates are kept per NO. as build_slide_table_updates_grouped_by_no does,
+    so a NO. that shows up again further down is merged: its table is
+    written again with all of its updates, ending in the same cells as one
+    grouped write.
+
+    Args:
+        rows: Iterable of header-mapped rows in sheet order
+        slide_id: Presentation ID
+
+    Returns:
+        list: First row of every NO. in sheet order (all that
+        build_slide_textbox_updates reads)
+    """
+    first_rows = []
+    grouped_updates = defaultdict(list)
+    current_no = None
+
+    def flush():
+        if current_no is not None and grouped_updates[current_no]:
+            overwrite_grouped_tables({current_no: grouped_updates[current_no]}, slide_id)
+
+    for row in rows:
+        no_value = row.get("NO.", "").strip()
+        if not no_value or not no_value.isdigit():
+            continue
+        if no_value != current_no:
+            flush()
+            if no_value not in grouped_updates:
+                first_rows.append(row)
+            current_no = no_value
+        grouped_updates[no_value].extend(_table_updates_for_row(row))
+    flush()
+
+    return first_rows
+
 def read_textboxes_grouped_by_slide(presentation_id):
     """
     Read all textboxes from a Google Slides presentation
@@ -477,7 +498,7 @@ def build_slide_textbox_updates(rows, textbox_response):
         textboxes = textbox_response.get(slide_id, [])
 
         if len(textboxes) < 3:
-            print(f"Warning: Slide {slide_id} does not have 3 textboxes. Skipping...")
+            log.warning("Slide %s does not have 3 textboxes. Skipping...", slide_id)
             continue
 
         description = first_row.get("EQUIPMENT DESCRIPTION", "")
@@ -0,0 +1,199 @@
+"""
+Table-driven pressure / temperature normalization for register columns.
+
+Values arrive from the extraction as free text ("1.5", "0.35/1.2", "-1 ~ 3.5",
+"FV / 0.35", "350°F") with a separate unit field ("kPa", "bar(g)", "kg/cm²",
+"psi", "°F"...). Every string is tokenized once, all numbers of a column are
+converted in one NumPy pass (value * factor + offset) and formatted with a
+fixed number of decimals, so the same input always renders the same way.
+
+Pressures are converted to MPa and temperatures to °C. Gauge / absolute
+suffixes (barg, psi(a)...) are accepted but no atmospheric offset is applied:
+the register records the pressure as stated.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+PRESSURE_DECIMALS = 3
+TEMPERATURE_DECIMALS = 1
+
+# unit key -> (factor, offset) into MPa
+PRESSURE_UNITS = {
+    "mpa": (1.0, 0.0),
+    "kpa": (1e-3, 0.0),
+    "pa": (1e-6, 0.0),
+    "bar": (0.1, 0.0),
+    "mbar": (1e-4, 0.0),
+    "psi": (0.00689475729, 0.0),
+    "ksi": (6.89475729, 0.0),
+    "kg/cm2": (0.0980665, 0.0),
+    "kgf/cm2": (0.0980665, 0.0),
+    "kg/cm": (0.0980665, 0.0),  # "kg/cm²" with the superscript lost
+    "atm": (0.101325, 0.0),
+    "mmhg": (1.33322e-4, 0.0),
+    "torr": (1.33322e-4, 0.0),
+}
+
+# unit key -> (factor, offset) into °C
+TEMPERATURE_UNITS = {
+    "c": (1.0, 0.0),
+    "f": (5.0 / 9.0, -32.0 * 5.0 / 9.0),
+    "k": (1.0, -273.15),
+}
+
+TEMPERATURE_ALIASES = {
+    "c": "c", "degc": "c", "celsius": "c",
+    "f": "f", "degf": "f", "fahrenheit": "f",
+    "k": "k", "kelvin": "k",
+}
+
+# Unknown or missing units are taken to already be the target unit
+_IDENTITY = (1.0, 0.0)
+
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|\.\d+|[/~-]|F\.?\s*V\.?|FULL\s+VAC(?:UUM)?", re.IGNORECASE)
+_SEPARATORS = frozenset("/~-")
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+_EMBEDDED_TEMPERATURE_UNIT = re.compile(r"°\s*([CFK])|\d\s*([CFK])\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def pressure_unit(unit):
+    """(factor, offset) into MPa for a free-text pressure unit."""
+    key = _unit_key(unit)
+    if key in PRESSURE_UNITS:
+        return PRESSURE_UNITS[key]
+    # Gauge / absolute marker: "barg", "psia", "kg/cm2g"
+    if key and key[-1] in "ga" and key[:-1] in PRESSURE_UNITS:
+        return PRESSURE_UNITS[key[:-1]]
+    return _IDENTITY
+
+
+@lru_cache(maxsize=64)
+def temperature_unit(unit):
+    """(factor, offset) into °C for a free-text temperature unit."""
+    key = _unit_key(unit).replace("°", "")
+    return TEMPERATURE_UNITS.get(TEMPERATURE_ALIASES.get(key), _IDENTITY)
+
+
+def _unit_key(unit):
+    if not unit or not isinstance(unit, str):
+        return ""
+    key = unit.strip().lower()
+    for old, new in (("²", "2"), ("^2", "2"), (" ", ""), ("(", ""), (")", ""), (".", "")):
+        key = key.replace(old, new)
+    return key
+
+
+def _tokenize(text):
+    """
+    Split a value into numbers and separators: "-1 ~ 3.5" -> [-1.0, "~", 3.5].
+    A "-" is a sign at the start or after another separator, otherwise a
+    range separator. Full-vacuum markers are kept as "FV"; leading and
+    trailing separators are dropped.
+    """
+    if text is None:
+        return []
+    # "1,500" -> "1500"; any other comma is a decimal comma ("1,5")
+    text = _THOUSANDS.sub("", str(text)).replace(",", ".")
+    tokens = []
+    sign = 1.0
+    for raw in _TOKEN.findall(text):
+        if raw in _SEPARATORS:
+            if raw == "-" and (not tokens or isinstance(tokens[-1], str) and tokens[-1] in _SEPARATORS):
+                sign = -sign
+            else:
+                tokens.append(raw)
+            continue
+        if tokens and not (isinstance(tokens[-1], str) and tokens[-1] in _SEPARATORS):
+            # Two values with nothing between them ("3.5 10") stay apart
+            tokens.append(" ")
+        if raw[0].isdigit() or raw[0] == ".":
+            tokens.append(sign * float(raw))
+        else:
+            tokens.append("FV")
+        sign = 1.0
+
+    while tokens and isinstance(tokens[0], str) and tokens[0] in _SEPARATORS:
+        tokens.pop(0)
+    while tokens and isinstance(tokens[-1], str) and tokens[-1] in _SEPARATORS:
+        tokens.pop()
+    return tokens
+
+
+def _format_number(value, decimals):
+    text = f"{value:.{decimals}f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def _convert_column(values, conversions, decimals):
+    """
+    Normalize a column: tokenize every value, convert all numbers in one
+    vectorized pass with their row's (factor, offset) and re-join.
+    """
+    token_lists = [_tokenize(value) for value in values]
+
+    numbers, factors, offsets = [], [], []
+    for tokens, (factor, offset) in zip(token_lists, conversions):
+        for token in tokens:
+            if isinstance(token, float):
+                numbers.append(token)
+                factors.append(factor)
+                offsets.append(offset)
+
+    converted = np.round(
+        np.asarray(numbers, dtype=np.float64) * np.asarray(factors) + np.asarray(offsets), decimals
+    ).tolist()
+
+    results = []
+    position = 0
+    for tokens in token_lists:
+        parts = []
+        for token in tokens:
+            if isinstance(token, float):
+                parts.append(_format_number(converted[position], decimals))
+                position += 1
+            else:
+                parts.append(token)
+        results.append("".join(parts))
+    return results
+
+
+def normalize_pressures(values, units):
+    """
+    Batch pressure normalization to MPa.
+
+    Args:
+        values: Iterable of raw pressure strings ("1.5", "100/150", "FV/0.35", "no"...)
+        units: Matching iterable of unit strings (kPa, bar(g), psi, kg/cm², MPa...)
+
+    Returns:
+        list of normalized strings ("" where the value has no number)
+    """
+    values = list(values)
+    conversions = [pressure_unit(unit) for unit in units]
+    return _convert_column(values, conversions, PRESSURE_DECIMALS)
+
+
+def normalize_temperatures(values, units=None):
+    """
+    Batch temperature normalization to °C.
+
+    Args:
+        values: Iterable of raw temperature strings ("350", "-29/350", "650°F"...)
+        units: Optional matching iterable of unit strings (C, °C, F, °F, K); a
+            unit written in the value itself ("650°F") is used when missing
+
+    Returns:
+        list of normalized strings ("" where the value has no number)
+    """
+    values = list(values)
+    units = list(units) if units is not None else [None] * len(values)
+    conversions = []
+    for value, unit in zip(values, units):
+        if not _unit_key(unit) or _unit_key(unit) == "no":
+            match = _EMBEDDED_TEMPERATURE_UNIT.search(str(value or ""))
+            unit = (match.group(1) or match.group(2)) if match else None
+        conversions.append(temperature_unit(unit))
+    return _convert_column(values, conversions, TEMPERATURE_DECIMALS)
@@ -0,0 +1,808 @@
+"""
+In-memory emulator of the Google Sheets / Drive calls the sheet services make.
+
+Implements the subset of the APIs used by services.sheet_service:
+    spreadsheets().get(spreadsheetId, ranges, includeGridData, fields)
+    spreadsheets().values().batchGet(spreadsheetId, ranges, majorDimension,
+                                     valueRenderOption, fields)
+    spreadsheets().values().batchUpdate(spreadsheetId, body)
+    spreadsheets().batchUpdate(spreadsheetId, body)
+                                           (create/deleteDeveloperMetadata only)
+    spreadsheets().developerMetadata().search(spreadsheetId, body, fields)
+    spreadsheets().developerMetadata().get(spreadsheetId, metadataId)
+    files().get(fileId, fields)            (Drive `version` / `modifiedTime`)
+
+with A1 ranges, merges, userEnteredFormat colors, developer metadata on
+single rows / columns / sheets / the spreadsheet and partial-response field
+masks. Every write bumps the file version like Drive does, so the grid cache
+revalidation behaves as against the real API.
+
+Test tooling: it lives outside services/ and nothing in the app imports it.
+Offline use (tests, benchmarks, experiments):
+
+    emulator = SheetsEmulator()
+    emulator.add_spreadsheet("register", synthetic_register(5000))
+    with install(emulator):
+        grid = sheet_service.get_sheet_grid("register")
+
+`latency` adds a fixed delay per request and fail_next() makes the next
+requests fail with an HTTP status, to exercise the retry / parallel paths.
+"""
+import copy
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from services.sheet_grid import SheetGrid, col_idx_to_letter
+
+YELLOW = {'backgroundColor': {'red': 1.0, 'green': 1.0, 'blue': 0.0}}
+
+# Two header rows as in the register template: MATERIAL INFORMATION spans
+# SPEC. / GRADE on the second row, every other header is merged vertically.
+REGISTER_HEADERS = [
+    'NO.', 'EQUIPMENT NO.', 'EQUIPMENT DESCRIPTION', 'PARTS',
+    'MATERIAL INFORMATION', None, 'FLUID', 'INSULATION (yes/No)',
+    'DESIGN PRESSURE (Mpa)', 'OPERATING PRESSURE (Mpa)',
+    'DESIGN TEMP.  (°C)', 'OPERATING TEMP.  (°C)',
+]
+REGISTER_SUBHEADERS = {4: 'SPEC.', 5: 'GRADE'}
+REGISTER_PARTS = ['Shell', 'Top Head', 'Bottom Head', 'Channel', 'Tube Bundle', 'Nozzle']
+EQUIPMENT_FORMAT = "V-{:05d}"
+
+
+class EmulatedHttpError(Exception):
+    """Raised like googleapiclient's HttpError: the status is on .resp.status."""
+
+    class _Response:
+        def __init__(self, status):
+            self.status = status
+            self.reason = "Emulated error"
+
+    def __init__(self, status, message="Emulated error"):
+        super().__init__(f"<HttpError {status}: {message}>")
+        self.resp = self._Response(status)
+
+
+# ---------------------------------------------------------------------
+# Field masks and A1 ranges
+# ---------------------------------------------------------------------
+
+_MASK_TOKEN = re.compile(r'\s*([^,()\s]+|[,()])')
+
+
+def parse_field_mask(fields):
+    """
+    Partial-response mask -> nested dict ({name: subtree or None}).
+
+    "sheets(properties(title),merges)" -> {"sheets": {"properties": {"title": None}, "merges": None}}
+    Dotted paths ("userEnteredFormat.backgroundColor") nest the same way.
+    """
+    tokens = _MASK_TOKEN.findall(fields or '')
+    position = 0
+
+    def parse_list():
+        nonlocal position
+        tree = {}
+        while position < len(tokens) and tokens[position] != ')':
+            token = tokens[position]
+            position += 1
+            if token == ',':
+                continue
+            subtree = None
+            if position < len(tokens) and tokens[position] == '(':
+                position += 1
+                subtree = parse_list()
+                position += 1  # ')'
+            *parents, leaf = token.split('.')
+            node = tree
+            for name in parents:
+                child = node.get(name)
+                if child is None:
+                    child = node[name] = {}
+                node = child
+            _merge_mask(node, leaf, subtree)
+        return tree
+
+    return parse_list()
+
+
+def _merge_mask(node, name, subtree):
+    if name not in node:
+        node[name] = subtree
+    elif node[name] is not None:
+        # "a(b),a(c)" -> a(b,c); a bare "a" wins and keeps everything
+        node[name] = None if subtree is None else {**node[name], **subtree}
+
+
+def apply_field_mask(value, mask):
+    """Keep only the masked fields of a response (lists are masked per item)."""
+    if mask is None or '*' in mask:
+        return value
+    if isinstance(value, list):
+        return [apply_field_mask(item, mask) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {name: apply_field_mask(value[name], sub) for name, sub in mask.items() if name in value}
+
+
+_A1 = re.compile(r'^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$')
+
+
+def parse_a1(a1, default_title=None, titles=()):
+    """
+    Split an A1 range into (sheet title, start_row, end_row, start_col, end_col):
+    zero-based, end exclusive, None for an open side.
+
+    "'Unit 1'!A3:H" -> ("Unit 1", 2, None, 0, 8);  "Sheet1!1:10" -> ("Sheet1", 0, 10, None, None)
+    A range equal to one of `titles` ("Sheet1") is that whole sheet.
+    """
+    if a1 in titles or (a1.startswith("'") and a1[1:-1].replace("''", "'") in titles):
+        return a1.strip("'").replace("''", "'"), None, None, None, None
+    if '!' in a1:
+        title, cells = a1.rsplit('!', 1)
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+    else:
+        title, cells = default_title, a1
+
+    match = _A1.match(cells.upper())
+    if not cells or not match:
+        raise EmulatedHttpError(400, f"Unable to parse range: {a1}")
+
+    col1, row1, col2, row2 = match.groups()
+    if ':' not in cells:
+        # Single cell / row / column
+        col2, row2 = col1, row1
+
+    start_row = int(row1) - 1 if row1 else None
+    end_row = int(row2) if row2 else None
+    start_col = SheetGrid.column_index(col1) if col1 else None
+    end_col = SheetGrid.column_index(col2) + 1 if col2 else None
+    return title, start_row, end_row, start_col, end_col
+
+
+def _quoted(title):
+    return "'{}'".format(title.replace("'", "''"))
+
+
+def _is_empty_cell(cell):
+    return not cell or ('formattedValue' not in cell and 'userEnteredFormat' not in cell)
+
+
+def _user_entered_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, (int, float)):
+        return {'numberValue': value}
+    text = str(value)
+    if text.startswith('='):
+        return {'formulaValue': text}
+    try:
+        return {'numberValue': float(text)}
+    except ValueError:
+        return {'stringValue': text}
+
+
+# ---------------------------------------------------------------------
+# Emulator
+# ---------------------------------------------------------------------
+
+class _Request:
+    """Deferred call, executed like googleapiclient's HttpRequest.execute()."""
+
+    def __init__(self, emulator, method, handler):
+        self._emulator = emulator
+        self._method = method
+        self._handler = handler
+
+    def execute(self, num_retries=0):
+        return self._emulator._execute(self._method, self._handler)
+
+
+class _Sheet:
+    def __init__(self, properties, merges, rows):
+        self.properties = properties
+        self.merges = merges
+        self.rows = rows  # list of lists of cell dicts
+
+    def ensure_size(self, row_count, col_count):
+        grid = self.properties.setdefault('gridProperties', {})
+        grid['rowCount'] = max(grid.get('rowCount', 0), row_count, len(self.rows))
+        grid['columnCount'] = max(grid.get('columnCount', 0), col_count)
+        while len(self.rows) < row_count:
+            self.rows.append([])
+
+
+class _Spreadsheet:
+    def __init__(self, spreadsheet_id, title, sheets):
+        self.spreadsheet_id = spreadsheet_id
+        self.title = title
+        self.sheets = sheets
+        self.metadata = []  # developerMetadata resources
+        self.next_metadata_id = 1
+        self.version = 1
+        self.modified = datetime.now(timezone.utc)
+
+    def sheet_by_title(self, title):
+        if title is None:
+            return self.sheets[0]
+        for sheet in self.sheets:
+            if sheet.properties.get('title') == title:
+                return sheet
+        raise EmulatedHttpError(400, f"Unable to parse range: {title}")
+
+    def parse_range(self, a1):
+        """parse_a1 against this spreadsheet: (sheet, start_row, end_row, start_col, end_col)."""
+        titles = [sheet.properties['title'] for sheet in self.sheets]
+        title, *bounds = parse_a1(a1, titles[0], titles)
+        return (self.sheet_by_title(title), *bounds)
+
+    def touch(self):
+        self.version += 1
+        self.modified = datetime.now(timezone.utc)
+
+
+class SheetsEmulator:
+    """
+    In-memory Sheets v4 + Drive v3 (files.get) service object.
+
+    Thread-safe: the parallel chunk writer calls it from pool threads.
+
+    Args:
+        latency: Seconds slept per executed request (simulated round trip)
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self._spreadsheets = {}
+        self._failures = []
+        self._lock = threading.RLock()
+
+    # -----------------------------------------------------------------
+    # Setup / inspection
+    # -----------------------------------------------------------------
+
+    def add_spreadsheet(self, spreadsheet_id, body):
+        """
+        Load a spreadsheet from a spreadsheets.get(includeGridData=True)-shaped
+        body: {"properties": {...}, "sheets": [{"properties", "merges", "data"}]}.
+        """
+        sheets = []
+        for index, sheet in enumerate(body.get('sheets', [])):
+            properties = copy.deepcopy(sheet.get('properties', {}))
+            properties.setdefault('sheetId', index)
+            properties.setdefault('title', f"Sheet{index + 1}")
+            properties['index'] = index
+            data = (sheet.get('data') or [{}])[0]
+            rows = [copy.deepcopy(row.get('values', [])) for row in data.get('rowData', [])]
+            emulated = _Sheet(properties, copy.deepcopy(sheet.get('merges', [])), rows)
+            emulated.ensure_size(len(rows), max((len(r) for r in rows), default=0))
+            sheets.append(emulated)
+
+        title = body.get('properties', {}).get('title', spreadsheet_id)
+        with self._lock:
+            self._spreadsheets[spreadsheet_id] = _Spreadsheet(spreadsheet_id, title, sheets)
+
+    def fail_next(self, count=1, status=503, method=None):
+        """
+        Make the next `count` executed requests raise EmulatedHttpError(status).
+
+        Args:
+            method: Only fail this method ("values.batchUpdate"...); None = any
+        """
+        with self._lock:
+            self._failures.extend([(method, status)] * count)
+
+    def call_counts(self):
+        """Executed requests per method name."""
+        counts = {}
+        for method in self.calls:
+            counts[method] = counts.get(method, 0) + 1
+        return counts
+
+    def cell_value(self, spreadsheet_id, a1):
+        """formattedValue of one cell ("Sheet1!B3"), '' when empty."""
+        spreadsheet = self._spreadsheet(spreadsheet_id)
+        sheet, row, _, col, _ = spreadsheet.parse_range(a1)
+        if row >= len(sheet.rows) or col >= len(sheet.rows[row]):
+            return ''
+        return sheet.rows[row][col].get('formattedValue', '')
+
+    # -----------------------------------------------------------------
+    # API surface
+    # -----------------------------------------------------------------
+
+    def spreadsheets(self):
+        return _SpreadsheetsResource(self)
+
+    def files(self):
+        return _FilesResource(self)
+
+    def _execute(self, method, handler):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append(method)
+            for i, (failing, status) in enumerate(self._failures):
+                if failing in (None, method):
+                    del self._failures[i]
+                    raise EmulatedHttpError(status)
+            return handler()
+
+    def _spreadsheet(self, spreadsheet_id):
+        spreadsheet = self._spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise EmulatedHttpError(404, f"Requested entity was not found: {spreadsheet_id}")
+        return spreadsheet
+
+    # spreadsheets.get --------------------------------------------------
+
+    def _get(self, spreadsheetId, ranges=None, includeGridData=False, fields=None):
+        spreadsheet = self._spreadsheet(spreadsheetId)
+
+        if ranges:
+            if isinstance(ranges, str):
+                ranges = [ranges]
+            wanted = {}
+            for a1 in ranges:
+                sheet, *bounds = spreadsheet.parse_range(a1)
+                wanted.setdefault(id(sheet), []).append(bounds)
+            selected = [(s, wanted[id(s)]) for s in spreadsheet.sheets if id(s) in wanted]
+        else:
+            selected = [(s, [(None, None, None, None)]) for s in spreadsheet.sheets]
+
+        sheets = []
+        for sheet, bounds in selected:
+            entry = {
+                'properties': copy.deepcopy(sheet.properties),
+                'merges': copy.deepcopy(sheet.merges),
+            }
+            if includeGridData:
+                entry['data'] = [self._grid_data(sheet, *b) for b in bounds]
+            sheets.append(entry)
+
+        response = {
+            'spreadsheetId': spreadsheetId,
+            'properties': {'title': spreadsheet.title},
+            'sheets': sheets,
+        }
+        return apply_field_mask(response, parse_field_mask(fields)) if fields else response
+
+    @staticmethod
+    def _grid_data(sheet, start_row, end_row, start_col, end_col):
+        start_row = start_row or 0
+        start_col = start_col or 0
+        end_row = len(sheet.rows) if end_row is None else min(end_row, len(sheet.rows))
+
+        row_data = []
+        for row in sheet.rows[start_row:end_row]:
+            cells = row[start_col:end_col]
+            while cells and _is_empty_cell(cells[-1]):
+                cells = cells[:-1]
+            row_data.append({'values': copy.deepcopy(cells)} if cells else {})
+        while row_data and not row_data[-1]:
+            row_data.pop()
+
+        data = {'rowData': row_data}
+        if start_row:
+            data['startRow'] = start_row
+        if start_col:
+            data['startColumn'] = start_col
+        return data
+
+    # values.batchGet ---------------------------------------------------
+
+    def _batch_get(self, spreadsheetId, ranges, majorDimension='ROWS',
+                   valueRenderOption='FORMATTED_VALUE', fields=None, **kwargs):
+        spreadsheet = self._spreadsheet(spreadsheetId)
+        if isinstance(ranges, str):
+            ranges = [ranges]
+
+        value_ranges = []
+        for a1 in ranges:
+            sheet, start_row, end_row, start_col, end_col = spreadsheet.parse_range(a1)
+            start_row = start_row or 0
+            start_col = start_col or 0
+            end_row = len(sheet.rows) if end_row is None else min(end_row, len(sheet.rows))
+
+            values = []
+            for row in sheet.rows[start_row:end_row]:
+                row_values = [self._rendered(cell, valueRenderOption) for cell in row[start_col:end_col]]
+                while row_values and row_values[-1] == '':
+                    row_values.pop()
+                values.append(row_values)
+            while values and not values[-1]:
+                values.pop()
+
+            if majorDimension == 'COLUMNS':
+                width = max((len(r) for r in values), default=0)
+                values = [[r[c] if c < len(r) else '' for r in values] for c in range(width)]
+
+            last_col = end_col if end_col is not None else sheet.properties['gridProperties']['columnCount']
+            value_range = {
+                'range': "{}!{}{}:{}{}".format(
+                    _quoted(sheet.properties['title']), col_idx_to_letter(start_col), start_row + 1,
+                    col_idx_to_letter(max(last_col - 1, start_col)), max(end_row, start_row + 1)),
+                'majorDimension': majorDimension,
+            }
+            if values:
+                value_range['values'] = values
+            value_ranges.append(value_range)
+
+        response = {'spreadsheetId': spreadsheetId, 'valueRanges': value_ranges}
+        return apply_field_mask(response, parse_field_mask(fields)) if fields else response
+
+    @staticmethod
+    def _rendered(cell, option):
+        if not cell:
+            return ''
+        if option == 'FORMATTED_VALUE':
+            return cell.get('formattedValue', '')
+        entered = cell.get('userEnteredValue', {})
+        if 'formulaValue' in entered and option == 'FORMULA':
+            return entered['formulaValue']
+        if 'numberValue' in entered:
+            return entered['numberValue']
+        return cell.get('formattedValue', '')
+
+    # values.batchUpdate ------------------------------------------------
+
+    def _batch_update_values(self, spreadsheetId, body):
+        spreadsheet = self._spreadsheet(spreadsheetId)
+        raw = body.get('valueInputOption') == 'RAW'
+
+        responses = []
+        total_cells = 0
+        updated_rows, updated_cols, updated_sheets = set(), set(), set()
+        for entry in body.get('data', []):
+            sheet, start_row, _, start_col, _ = spreadsheet.parse_range(entry['range'])
+            start_row = start_row or 0
+            start_col = start_col or 0
+            values = entry.get('values', [])
+
+            width = max((len(r) for r in values), default=0)
+            sheet.ensure_size(start_row + len(values), start_col + width)
+            cells = 0
+            for i, row_values in enumerate(values):
+                row = sheet.rows[start_row + i]
+                for j, value in enumerate(row_values):
+                    col = start_col + j
+                    while len(row) <= col:
+                        row.append({})
+                    cell = row[col]
+                    if value is None:
+                        continue
+                    if value == '':
+                        cell.pop('formattedValue', None)
+                        cell.pop('userEnteredValue', None)
+                    else:
+                        cell['formattedValue'] = str(value)
+                        cell['userEnteredValue'] = {'stringValue': str(value)} if raw else _user_entered_value(value)
+                    cells += 1
+                    updated_rows.add((id(sheet), start_row + i))
+                    updated_cols.add((id(sheet), col))
+            if cells:
+                updated_sheets.add(id(sheet))
+            total_cells += cells
+            responses.append({
+                'spreadsheetId': spreadsheetId,
+                'updatedRange': entry['range'],
+                'updatedRows': len(values),
+                'updatedColumns': width,
+                'updatedCells': cells,
+            })
+
+        if total_cells:
+            spreadsheet.touch()
+        return {
+            'spreadsheetId': spreadsheetId,
+            'totalUpdatedRows': len(updated_rows),
+            'totalUpdatedColumns': len(updated_cols),
+            'totalUpdatedCells': total_cells,
+            'totalUpdatedSheets': len(updated_sheets),
+            'responses': responses,
+        }
+
+    # spreadsheets.batchUpdate / developerMetadata ------------------------
+
+    def _batch_update(self, spreadsheetId, body):
+        spreadsheet = self._spreadsheet(spreadsheetId)
+        # Applied to a copy so a rejected request leaves nothing half done
+        metadata = list(spreadsheet.metadata)
+        next_id = spreadsheet.next_metadata_id
+
+        replies = []
+        for request in body.get('requests', []):
+            if 'createDeveloperMetadata' in request:
+                created = copy.deepcopy(request['createDeveloperMetadata']['developerMetadata'])
+                created.setdefault('metadataId', next_id)
+                if any(m['metadataId'] == created['metadataId'] for m in metadata):
+                    raise EmulatedHttpError(400, f"Duplicate metadataId {created['metadataId']}")
+                next_id = max(next_id, created['metadataId']) + 1
+                created['location'] = self._metadata_location(spreadsheet, created.get('location', {}))
+                created.setdefault('visibility', 'DOCUMENT')
+                metadata.append(created)
+                replies.append({'createDeveloperMetadata': {'developerMetadata': copy.deepcopy(created)}})
+            elif 'deleteDeveloperMetadata' in request:
+                lookup = request['deleteDeveloperMetadata']['dataFilter'].get('developerMetadataLookup', {})
+                deleted = [m for m in metadata if self._metadata_matches(m, lookup)]
+                metadata = [m for m in metadata if not self._metadata_matches(m, lookup)]
+                replies.append({'deleteDeveloperMetadata': {'deletedDeveloperMetadata': copy.deepcopy(deleted)}})
+            else:
+                raise EmulatedHttpError(400, f"Unsupported request: {', '.join(request)}")
+
+        if metadata != spreadsheet.metadata:
+            spreadsheet.metadata = metadata
+            spreadsheet.next_metadata_id = next_id
+            spreadsheet.touch()
+        return {'spreadsheetId': spreadsheetId, 'replies': replies}
+
+    @staticmethod
+    def _metadata_location(spreadsheet, location):
+        sheet_ids = {sheet.properties['sheetId'] for sheet in spreadsheet.sheets}
+        if location.get('spreadsheet'):
+            return {'locationType': 'SPREADSHEET', 'spreadsheet': True}
+        if 'sheetId' in location:
+            if location['sheetId'] not in sheet_ids:
+                raise EmulatedHttpError(400, f"No grid with id: {location['sheetId']}")
+            return {'locationType': 'SHEET', 'sheetId': location['sheetId']}
+        dimension_range = location.get('dimensionRange')
+        if dimension_range:
+            if dimension_range.get('sheetId') not in sheet_ids:
+                raise EmulatedHttpError(400, f"No grid with id: {dimension_range.get('sheetId')}")
+            start, end = dimension_range.get('startIndex'), dimension_range.get('endIndex')
+            # As in the API: exactly one row or column
+            if start is None or end != start + 1:
+                raise EmulatedHttpError(400, "Developer metadata must span a single row or column")
+            location_type = 'ROW' if dimension_range.get('dimension') == 'ROWS' else 'COLUMN'
+            return {'locationType': location_type, 'dimensionRange': copy.deepcopy(dimension_range)}
+        raise EmulatedHttpError(400, "Developer metadata needs a location")
+
+    @staticmethod
+    def _metadata_matches(metadata, lookup):
+        for field in ('metadataId', 'metadataKey', 'metadataValue', 'visibility'):
+            if field in lookup and metadata.get(field) != lookup[field]:
+                return False
+        if 'locationType' in lookup and metadata['location']['locationType'] != lookup['locationType']:
+            return False
+        return True
+
+    def _search_metadata(self, spreadsheetId, body, fields=None):
+        spreadsheet = self._spreadsheet(spreadsheetId)
+        matched = []
+        seen = set()
+        for data_filter in body.get('dataFilters', []):
+            if 'developerMetadataLookup' not in data_filter:
+                raise EmulatedHttpError(400, "Only developerMetadataLookup data filters are emulated")
+            lookup = data_filter['developerMetadataLookup']
+            for metadata in spreadsheet.metadata:
+                if metadata['metadataId'] not in seen and self._metadata_matches(metadata, lookup):
+                    seen.add(metadata['metadataId'])
+                    matched.append({'developerMetadata': copy.deepcopy(metadata), 'dataFilters': [data_filter]})
+        # Like the API, no match -> empty response
+        response = {'matchedDeveloperMetadata': matched} if matched else {}
+        return apply_field_mask(response, parse_field_mask(fields)) if fields else response
+
+    def _get_metadata(self, spreadsheetId, metadataId, fields=None):
+        spreadsheet = self._spreadsheet(spreadsheetId)
+        for metadata in spreadsheet.metadata:
+            if metadata['metadataId'] == int(metadataId):
+                response = copy.deepcopy(metadata)
+                return apply_field_mask(response, parse_field_mask(fields)) if fields else response
+        raise EmulatedHttpError(404, f"No developer metadata with id {metadataId}")
+
+    # Drive files.get ---------------------------------------------------
+
+    def _file_get(self, fileId, fields=None, **kwargs):
+        spreadsheet = self._spreadsheet(fileId)
+        response = {
+            'id': fileId,
+            'name': spreadsheet.title,
+            'mimeType': 'application/vnd.google-apps.spreadsheet',
+            'version': str(spreadsheet.version),
+            'modifiedTime': spreadsheet.modified.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        }
+        return apply_field_mask(response, parse_field_mask(fields)) if fields else response
+
+
+class _SpreadsheetsResource:
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    def get(self, **kwargs):
+        return _Request(self._emulator, 'spreadsheets.get', lambda: self._emulator._get(**kwargs))
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(
+            self._emulator, 'spreadsheets.batchUpdate',
+            lambda: self._emulator._batch_update(spreadsheetId, body)
+        )
+
+    def values(self):
+        return _ValuesResource(self._emulator)
+
+    def developerMetadata(self):
+        return _DeveloperMetadataResource(self._emulator)
+
+
+class _DeveloperMetadataResource:
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    def search(self, spreadsheetId, body, fields=None):
+        return _Request(
+            self._emulator, 'developerMetadata.search',
+            lambda: self._emulator._search_metadata(spreadsheetId, body, fields)
+        )
+
+    def get(self, spreadsheetId, metadataId, fields=None):
+        return _Request(
+            self._emulator, 'developerMetadata.get',
+            lambda: self._emulator._get_metadata(spreadsheetId, metadataId, fields)
+        )
+
+
+class _ValuesResource:
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    def batchGet(self, **kwargs):
+        return _Request(self._emulator, 'values.batchGet', lambda: self._emulator._batch_get(**kwargs))
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(
+            self._emulator, 'values.batchUpdate',
+            lambda: self._emulator._batch_update_values(spreadsheetId, body)
+        )
+
+
+class _FilesResource:
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    def get(self, **kwargs):
+        return _Request(self._emulator, 'files.get', lambda: self._emulator._file_get(**kwargs))
+
+
+class MemorySchemaStore:
+    """In-memory stand-in for the Firestore header-schema registry."""
+
+    def __init__(self):
+        self.schemas = {}
+
+    def get_sheet_schema(self, spreadsheet_id):
+        schema = self.schemas.get(spreadsheet_id)
+        return copy.deepcopy(schema) if schema else None
+
+    def save_sheet_schema(self, spreadsheet_id, schema):
+        self.schemas[spreadsheet_id] = copy.deepcopy(schema)
+        return {"success": True}
+
+
+@contextmanager
+def install(emulator, schema_store=None):
+    """
+    Route sheet_service / drive_service through `emulator` for the block.
+
+    The header-schema registry is replaced by `schema_store` (a fresh
+    MemorySchemaStore by default) and the grid cache is cleared on entry
+    and exit, so nothing leaks between the emulated and the real backend.
+    """
+    from services import drive_service, sheet_service
+
+    sheet_service.clear_sheet_cache()
+    sheet_service.set_sheets_service(emulator)
+    sheet_service.set_schema_store(schema_store or MemorySchemaStore())
+    drive_service.set_drive_service(emulator)
+    try:
+        yield emulator
+    finally:
+        drive_service.set_drive_service(None)
+        sheet_service.set_schema_store(None)
+        sheet_service.set_sheets_service(None)
+        sheet_service.clear_sheet_cache()
+
+
+# ---------------------------------------------------------------------
+# Synthetic registers
+# ---------------------------------------------------------------------
+
+def _cell(value=None, yellow=False):
+    cell = {}
+    if value is not None and value != '':
+        cell['formattedValue'] = str(value)
+        cell['userEnteredValue'] = _user_entered_value(value)
+    if yellow:
+        cell['userEnteredFormat'] = copy.deepcopy(YELLOW)
+    return cell
+
+
+def synthetic_register(equipment_count, parts=4, filled=0.5, extra_columns=0, title="Sheet1", seed=0, tabs=1):
+    """
+    Equipment register in the template's layout, as a spreadsheet body for
+    SheetsEmulator.add_spreadsheet.
+
+    Two yellow header rows (MATERIAL INFORMATION over SPEC. / GRADE), then one
+    block per equipment ("V-00000", "V-00001"...) of 1..`parts` part rows
+    with NO. / EQUIPMENT NO. / EQUIPMENT DESCRIPTION merged over the block.
+
+    Args:
+        equipment_count: Number of equipment blocks per tab
+        parts: Maximum part rows per block
+        filled: Share of data cells that already hold a value
+        extra_columns: Additional yellow header columns ("EXTRA 1"...)
+        title: Tab title ("<title> 1", "<title> 2"... with several tabs)
+        seed: Random seed (same arguments -> same sheet)
+        tabs: Number of tabs; equipment numbers continue from tab to tab
+
+    Returns:
+        dict: {"properties": {...}, "sheets": [{"properties", "merges", "data"}]}
+    """
+    rng = random.Random(seed)
+    sheets = []
+    for tab in range(tabs):
+        sheets.append(_register_sheet(
+            rng, tab, title if tabs == 1 else f"{title} {tab + 1}", tab * equipment_count,
+            equipment_count, parts, filled, extra_columns,
+        ))
+    return {
+        'properties': {'title': f"Synthetic register ({equipment_count * tabs})"},
+        'sheets': sheets,
+    }
+
+
+def _register_sheet(rng, sheet_id, title, first_equipment, equipment_count, parts, filled, extra_columns):
+    headers = REGISTER_HEADERS + [f"EXTRA {i + 1}" for i in range(extra_columns)]
+    width = len(headers)
+
+    first = [_cell(h, yellow=True) if h else _cell(yellow=True) for h in headers]
+    second = [_cell(REGISTER_SUBHEADERS.get(c), yellow=True) for c in range(width)]
+    rows = [first, second]
+    merges = [{'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 1, 'startColumnIndex': 4, 'endColumnIndex': 6}]
+    for col in range(width):
+        if col not in REGISTER_SUBHEADERS:
+            merges.append({'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 2,
+                           'startColumnIndex': col, 'endColumnIndex': col + 1})
+
+    def value(generator):
+        return generator() if rng.random() < filled else ''
+
+    for e in range(equipment_count):
+        equipment = first_equipment + e
+        start = len(rows)
+        span = rng.randint(1, parts)
+        for p in range(span):
+            block_first = p == 0
+            rows.append([
+                _cell(e + 1 if block_first else None),
+                _cell(EQUIPMENT_FORMAT.format(equipment) if block_first else None),
+                _cell(f"Vessel {equipment}" if block_first else None),
+                _cell(rng.choice(REGISTER_PARTS)),
+                _cell(value(lambda: rng.choice(['SA-516', 'SA-240', 'SA-106']))),
+                _cell(value(lambda: rng.choice(['70', '304L', 'B']))),
+                _cell(value(lambda: rng.choice(['Water', 'Steam', 'Hydrocarbon']))),
+                _cell(value(lambda: rng.choice(['Y', 'N']))),
+                _cell(value(lambda: f"{rng.uniform(0.1, 5):.2f}")),
+                _cell(value(lambda: f"{rng.uniform(0.1, 4):.2f}")),
+                _cell(value(lambda: str(rng.randint(50, 400)))),
+                _cell(value(lambda: str(rng.randint(30, 350)))),
+            ] + [_cell(value(lambda: 'x')) for _ in range(extra_columns)])
+        if span > 1:
+            for col in range(3):
+                merges.append({'sheetId': sheet_id, 'startRowIndex': start, 'endRowIndex': start + span,
+                               'startColumnIndex': col, 'endColumnIndex': col + 1})
+
+    return {
+        'properties': {
+            'sheetId': sheet_id,
+            'title': title,
+            'index': sheet_id,
+            'gridProperties': {'rowCount': len(rows) + 100, 'columnCount': width},
+        },
+        'merges': merges,
+        'data': [{'rowData': [{'values': row} for row in rows]}],
+    }
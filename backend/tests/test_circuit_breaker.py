@@ -0,0 +1,171 @@
+"""
+Gemini circuit breaker state transitions and generate_content_with_retry's
+use of it: transient errors are retried and counted, client errors are not
+retried and leave the breaker state alone.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+from google.genai import errors
+
+from services import extraction_service
+from services.extraction_service import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(extraction_service.time, "monotonic", self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=3, cooldown=30)
+
+    def state(self):
+        return self.breaker.snapshot()["state"]
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+        self.assertEqual(self.state(), "closed")
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.state(), "open")
+        self.assertEqual(self.breaker.snapshot()["timesOpened"], 1)
+
+    def test_success_resets_the_failure_count(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.state(), "closed")
+        self.assertEqual(self.breaker.snapshot()["consecutiveFailures"], 1)
+
+    def test_open_breaker_fails_fast_until_the_cooldown(self):
+        self.open_breaker()
+        self.clock.now += 10
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertAlmostEqual(raised.exception.retry_after, 20)
+
+    def test_half_open_lets_one_trial_through(self):
+        self.open_breaker()
+        self.clock.now += 31
+        self.breaker.before_call()
+        self.assertEqual(self.state(), "half_open")
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_trial_success_closes(self):
+        self.open_breaker()
+        self.clock.now += 31
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.state(), "closed")
+        self.breaker.before_call()
+
+    def test_trial_failure_reopens(self):
+        self.open_breaker()
+        self.clock.now += 31
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.state(), "open")
+        self.assertEqual(self.breaker.snapshot()["timesOpened"], 2)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_client_error_keeps_half_open_and_frees_the_trial(self):
+        self.open_breaker()
+        self.clock.now += 31
+        self.breaker.before_call()
+        self.breaker.record_client_error()
+        self.assertEqual(self.state(), "half_open")
+        self.breaker.before_call()
+
+
+class FakeModels:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def generate_content(self, **request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeClient:
+    def __init__(self, *outcomes):
+        self.models = FakeModels(outcomes)
+
+
+class GenerateContentWithRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(threshold=5, cooldown=30)
+        for target, value in [
+            ("GEMINI_BREAKER", self.breaker),
+            ("GEMINI_MAX_RETRIES", 3),
+        ]:
+            patcher = mock.patch.object(extraction_service, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Backoff without waiting
+        patcher = mock.patch.object(extraction_service.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_transient_errors_are_retried(self):
+        client = FakeClient(errors.APIError(503, {}), errors.APIError(429, {}), "response")
+        metrics = {}
+        self.assertEqual(extraction_service.generate_content_with_retry(client, metrics), "response")
+        self.assertEqual(client.models.calls, 3)
+        self.assertEqual(metrics["retries"], 2)
+        self.assertEqual(metrics["circuitState"], "closed")
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_retries_are_bounded(self):
+        client = FakeClient(*[errors.APIError(503, {}) for _ in range(4)])
+        with self.assertRaises(errors.APIError):
+            extraction_service.generate_content_with_retry(client)
+        self.assertEqual(client.models.calls, 4)
+
+    def test_client_error_is_not_retried_and_keeps_the_state(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        client = FakeClient(errors.APIError(400, {}))
+        with self.assertRaises(errors.APIError):
+            extraction_service.generate_content_with_retry(client)
+        self.assertEqual(client.models.calls, 1)
+        self.assertEqual(self.breaker.snapshot()["consecutiveFailures"], 2)
+
+    def test_open_breaker_skips_the_call(self):
+        for _ in range(5):
+            self.breaker.record_failure()
+        client = FakeClient("response")
+        with self.assertRaises(CircuitOpenError):
+            extraction_service.generate_content_with_retry(client)
+        self.assertEqual(client.models.calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+material_parser: spec / grade splitting must give exactly what the original
+sheet_service parser gave (quirks included, e.g. "Grade C" -> "ade C"), and
+BomIndex must resolve parts through its synonym classes.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import unittest
+
+from services.material_parser import BomIndex, format_spec_with_dash, parse_materials, split_spec_grade
+
+# material -> (spec, grade) as returned by the original parser
+BASELINE_SPLITS = [
+    ('SA-516 70', ('SA-516', '70')),
+    ('SA-240-Gr.316/316L', ('SA-240', '316/316L')),
+    ('ASTM A-240 304L', ('ASTM A-240', '304L')),
+    ('SA-240 M 316L / SA 240 316L', ('SA-240 M / SA-240', '316L')),
+    ('A516 Gr.70', ('A-516', '70')),
+    ('SA-240-316', ('SA-240', '316')),
+    ('SA-213-TP316', ('SA-213', 'TP316')),
+    ('SA403-WP316', ('SA-403', 'WP316')),
+    ('SA516', ('SA-516', '')),
+    ('A/SA 516', ('SA-516', '')),
+    ('ASME SA516 70', ('ASME SA-516', '70')),
+    ('  SA-106 B  ', ('SA-106', '')),
+    ('SA-106 Gr. B', ('SA-106', 'B')),
+    ('SA 285 Grade C', ('SA-285', 'ade C')),
+    ('SA-516/SA-516 70', ('SA-516', '70')),
+    ('SA-312 TP304/TP304L', ('SA-312 / TP-304', 'TP304')),
+    ('SA-240 304/316', ('SA-240', '304/316')),
+    ('CS', ('CS', '')),
+    ('Carbon Steel', ('Carbon Steel', '')),
+    ('SS316L', ('SS-316', '')),
+    ('A105', ('A-105', '')),
+    ('SA-105N', ('SA-105', '')),
+    ('SA-182 F316L', ('SA-182', 'F316L')),
+    ('SA-350 LF2 CL1', ('SA-350', '')),
+    ('SA-333 Gr 6', ('SA-333', '6')),
+    ('SA-240 M316L', ('SA-240', 'M316L')),
+    ('N/A', ('N/A', '')),
+    ('-', ('-', '')),
+    ('SA-516-70N', ('SA-516', '70N')),
+    ('ASTM A36', ('ASTM A-36', '')),
+    ('IS 2062 E250', ('IS-2062', 'E250')),
+    ('SA 516 70 / SA 516 60', ('SA-516', '70/60')),
+    ('sa-516 70', ('sa-516', '70')),
+    ('SA-240 m 316l', ('SA-240 m', '316l')),
+    ('SA-203 G.E', ('SA-203', 'E')),
+    ('SA-387 Gr.11 Cl.2', ('SA-387', '11 Cl.2')),
+    ('', ('', '')),
+]
+
+
+class SplitSpecGradeTest(unittest.TestCase):
+
+    def test_matches_the_baseline_parser(self):
+        for material, expected in BASELINE_SPLITS:
+            with self.subTest(material=material):
+                self.assertEqual(split_spec_grade(material), expected)
+
+    def test_none_is_empty(self):
+        self.assertEqual(split_spec_grade(None), ("", ""))
+
+    def test_batch_matches_single_calls(self):
+        materials = [m for m, _ in BASELINE_SPLITS] * 2 + [None]
+        self.assertEqual(parse_materials(materials), [split_spec_grade(m) for m in materials])
+
+
+class FormatSpecWithDashTest(unittest.TestCase):
+
+    def test_docstring_examples(self):
+        for spec, expected in [
+            ("SA516", "SA-516"),
+            ("SA-516", "SA-516"),
+            ("A240", "A-240"),
+            ("A/SA 516", "A/SA-516"),
+            ("ASME SA516", "ASME SA-516"),
+            (" A240 ", "A-240"),
+            ("", ""),
+            (None, None),
+        ]:
+            with self.subTest(spec=spec):
+                self.assertEqual(format_spec_with_dash(spec), expected)
+
+
+class BomIndexTest(unittest.TestCase):
+
+    def test_keys_are_normalized(self):
+        bom = BomIndex({"Top Channel": "SA-516 70", "SHELL": "SA-240 304L"})
+        self.assertEqual(bom.material("TopChannel"), "SA-516 70")
+        self.assertEqual(bom.material("shell"), "SA-240 304L")
+
+    def test_synonym_classes(self):
+        bom = BomIndex({"Channel": "SA-516 70", "Head": "SA-240 316L", "Tube": "SA-213 TP316"})
+        self.assertEqual(bom.material("Bottom Channel"), "SA-516 70")
+        self.assertEqual(bom.material("Top Head"), "SA-240 316L")
+        self.assertEqual(bom.material("Tube Bundle"), "SA-213 TP316")
+        self.assertEqual(bom.material("Nozzle"), "")
+
+    def test_specific_class_wins_over_the_generic_one(self):
+        bom = BomIndex({"Top Channel": "SA-105", "Channel": "SA-516 70"})
+        self.assertEqual(bom.material("Top Channel"), "SA-105")
+        self.assertEqual(bom.material("Bottom Channel"), "SA-516 70")
+
+    def test_empty_and_no_entries_are_ignored(self):
+        bom = BomIndex({"Shell": "No", "Head": "  ", "Channel": None})
+        self.assertEqual(bom.material("Shell"), "")
+        self.assertEqual(bom.material("Top Head"), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
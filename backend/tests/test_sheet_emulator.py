@@ -0,0 +1,231 @@
+"""
+sheet_service against the in-memory Sheets emulator: equipment lookups,
+update planning, the chunked write with its retries, the header schema
+registry and the streamed read's merge fill-down across page boundaries.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+from services import sheet_service
+from testing.sheet_emulator import EQUIPMENT_FORMAT, SheetsEmulator, install, synthetic_register
+
+SPREADSHEET_ID = "test-register"
+
+
+class SheetEmulatorTestCase(unittest.TestCase):
+    equipment_count = 40
+
+    def setUp(self):
+        self.emulator = SheetsEmulator()
+        self.emulator.add_spreadsheet(SPREADSHEET_ID, synthetic_register(self.equipment_count))
+        installed = install(self.emulator)
+        installed.__enter__()
+        self.addCleanup(installed.__exit__, None, None, None)
+        # Retried chunks are re-sent without waiting
+        patcher = mock.patch.object(sheet_service, "SHEET_WRITE_RETRY_DELAY", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class GetRowsByEquipmentTest(SheetEmulatorTestCase):
+
+    def test_block_rows_carry_the_merged_equipment_no(self):
+        grid = sheet_service.get_sheet_grid(SPREADSHEET_ID)
+        for equipment in range(self.equipment_count):
+            equipment_no = EQUIPMENT_FORMAT.format(equipment)
+            rows = sheet_service.get_rows_by_equipment(SPREADSHEET_ID, equipment_no)
+            self.assertTrue(rows, equipment_no)
+            self.assertEqual({row["EQUIPMENT NO."] for row in rows}, {equipment_no})
+            self.assertEqual(
+                [row.to_dict() for row in rows],
+                [row.to_dict() for row in grid.rows_by_equipment(equipment_no)]
+            )
+
+    def test_unknown_equipment_has_no_rows(self):
+        self.assertEqual(sheet_service.get_rows_by_equipment(SPREADSHEET_ID, "X-99999"), [])
+
+    def test_lookups_after_the_first_are_served_from_the_cache(self):
+        sheet_service.get_rows_by_equipment(SPREADSHEET_ID, EQUIPMENT_FORMAT.format(0))
+        self.emulator.calls.clear()
+        sheet_service.get_rows_by_equipment(SPREADSHEET_ID, EQUIPMENT_FORMAT.format(1))
+        self.assertEqual(self.emulator.calls, [])
+
+
+class PlanAndWriteTest(SheetEmulatorTestCase):
+
+    def merged_rows(self, equipment_nos, fluid=None):
+        # Rows as read from the sheet, with FLUID replaced when given
+        rows = sheet_service.get_rows_for_equipment_batch(SPREADSHEET_ID, equipment_nos)
+        merged = [dict(row) for equipment_no in equipment_nos for row in rows[equipment_no]]
+        if fluid is not None:
+            for row in merged:
+                row["FLUID"] = fluid
+        return merged
+
+    def test_plan_emits_only_changed_cells(self):
+        equipment_nos = [EQUIPMENT_FORMAT.format(i) for i in range(0, self.equipment_count, 5)]
+        merged = self.merged_rows(equipment_nos, "Nitrogen")
+        grid = sheet_service.get_sheet_grid(SPREADSHEET_ID)
+
+        plan = sheet_service.plan_sheet_update(grid, merged)
+        self.assertEqual(plan["missing_equipment"], [])
+        self.assertEqual(plan["rows_matched"], len(merged))
+        self.assertEqual(plan["cells_to_update"], len(merged))
+        self.assertTrue(all(len(entry["values"]) == 1 for entry in plan["batch_data"]))
+
+        unchanged = sheet_service.plan_sheet_update(grid, self.merged_rows(equipment_nos))
+        self.assertEqual(unchanged["cells_to_update"], 0)
+        self.assertEqual(unchanged["batch_data"], [])
+
+    def test_plan_reports_missing_equipment(self):
+        grid = sheet_service.get_sheet_grid(SPREADSHEET_ID)
+        plan = sheet_service.plan_sheet_update(grid, [{"EQUIPMENT NO.": "X-99999", "FLUID": "Air"}])
+        self.assertEqual(plan["missing_equipment"], ["X-99999"])
+        self.assertEqual(plan["batch_data"], [])
+
+    def test_write_lands_in_the_sheet(self):
+        equipment_no = EQUIPMENT_FORMAT.format(3)
+        plan = sheet_service.prepare_sheet_update_data(SPREADSHEET_ID, self.merged_rows([equipment_no], "Nitrogen"))
+
+        result = sheet_service.execute_sheet_batch_update(SPREADSHEET_ID, plan["batch_data"])
+        self.assertTrue(result["success"])
+        self.assertEqual(result["updated_cells"], plan["cells_to_update"])
+        for entry in plan["batch_data"]:
+            self.assertEqual(self.emulator.cell_value(SPREADSHEET_ID, entry["range"]), "Nitrogen")
+
+        # The write dropped the cached grid: the next lookup sees it
+        rows = sheet_service.get_rows_by_equipment(SPREADSHEET_ID, equipment_no)
+        self.assertEqual({row["FLUID"] for row in rows}, {"Nitrogen"})
+
+    def test_retryable_error_resends_only_the_failed_chunk(self):
+        equipment_nos = [EQUIPMENT_FORMAT.format(i) for i in range(self.equipment_count)]
+        plan = sheet_service.prepare_sheet_update_data(SPREADSHEET_ID, self.merged_rows(equipment_nos, "Steam 2"))
+        self.emulator.calls.clear()
+        self.emulator.fail_next(1, status=503, method="values.batchUpdate")
+
+        with mock.patch.object(sheet_service, "SHEET_WRITE_MAX_RANGES", 10):
+            result = sheet_service.execute_sheet_batch_update(SPREADSHEET_ID, plan["batch_data"])
+
+        chunks = result["chunks"]
+        self.assertTrue(result["success"])
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sorted(chunk["attempts"] for chunk in chunks)[-1], 2)
+        self.assertEqual(sum(chunk["attempts"] for chunk in chunks), len(chunks) + 1)
+        self.assertEqual(self.emulator.call_counts()["values.batchUpdate"], len(chunks) + 1)
+        self.assertEqual(result["updated_cells"], plan["cells_to_update"])
+
+    def test_exhausted_retries_are_logged_with_the_ranges(self):
+        plan = sheet_service.prepare_sheet_update_data(
+            SPREADSHEET_ID, self.merged_rows([EQUIPMENT_FORMAT.format(0)], "Air")
+        )
+        self.emulator.fail_next(sheet_service.SHEET_WRITE_MAX_ATTEMPTS, status=503, method="values.batchUpdate")
+
+        with self.assertLogs(sheet_service.log, "ERROR") as logs:
+            result = sheet_service.execute_sheet_batch_update(SPREADSHEET_ID, plan["batch_data"])
+        self.assertFalse(result["success"])
+        self.assertEqual([chunk["attempts"] for chunk in result["chunks"]], [sheet_service.SHEET_WRITE_MAX_ATTEMPTS])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(plan["batch_data"][0]["range"], logs.output[0])
+        self.assertIn("503", logs.output[0])
+
+    def test_client_error_is_not_retried(self):
+        plan = sheet_service.prepare_sheet_update_data(
+            SPREADSHEET_ID, self.merged_rows([EQUIPMENT_FORMAT.format(0)], "Air")
+        )
+        self.emulator.fail_next(1, status=400, method="values.batchUpdate")
+
+        result = sheet_service.execute_sheet_batch_update(SPREADSHEET_ID, plan["batch_data"])
+        self.assertFalse(result["success"])
+        self.assertEqual([chunk["attempts"] for chunk in result["chunks"]], [1])
+        self.assertIn("error", result["chunks"][0])
+
+
+class HeaderSchemaRegistryTest(SheetEmulatorTestCase):
+
+    def load(self, spreadsheet_id=SPREADSHEET_ID):
+        self.emulator.calls.clear()
+        grids = sheet_service.load_sheet_grids(spreadsheet_id)
+        return grids, self.emulator.call_counts()
+
+    def set_cell(self, a1, value):
+        self.emulator.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"valueInputOption": "RAW", "data": [{"range": a1, "values": [[value]]}]}
+        ).execute()
+
+    def test_registered_tab_skips_the_header_band(self):
+        cold, cold_calls = self.load()
+        warm, warm_calls = self.load()
+        self.assertEqual(cold_calls["spreadsheets.get"], 2)
+        self.assertEqual(warm_calls, {"spreadsheets.get": 1, "values.batchGet": 1})
+        self.assertEqual(warm[0].headers, cold[0].headers)
+        self.assertEqual(
+            [row.to_dict() for row in warm[0].rows_with_numeric_no()],
+            [row.to_dict() for row in cold[0].rows_with_numeric_no()]
+        )
+
+    def test_data_edits_keep_the_registration(self):
+        self.load()
+        self.set_cell("Sheet1!G3", "Edited")
+        _, calls = self.load()
+        self.assertEqual(calls["spreadsheets.get"], 1)
+
+    def test_header_edit_reloads_with_the_band(self):
+        self.load()
+        self.set_cell("Sheet1!G1", "FLUID NAME")
+        grids, calls = self.load()
+        self.assertEqual(calls["values.batchGet"], 2)
+        self.assertEqual(grids[0].headers["G"], "FLUID NAME")
+        _, calls = self.load()
+        self.assertEqual(calls["spreadsheets.get"], 1)
+
+    def test_copy_inherits_the_template_schema(self):
+        self.emulator.add_spreadsheet("copy", synthetic_register(self.equipment_count))
+        self.load()
+        self.assertTrue(sheet_service.inherit_sheet_schema(SPREADSHEET_ID, "copy"))
+        grids, calls = self.load("copy")
+        self.assertEqual(calls, {"spreadsheets.get": 1, "values.batchGet": 1})
+        self.assertTrue(grids[0].rows_by_equipment(EQUIPMENT_FORMAT.format(0)))
+
+
+class StreamedRowsTest(SheetEmulatorTestCase):
+
+    def test_merges_are_carried_across_page_boundaries(self):
+        expected = [row.to_dict() for row in sheet_service.get_sheet_grid(SPREADSHEET_ID).rows_with_numeric_no()]
+        # Blocks span up to four rows, so small pages split most of them
+        for page_size in (1, 2, 3, 7):
+            streamed = [row.to_dict() for row in sheet_service.iter_rows_with_no(SPREADSHEET_ID, page_size=page_size)]
+            self.assertEqual(streamed, expected, f"page_size={page_size}")
+
+    def test_blank_block_does_not_end_the_stream(self):
+        # Twelve empty rows halfway down: at least one page of 5 is blank
+        body = synthetic_register(self.equipment_count)
+        sheet = body["sheets"][0]
+        rows = sheet["data"][0]["rowData"]
+        gap, blank = len(rows) // 2, 12
+        while rows[gap].get("values", [{}])[1].get("formattedValue") is None:
+            gap += 1  # Start the gap at the first row of a block
+        rows[gap:gap] = [{} for _ in range(blank)]
+        for merge in sheet["merges"]:
+            if merge["startRowIndex"] >= gap:
+                merge["startRowIndex"] += blank
+                merge["endRowIndex"] += blank
+        sheet["properties"]["gridProperties"]["rowCount"] += blank
+        self.emulator.add_spreadsheet("gapped", body)
+
+        expected = [row.to_dict() for row in sheet_service.get_sheet_grid("gapped").rows_with_numeric_no()]
+        streamed = [row.to_dict() for row in sheet_service.iter_rows_with_no("gapped", page_size=5)]
+        self.assertEqual(streamed, expected)
+        self.assertIn(EQUIPMENT_FORMAT.format(self.equipment_count - 1), {row["EQUIPMENT NO."] for row in streamed})
+
+    def test_read_failure_raises(self):
+        self.emulator.fail_next(1, status=404)
+        with self.assertRaises(Exception):
+            list(sheet_service.iter_rows_with_no(SPREADSHEET_ID))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+sheet_grid building blocks: MergeIndex must answer exactly like the linear
+get_merge_range scan, and SheetRow must behave like the {header: value}
+dict the readers used to return.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import random
+import unittest
+
+from services.sheet_grid import MergeIndex, RowSchema, SheetRow, get_merge_range
+
+
+def random_merges(rng, rows, cols, attempts):
+    # Non-overlapping rectangles, as Sheets never returns overlapping merges
+    taken = set()
+    merges = []
+    for _ in range(attempts):
+        r, c = rng.randrange(rows), rng.randrange(cols)
+        height, width = rng.randint(1, 5), rng.randint(1, 3)
+        cells = {(i, j) for i in range(r, min(r + height, rows)) for j in range(c, min(c + width, cols))}
+        if len(cells) < 2 or cells & taken:
+            continue
+        taken |= cells
+        merges.append({
+            'startRowIndex': r, 'endRowIndex': max(i for i, _ in cells) + 1,
+            'startColumnIndex': c, 'endColumnIndex': max(j for _, j in cells) + 1,
+        })
+    return merges
+
+
+class MergeIndexTest(unittest.TestCase):
+
+    def test_matches_the_linear_scan(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            merges = random_merges(rng, 40, 8, 60)
+            index = MergeIndex(merges)
+            for r in range(42):
+                for c in range(9):
+                    self.assertEqual(index.find(r, c), get_merge_range(r, c, merges), (r, c))
+
+    def test_starting_in_column(self):
+        merges = [
+            {'startRowIndex': 4, 'endRowIndex': 6, 'startColumnIndex': 1, 'endColumnIndex': 3},
+            {'startRowIndex': 0, 'endRowIndex': 2, 'startColumnIndex': 1, 'endColumnIndex': 2},
+            {'startRowIndex': 0, 'endRowIndex': 3, 'startColumnIndex': 2, 'endColumnIndex': 3},
+        ]
+        index = MergeIndex(merges)
+        self.assertEqual(index.starting_in_column(1), merges[:2])
+        self.assertEqual(index.starting_in_column(0), [])
+
+
+class SheetRowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = RowSchema({'B': 'EQUIPMENT NO.', 'A': 'NO.', 'C': ''})
+        self.row = SheetRow(self.schema, ['1', 'E-101'])
+
+    def test_reads_like_a_dict(self):
+        self.assertEqual(self.schema.headers, ('NO.', 'EQUIPMENT NO.'))
+        self.assertEqual(self.row['EQUIPMENT NO.'], 'E-101')
+        self.assertEqual(self.row.get('FLUID', 'n/a'), 'n/a')
+        self.assertEqual(dict(self.row), {'NO.': '1', 'EQUIPMENT NO.': 'E-101'})
+        self.assertEqual(self.row, {'NO.': '1', 'EQUIPMENT NO.': 'E-101'})
+
+    def test_extra_keys_sit_beside_the_schema(self):
+        self.row['PDF'] = 'drawing.pdf'
+        self.row['NO.'] = '2'
+        self.assertEqual(self.row.to_dict(), {'NO.': '2', 'EQUIPMENT NO.': 'E-101', 'PDF': 'drawing.pdf'})
+        self.assertEqual(len(self.row), 3)
+        del self.row['PDF']
+        self.assertNotIn('PDF', self.row)
+
+    def test_schema_keys_cannot_be_deleted(self):
+        with self.assertRaises(TypeError):
+            del self.row['NO.']
+        with self.assertRaises(KeyError):
+            del self.row['FLUID']
+
+    def test_copy_is_independent(self):
+        copy = self.row.copy()
+        copy['NO.'] = '9'
+        copy['PDF'] = 'other.pdf'
+        self.assertEqual(self.row.to_dict(), {'NO.': '1', 'EQUIPMENT NO.': 'E-101'})
+        self.assertIs(copy.schema, self.row.schema)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+slide_service table writes: the streaming grouped writer must leave every
+NO.'s table with the same cells as the baseline grouped write, also when a
+NO. shows up again further down the sheet.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+from services import slide_service
+
+
+def row(no, part, fluid):
+    return {"NO.": no, "PARTS": part, "FLUID": fluid, "INSULATION (yes/No)": "Y"}
+
+
+ROWS = [
+    row("1", "Shell", "Water"),
+    row("1", "Top Head", "Steam"),
+    row("2", "Shell", "Air"),
+    row("", "Shell", "Ignored"),
+    row("1", "Bottom Head", "Oil"),
+    row("3", "Channel", "Gas"),
+]
+
+
+class WriteGroupedTablesStreamingTest(unittest.TestCase):
+
+    def written_tables(self, rows):
+        # Last write per table: what the slide ends up showing
+        tables = {}
+        with mock.patch.object(slide_service, "overwrite_table_cells") as overwrite:
+            first_rows = slide_service.write_grouped_tables_streaming(iter(rows), "presentation")
+        for call in overwrite.call_args_list:
+            table_id, updates, slide_id = call.args
+            self.assertEqual(slide_id, "presentation")
+            tables[table_id] = updates
+        return tables, first_rows, overwrite.call_count
+
+    def test_matches_the_grouped_write(self):
+        grouped = slide_service.build_slide_table_updates_grouped_by_no({"data": ROWS})
+        tables, _, _ = self.written_tables(ROWS)
+        self.assertEqual(tables, {f"p{no}_i4": updates for no, updates in grouped.items()})
+
+    def test_returns_the_first_row_of_each_no(self):
+        _, first_rows, _ = self.written_tables(ROWS)
+        self.assertEqual(first_rows, [ROWS[0], ROWS[2], ROWS[5]])
+
+    def test_contiguous_blocks_are_written_once(self):
+        ordered = [r for r in ROWS if r["NO."]]
+        ordered.sort(key=lambda r: int(r["NO."]))
+        _, _, writes = self.written_tables(ordered)
+        self.assertEqual(writes, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+Optional 1-bit tile encoding: the adaptive threshold must keep text under
+uneven lighting, blank tiles are dropped, and the encoded image stream must
+decode back to the ink mask.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import unittest
+
+import fitz
+import numpy as np
+
+from services.extraction_service import binarize_tile, insert_bilevel_tile
+
+
+def lit_tile(h=600, w=900):
+    # Paper that darkens from 240 to 150 left to right, as on a skewed scan
+    return np.tile(np.linspace(240, 150, w), (h, 1)).astype(np.uint8)
+
+
+class BinarizeTileTest(unittest.TestCase):
+
+    def test_blank_tile_is_skipped(self):
+        self.assertIsNone(binarize_tile(lit_tile()))
+
+    def test_text_under_uneven_lighting_is_ink(self):
+        gray = lit_tile()
+        # Strokes 40 levels under the local paper tone on both ends
+        gray[100:110, 50:250] -= 40
+        gray[400:410, 650:850] -= 40
+        ink = binarize_tile(gray, margin_px=0)
+        self.assertEqual(ink.shape, (310, 800))
+        self.assertTrue(ink[:10, :200].all())
+        self.assertTrue(ink[300:, 600:].all())
+        self.assertEqual(int(ink.sum()), 2 * 10 * 200)
+
+    def test_isolated_specks_are_dropped(self):
+        gray = lit_tile()
+        gray[300, 450] = 0
+        self.assertIsNone(binarize_tile(gray))
+
+
+class InsertBilevelTileTest(unittest.TestCase):
+
+    def test_stream_decodes_to_the_mask(self):
+        rng = np.random.default_rng(3)
+        ink = rng.random((123, 77)) < 0.2
+        doc = fitz.open()
+        encoded = insert_bilevel_tile(doc, ink)
+
+        xref = doc[0].get_images()[0][0]
+        self.assertEqual(doc.xref_get_key(xref, "Filter"), ("name", "/FlateDecode"))
+        self.assertEqual(encoded, len(doc.xref_stream_raw(xref)))
+        bits = np.frombuffer(doc.xref_stream(xref), dtype=np.uint8).reshape(123, -1)
+        self.assertTrue(np.array_equal(np.unpackbits(bits, axis=1)[:, :77] == 0, ink))
+
+
+if __name__ == '__main__':
+    unittest.main()
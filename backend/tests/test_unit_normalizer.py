@@ -0,0 +1,42 @@
+"""
+unit_normalizer: register pressures go to MPa and temperatures to °C with a
+fixed number of decimals, ranges and slash pairs keep their shape, and
+values without a number come back empty.
+
+Run from backend/:
+    python -m unittest discover tests
+"""
+import unittest
+
+from services.unit_normalizer import normalize_pressures, normalize_temperatures
+
+
+class NormalizePressuresTest(unittest.TestCase):
+
+    def test_converts_each_value_with_its_unit(self):
+        cases = [
+            ("1.5", "MPa", "1.5"),
+            ("1500", "kPa", "1.5"),
+            ("0.35/1.2", "MPa", "0.35/1.2"),
+            ("-1 ~ 3.5", "bar(g)", "-0.1~0.35"),
+            ("FV / 0.35", "MPa", "FV/0.35"),
+            ("no", "MPa", ""),
+            ("", "MPa", ""),
+            ("1,500", "kPa", "1.5"),
+            ("100", "psi", "0.689"),
+        ]
+        values, units, expected = zip(*cases)
+        self.assertEqual(normalize_pressures(list(values), list(units)), list(expected))
+
+
+class NormalizeTemperaturesTest(unittest.TestCase):
+
+    def test_converts_to_celsius(self):
+        self.assertEqual(
+            normalize_temperatures(["350", "650°F", "-29/350", "273.15", "abc"], [None, None, "C", "K", "C"]),
+            ["350", "343.3", "-29/350", "0", ""]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
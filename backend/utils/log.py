@@ -0,0 +1,120 @@
+"""
+Backend logging: leveled, lazily formatted and written off the request path.
+
+Every module takes a logger from get_logger(__name__) and logs with %-style
+arguments (log.debug("rows: %s", rows)), so nothing is formatted unless the
+record passes the level check. configure_logging() routes all of them
+through a QueueHandler; a single QueueListener thread does the actual stream
+I/O, so a request thread only pays for a queue put. The first get_logger()
+call configures logging, so records emitted while modules are still being
+imported already go through the handler.
+
+Environment (read from the process or a .env file):
+    LOG_LEVEL: Level of the backend loggers (default INFO)
+    LOG_DEBUG_SAMPLE_EVERY: Keep one in N DEBUG records per call site (default 1 = all)
+    LOG_FORMAT: logging format string
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import load_dotenv
+
+ROOT_LOGGER = "backend"
+DEFAULT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+class DebugSampler(logging.Filter):
+    """
+    Pass every DEBUG record of a call site only once per `every` occurrences.
+
+    Per-row debug output (one record per register row) is reduced to a
+    sample while INFO and above always pass.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+def configure_logging(level=None, stream=None):
+    """
+    Install the queue handler on the backend logger tree (idempotent).
+
+    Args:
+        level: Level name or number, defaults to $LOG_LEVEL
+        stream: Output stream of the listener, defaults to stderr
+    """
+    global _listener
+
+    # Read at call time; the first call may come before the app loads .env
+    load_dotenv()
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    sample_every = max(1, int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "1")))
+
+    with _configure_lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        if _listener is not None:
+            return
+
+        output = logging.StreamHandler(stream)
+        output.setFormatter(logging.Formatter(os.getenv("LOG_FORMAT", DEFAULT_FORMAT)))
+
+        log_queue = queue.SimpleQueue()
+        handler = QueueHandler(log_queue)
+        handler.addFilter(DebugSampler(sample_every))
+
+        root.addHandler(handler)
+        # uvicorn configures the stdlib root logger; don't print twice
+        root.propagate = False
+
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            root = logging.getLogger(ROOT_LOGGER)
+            for handler in list(root.handlers):
+                if isinstance(handler, QueueHandler):
+                    root.removeHandler(handler)
+
+
+def get_logger(name):
+    """
+    Logger for a backend module.
+
+    Args:
+        name: Usually __name__ ("services.sheet_service")
+
+    Returns:
+        logging.Logger under the backend logger tree
+    """
+    if _listener is None:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")